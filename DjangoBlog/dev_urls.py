@@ -3,10 +3,10 @@
 用于在开发环境中提供静态文件和媒体文件服务
 """
 from django.conf import settings
-from django.conf.urls.static import static
 from django.urls import path, include
 from django.contrib import admin
 from . import views
+from .static_serve import file_serving_patterns
 
 # 基础URL配置
 urlpatterns = [
@@ -18,8 +18,7 @@ urlpatterns = [
 # 开发环境静态文件和媒体文件服务
 # 注意：在生产环境中，应该使用Web服务器（如Nginx）来提供这些文件
 if settings.DEBUG or settings.DEVELOPMENT_MODE:
-    urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    urlpatterns += file_serving_patterns()
 
 # 自定义错误处理器
 handler404 = 'DjangoBlog.views.handler404'
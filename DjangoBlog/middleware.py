@@ -1,24 +1,162 @@
-from django.http import HttpResponse
+import cProfile
+import json
 import logging
+import os
+import random
+import re
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse
+
+from .profiling import RequestProfile, check_profile_token, observe_queries
 
 logger = logging.getLogger(__name__)
+profiling_logger = logging.getLogger('DjangoBlog.profiling')
+
+class AsyncCapableMiddleware:
+    """同时支持同步和异步的中间件基类
+
+    中间件链中只要有一个同步中间件，异步视图的每个请求都要经过一次 异步->同步->异步 的线程切换。
+    子类实现 handle(request, get_response) 的同步版本和 ahandle 的异步版本。
+    """
+    sync_capable = True
+    async_capable = True
 
-class BlockViteRequestsMiddleware:
-    """阻止Vite客户端请求的自定义中间件"""
-    
     def __init__(self, get_response):
         self.get_response = get_response
-    
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
     def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.handle(request)
+
+    async def __acall__(self, request):
+        return await self.ahandle(request)
+
+
+class BlockViteRequestsMiddleware(AsyncCapableMiddleware):
+    """阻止Vite客户端请求的自定义中间件"""
+
+    @staticmethod
+    def blocked(request):
         # 检查请求路径是否包含Vite相关路径
         if '@vite/client' in request.path or 'vite' in request.path.lower():
             logger.info(f"阻止Vite请求: {request.path}")
             # 返回空的JavaScript响应
-            response = HttpResponse(
+            return HttpResponse(
                 content='// Vite客户端请求被阻止\nconsole.log("Vite客户端请求被阻止");',
                 content_type='application/javascript'
             )
-            return response
-        
-        response = self.get_response(request)
-        return response
\ No newline at end of file
+        return None
+
+    def handle(self, request):
+        return self.blocked(request) or self.get_response(request)
+
+    async def ahandle(self, request):
+        return self.blocked(request) or await self.get_response(request)
+
+
+class ProfilingMiddleware(AsyncCapableMiddleware):
+    """请求性能分析中间件
+
+    按 PROFILING_SAMPLE_RATE 抽样，把数据库耗时和查询数、模板渲染耗时、
+    视图耗时写入 Server-Timing 响应头，PROFILING_LOG_REQUESTS 开启时另写一行JSON日志。
+    请求带有有效的 X-Profile 签名令牌时，对这一次请求做 cProfile 并把结果写入 PROFILING_DUMP_DIR。
+    查询通过 observe_queries 统计，异步视图在线程池中并发执行的查询同样计入。
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        # 异步模式下同步的 process_view 也会被切换到线程中执行
+        if iscoroutinefunction(self):
+            self.process_view = self.aprocess_view
+
+    def handle(self, request):
+        force_profile = check_profile_token(request.headers.get('X-Profile', ''))
+        if not force_profile and not self.sampled():
+            return self.get_response(request)
+
+        profile = RequestProfile()
+        request._profile = profile
+        token = profile.activate()
+        profiler = cProfile.Profile() if force_profile else None
+        try:
+            with observe_queries(profile.db_wrapper):
+                if profiler is not None:
+                    response = profiler.runcall(self.get_response, request)
+                else:
+                    response = self.get_response(request)
+        finally:
+            profile.deactivate(token)
+        return self.finish(request, response, profile, profiler)
+
+    async def ahandle(self, request):
+        force_profile = check_profile_token(request.headers.get('X-Profile', ''))
+        if not force_profile and not self.sampled():
+            return await self.get_response(request)
+
+        profile = RequestProfile()
+        request._profile = profile
+        token = profile.activate()
+        # 只记录事件循环线程中的调用
+        profiler = cProfile.Profile() if force_profile else None
+        try:
+            with observe_queries(profile.db_wrapper):
+                if profiler is not None:
+                    profiler.enable()
+                try:
+                    response = await self.get_response(request)
+                finally:
+                    if profiler is not None:
+                        profiler.disable()
+        finally:
+            profile.deactivate(token)
+        return self.finish(request, response, profile, profiler)
+
+    def finish(self, request, response, profile, profiler):
+        profile.finish()
+        response['Server-Timing'] = profile.server_timing()
+        if profiler is not None:
+            response['X-Profile-Dump'] = self.dump(profiler, request)
+        if getattr(settings, 'PROFILING_LOG_REQUESTS', False):
+            profiling_logger.info(json.dumps({
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                **profile.as_dict(),
+            }))
+        return response
+
+    @staticmethod
+    def start_view(request):
+        # 视图耗时从这里开始计算，包含视图函数及其中的查询和模板渲染
+        profile = getattr(request, '_profile', None)
+        if profile is not None:
+            profile.view_start = time.perf_counter()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        self.start_view(request)
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        self.start_view(request)
+
+    @staticmethod
+    def sampled():
+        if not getattr(settings, 'PROFILING_ENABLED', True):
+            return False
+        rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 1.0)
+        return rate >= 1 or random.random() < rate
+
+    @staticmethod
+    def dump(profiler, request):
+        """写入 .prof 文件（可用 snakeviz 或 pstats 查看），返回文件名"""
+        directory = getattr(settings, 'PROFILING_DUMP_DIR', settings.BASE_DIR / 'logs' / 'profiles')
+        os.makedirs(directory, exist_ok=True)
+        name = re.sub(r'[^A-Za-z0-9]+', '-', request.path).strip('-') or 'index'
+        filename = f'{time.strftime("%Y%m%d-%H%M%S")}-{name[:60]}.prof'
+        profiler.dump_stats(os.path.join(directory, filename))
+        return filename
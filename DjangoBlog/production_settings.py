@@ -1,7 +1,10 @@
 """
 墨境Blog - 简化生产环境配置 - 本地开发使用
 """
+import os
+
 from .settings import *
+from .sqlite3 import production_database
 
 # 基础安全配置
 DEBUG = False
@@ -10,6 +13,23 @@ ALLOWED_HOSTS = ['localhost', '127.0.0.1', '[::1]']
 # 使用默认密钥（仅用于本地测试）
 SECRET_KEY = 'django-insecure-local-production-key'
 
+# 数据库：WAL 日志模式等 PRAGMA、IMMEDIATE 写事务、持久连接（见 DjangoBlog/sqlite3）
+DATABASES = {
+    **DATABASES,
+    'default': production_database(BASE_DIR / 'db.sqlite3'),
+}
+
+# 缓存：设置 BLOG_REDIS_URL（如 redis://127.0.0.1:6379/1，需要安装 redis 包）后所有进程共享缓存，
+# 页面和片段的失效对每个 worker 都生效；未设置时沿用进程内的 LocMemCache，只适合单进程运行
+if os.environ.get('BLOG_REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['BLOG_REDIS_URL'],
+            'KEY_PREFIX': 'inkrealm-blog',
+        }
+    }
+
 # 静态文件配置
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 STATIC_URL = '/static/'
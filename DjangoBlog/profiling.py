@@ -0,0 +1,160 @@
+"""
+请求性能分析
+
+- RequestProfile：记录一次请求的数据库耗时/查询数、模板渲染耗时和视图耗时
+- ProfiledDjangoTemplates：模板后端，顶层模板渲染时把耗时记到当前请求上
+- make_profile_token / check_profile_token：按需对单个请求做 cProfile 的签名令牌
+- observe_queries：统计当前上下文中的全部查询。每个数据库连接建立时安装一个分发用的
+  execute_wrapper，按 ContextVar 找到当前请求的观察者；sync_to_async/async_to_sync
+  会复制上下文，因此 gather_queries 在线程池中用独立连接执行的查询同样计入
+
+    python manage.py shell -c "from DjangoBlog.profiling import make_profile_token; print(make_profile_token())"
+    curl -H "X-Profile: <令牌>" http://localhost:8000/
+"""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+
+from django.core import signing
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+PROFILE_TOKEN_SALT = 'DjangoBlog.profiling'
+# 令牌有效期（秒）
+PROFILE_TOKEN_MAX_AGE = 600
+
+_current_profile = ContextVar('request_profile', default=None)
+_query_observers = ContextVar('query_observers', default=())
+
+
+@contextmanager
+def observe_queries(wrapper):
+    """在此期间当前上下文（包括派生的线程）执行的查询都经过 wrapper，参数与 execute_wrapper 相同"""
+    token = _query_observers.set(_query_observers.get() + (wrapper,))
+    try:
+        yield
+    finally:
+        _query_observers.reset(token)
+
+
+def _dispatch_query(execute, sql, params, many, context):
+    observers = _query_observers.get()
+    for observer in reversed(observers):
+        execute = partial(observer, execute)
+    return execute(sql, params, many, context)
+
+
+def install_query_dispatch(sender, connection, **kwargs):
+    """connection_created 信号处理器：连接重连时不重复安装"""
+    if _dispatch_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _dispatch_query)
+
+
+class RequestProfile:
+    """一次请求各阶段的耗时（秒）"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.total = 0.0
+        self.db_time = 0.0
+        self.queries = 0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.view_start = None
+        self.view_time = 0.0
+        # 并发查询在多个线程中同时累计
+        self._lock = threading.Lock()
+
+    def db_wrapper(self, execute, sql, params, many, context):
+        """execute_wrapper 回调，累计SQL执行时间；并发执行的查询耗时相加，可能超过请求总耗时"""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.db_time += elapsed
+                self.queries += 1
+
+    def activate(self):
+        return _current_profile.set(self)
+
+    @staticmethod
+    def deactivate(token):
+        _current_profile.reset(token)
+
+    def finish(self):
+        now = time.perf_counter()
+        self.total = now - self.start
+        if self.view_start is not None:
+            self.view_time = now - self.view_start
+
+    def server_timing(self):
+        """Server-Timing 响应头，单位毫秒"""
+        return ', '.join([
+            f'db;dur={self.db_time * 1000:.2f};desc="{self.queries} queries"',
+            f'tpl;dur={self.template_time * 1000:.2f}',
+            f'view;dur={self.view_time * 1000:.2f}',
+            f'total;dur={self.total * 1000:.2f}',
+        ])
+
+    def as_dict(self):
+        return {
+            'total_ms': round(self.total * 1000, 2),
+            'db_ms': round(self.db_time * 1000, 2),
+            'queries': self.queries,
+            'template_ms': round(self.template_time * 1000, 2),
+            'view_ms': round(self.view_time * 1000, 2),
+        }
+
+
+def current_profile():
+    return _current_profile.get()
+
+
+class ProfiledTemplate(Template):
+    def render(self, context=None, request=None):
+        profile = current_profile()
+        if profile is None:
+            return super().render(context, request)
+        # 模板标签（例如 crispy forms）内部再渲染的模板已包含在外层耗时中
+        profile.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            profile.template_depth -= 1
+            if not profile.template_depth:
+                profile.template_time += time.perf_counter() - start
+
+
+class ProfiledDjangoTemplates(DjangoTemplates):
+    """与 DjangoTemplates 相同，额外统计模板渲染耗时
+
+    include/extends 在引擎内部完成，不经过这里；模板标签内部通过后端渲染的模板
+    不重复计时。
+    渲染期间触发的查询（例如惰性加载的侧边栏）同时计入 db 和 tpl。
+    """
+
+    def from_string(self, template_code):
+        return ProfiledTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return ProfiledTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+def make_profile_token():
+    return signing.TimestampSigner(salt=PROFILE_TOKEN_SALT).sign('profile')
+
+
+def check_profile_token(token):
+    try:
+        signing.TimestampSigner(salt=PROFILE_TOKEN_SALT).unsign(token, max_age=PROFILE_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return False
+    return True
@@ -0,0 +1,165 @@
+"""
+读写分离数据库路由
+
+- 写入总是发往主库（default）
+- 只读视图（文章列表、分类、标签、匿名用户的文章详情）用 @replica_reads 标记，
+  视图中的读取随机发往 DATABASE_REPLICAS 中的一个从库
+- 会话、用户、权限等表的读取总是发往主库，刚登录或刚修改的数据不受复制延迟影响
+- 读己之写：请求中发生过写入时，ReadYourWritesMiddleware 在响应中设置 Cookie，
+  之后 DATABASE_READ_YOUR_WRITES_SECONDS 秒内同一浏览器的请求全部读主库，
+  这个窗口应大于从库的最大复制延迟
+
+没有配置从库，或请求没有经过中间件（管理命令、后台线程）时，全部读写都使用主库。
+
+本地测试可以用第二个SQLite文件作为从库（BLOG_REPLICA_DB 环境变量），
+``python manage.py sync_replica`` 把主库复制过去，模拟一次复制。
+"""
+import asyncio
+import contextvars
+import random
+import time
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from .middleware import AsyncCapableMiddleware
+
+# Cookie 的值为读主库截止的时间戳
+PRIMARY_COOKIE = 'blog_primary_until'
+# 这些应用的表只读主库
+PRIMARY_ONLY_APPS = {'sessions', 'auth', 'admin', 'accounts'}
+
+
+class RoutingState:
+    """一次请求的路由状态，各线程和协程共享同一个对象"""
+
+    def __init__(self, pinned=False):
+        # 在读己之写窗口内，只读主库
+        self.pinned = pinned
+        # 当前正在执行 @replica_reads 视图
+        self.replica_reads = False
+        self.wrote = False
+
+
+_state = contextvars.ContextVar('blog_routing_state', default=None)
+
+
+def get_replicas():
+    return list(getattr(settings, 'DATABASE_REPLICAS', []))
+
+
+def get_window():
+    return getattr(settings, 'DATABASE_READ_YOUR_WRITES_SECONDS', 5)
+
+
+def current_state():
+    return _state.get()
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        replicas = get_replicas()
+        if (
+            state is None or not state.replica_reads or state.pinned or state.wrote
+            or not replicas or model._meta.app_label in PRIMARY_ONLY_APPS
+        ):
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # 从库与主库的数据相同，跨库关联视为同一个库
+        databases = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # 从库的表结构通过复制得到
+        if db in get_replicas():
+            return False
+        return None
+
+
+def _allow_replica(request, anonymous_only):
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    return not anonymous_only or not request.user.is_authenticated
+
+
+def replica_reads(anonymous_only=False):
+    """视图装饰器：GET/HEAD 请求中的读取发往从库，anonymous_only 时只对未登录用户生效"""
+    def decorator(view_func):
+        if asyncio.iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def async_wrapper(request, *args, **kwargs):
+                state = _state.get()
+                if state is None or not get_replicas():
+                    return await view_func(request, *args, **kwargs)
+                # 判断是否登录需要读取会话和用户，不能在事件循环中直接执行
+                state.replica_reads = await sync_to_async(_allow_replica)(request, anonymous_only)
+                try:
+                    return await view_func(request, *args, **kwargs)
+                finally:
+                    state.replica_reads = False
+            return async_wrapper
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            state = _state.get()
+            if state is None or not get_replicas():
+                return view_func(request, *args, **kwargs)
+            state.replica_reads = _allow_replica(request, anonymous_only)
+            try:
+                return view_func(request, *args, **kwargs)
+            finally:
+                state.replica_reads = False
+        return wrapper
+    return decorator
+
+
+class ReadYourWritesMiddleware(AsyncCapableMiddleware):
+    """记录请求中是否发生写入，写入后的一段时间内同一浏览器只读主库"""
+
+    @staticmethod
+    def begin(request):
+        try:
+            pinned = float(request.COOKIES.get(PRIMARY_COOKIE, 0)) > time.time()
+        except ValueError:
+            pinned = False
+        return RoutingState(pinned=pinned)
+
+    @staticmethod
+    def end(state, response):
+        if state.wrote and get_replicas():
+            window = get_window()
+            response.set_cookie(
+                PRIMARY_COOKIE, f'{time.time() + window:.3f}', max_age=window, httponly=True, samesite='Lax',
+            )
+        return response
+
+    def handle(self, request):
+        state = self.begin(request)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.end(state, response)
+
+    async def ahandle(self, request):
+        state = self.begin(request)
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.end(state, response)
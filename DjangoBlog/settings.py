@@ -26,6 +26,7 @@ SECRET_KEY = os.getenv('DJANGO_SECRET_KEY', 'django-insecure-!()gk=oulwx4ucc5tqd
 
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
+
 DEVELOPMENT_MODE = True  # 开发模式标志，用于控制静态文件服务
 
 # 允许所有主机访问（生产环境应指定具体域名）
@@ -49,7 +50,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'DjangoBlog.middleware.ProfilingMiddleware',  # 请求性能分析（Server-Timing）
     'DjangoBlog.middleware.BlockViteRequestsMiddleware',  # 阻止Vite客户端请求
+    'DjangoBlog.routers.ReadYourWritesMiddleware',  # 读写分离：写入后一段时间内只读主库
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -63,7 +66,8 @@ ROOT_URLCONF = 'DjangoBlog.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # 与 DjangoTemplates 相同，额外统计模板渲染耗时
+        'BACKEND': 'DjangoBlog.profiling.ProfiledDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates']
         ,
         'APP_DIRS': True,
@@ -73,6 +77,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'blog.context_processors.sidebar',
             ],
         },
     },
@@ -91,6 +96,97 @@ DATABASES = {
     }
 }
 
+# 读写分离：只读视图的读取发往这些从库别名，写入和会话、用户表的读取使用主库
+DATABASE_REPLICAS = []
+# 写入后同一浏览器只读主库的秒数，应大于从库的最大复制延迟
+DATABASE_READ_YOUR_WRITES_SECONDS = 5
+DATABASE_ROUTERS = ['DjangoBlog.routers.PrimaryReplicaRouter']
+
+# 本地测试读写分离：BLOG_REPLICA_DB 指向第二个SQLite文件，用 python manage.py sync_replica 同步
+if os.environ.get('BLOG_REPLICA_DB'):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ['BLOG_REPLICA_DB'],
+        # 测试时与主库共用同一个测试数据库
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS = ['replica']
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+#
+# LocMemCache 只在单个进程内共享：侧边栏、整页缓存的代理键令牌、片段缓存和浏览量缓冲
+# 都保存在这里，多进程部署（多个 gunicorn/uvicorn worker）时一个进程的失效其他进程看不到，
+# 会继续返回过期页面。多进程部署请使用共享缓存，见 production_settings.py 的 BLOG_REDIS_URL。
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'inkrealm-blog',
+    }
+}
+
+# 侧边栏各区块的缓存时间（秒），数据变更时由信号主动失效
+BLOG_SIDEBAR_CACHE_TIMEOUT = 300
+
+# 浏览量缓冲写回数据库的间隔（秒），设为0则每次访问立即写回
+BLOG_VIEW_COUNT_FLUSH_INTERVAL = 10
+
+# 列表页使用 (created_at, id) 游标分页代替页码分页
+BLOG_KEYSET_PAGINATION = False
+
+# 列表总数的缓存时间（秒），文章变更时由信号主动失效
+BLOG_LIST_COUNT_CACHE_TIMEOUT = 600
+
+# 匿名用户整页缓存，文章/评论/分类变更时按代理键精确失效
+BLOG_PAGE_CACHE_ENABLED = True
+BLOG_PAGE_CACHE_TIMEOUT = 300
+
+# 模板片段缓存（文章卡片、分类标签、相关文章），登录用户也能复用；与整页缓存共用代理键失效。
+# 修改这些片段的模板后递增版本号，使旧片段全部失效
+BLOG_FRAGMENT_CACHE_ENABLED = True
+BLOG_FRAGMENT_CACHE_TIMEOUT = 300
+BLOG_FRAGMENT_CACHE_VERSION = 3
+
+# RSS/Atom 订阅的文章数；站点地图按主键区间分块，每块的条数；订阅条目和站点地图块的缓存秒数
+BLOG_FEED_ITEMS = 20
+BLOG_SITEMAP_CHUNK_SIZE = 1000
+BLOG_SYNDICATION_CACHE_TIMEOUT = 24 * 3600
+
+# 异步视图（列表页、详情页）中互不依赖的查询在线程池中并发执行，每个线程使用独立的数据库连接
+BLOG_ASYNC_PARALLEL_QUERIES = True
+
+# 匿名用户的文章详情和列表页支持 ETag/Last-Modified 条件请求，未变化时返回304
+BLOG_CONDITIONAL_GET = True
+
+# post_detail 进程内 slug -> 文章ID 的LRU缓存容量
+BLOG_SLUG_CACHE_SIZE = 1024
+
+# 文章正文的格式：'html'，或 'markdown'（需要 pip install markdown）；
+# 修改后运行 python manage.py render_content --all 重新渲染全部文章
+BLOG_CONTENT_FORMAT = 'html'
+
+# 后台任务（检索索引、相关文章、图片尺寸）的执行方式：
+#   'thread' 事务提交后由进程内线程池执行
+#   'worker' 只写入任务表，由 python manage.py run_tasks 执行（可多进程部署）
+#   'eager'  调用时立即同步执行，运行测试时使用（见 DjangoBlog/test_runner.py）
+BLOG_TASK_MODE = 'thread'
+# 进程内线程池的线程数
+BLOG_TASK_THREADS = 2
+# 首次重试前等待的秒数，之后每次翻倍
+BLOG_TASK_RETRY_DELAY = 5
+# 执行超过该秒数仍未结束的任务视为执行者已退出，重新放回队列
+BLOG_TASK_TIMEOUT = 300
+
+# 请求性能分析：抽样比例（0~1，生产环境建议0.01~0.1），
+# 抽中的请求带 Server-Timing 响应头，开启 PROFILING_LOG_REQUESTS 时另写一行JSON日志
+PROFILING_ENABLED = True
+PROFILING_SAMPLE_RATE = 1.0 if DEBUG else 0.05
+PROFILING_LOG_REQUESTS = False
+# 带签名令牌 X-Profile 的请求的 cProfile 结果保存目录
+PROFILING_DUMP_DIR = BASE_DIR / 'logs' / 'profiles'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -133,6 +229,18 @@ STATICFILES_DIRS = [
     BASE_DIR / 'static',
 ]
 
+# collectstatic 生成带内容哈希的文件名和 .gz/.br 预压缩文件（见 DjangoBlog/storage.py），
+# 部署时需要先运行 python manage.py collectstatic；运行测试时没有收集结果，
+# 由 DjangoBlog/test_runner.py 换成普通存储
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'DjangoBlog.storage.CompressedManifestStaticFilesStorage',
+    },
+}
+
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
@@ -150,3 +258,6 @@ CRISPY_TEMPLATE_PACK = "bootstrap4"
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# 测试运行器：运行测试时改用同步任务和普通静态文件存储
+TEST_RUNNER = 'DjangoBlog.test_runner.BlogTestRunner'
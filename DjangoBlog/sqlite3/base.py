@@ -0,0 +1,34 @@
+import re
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+PRAGMA_NAME_RE = re.compile(r'^[a-z_]+$')
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """支持 OPTIONS['pragmas'] 和 OPTIONS['transaction_mode'] 的 sqlite3 后端"""
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        self.pragmas = params.pop('pragmas', {})
+        self.transaction_mode = params.pop('transaction_mode', None)
+        for name in self.pragmas:
+            if not PRAGMA_NAME_RE.match(name):
+                raise ImproperlyConfigured(f'无效的 PRAGMA 名称：{name}')
+        if self.transaction_mode is not None and self.transaction_mode.upper() not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(f"transaction_mode 必须是 {'、'.join(TRANSACTION_MODES)} 之一")
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        if self.transaction_mode:
+            self.cursor().execute(f'BEGIN {self.transaction_mode.upper()}')
+        else:
+            super()._start_transaction_under_autocommit()
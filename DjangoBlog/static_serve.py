@@ -0,0 +1,195 @@
+"""
+静态文件和媒体文件服务
+
+小型节点不经过 Nginx，/static/ 和 /media/ 由 Django 直接提供（DEBUG 或 DEVELOPMENT_MODE 时）。
+与 django.views.static.serve 相比：
+
+- 预压缩：客户端接受 br/gzip 且存在 collectstatic 生成的 ``.br``/``.gz`` 文件时直接返回，
+  不在请求中压缩；响应带 ``Vary: Accept-Encoding``
+- 缓存：文件名带内容哈希（``style.3f2a1b9c8d7e.css``）或位于 immutable_prefixes 下的文件
+  设置一年的 ``immutable`` 缓存，其余文件缓存 STATIC_MAX_AGE 秒；支持 ETag/Last-Modified 条件请求
+- 传输：用 FileResponse 返回文件对象，WSGI 服务器提供 wsgi.file_wrapper 时可使用 sendfile
+- Range：支持单个 ``bytes=`` 范围（视频、大图片的断点续传和拖动），返回206或416
+"""
+import mimetypes
+import posixpath
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotAllowed
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.urls import re_path
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+from blog.images import VARIANT_DIR
+
+# ManifestStaticFilesStorage 在扩展名前插入12位十六进制哈希
+HASHED_NAME_RE = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+STATIC_MAX_AGE = 3600
+# 按优先顺序排列
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def accepted_encodings(request):
+    """Accept-Encoding 中 q 值大于0的编码"""
+    accepted = set()
+    for part in request.headers.get('Accept-Encoding', '').split(','):
+        coding, _, params = part.partition(';')
+        coding = coding.strip().lower()
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding and quality > 0:
+            accepted.add(coding)
+    return accepted
+
+
+def select_variant(request, fullpath):
+    """返回 (实际读取的文件, Content-Encoding)，没有可用的预压缩文件时返回原文件"""
+    accepted = accepted_encodings(request)
+    for encoding, suffix in ENCODINGS:
+        if encoding in accepted or '*' in accepted:
+            variant = fullpath.with_name(fullpath.name + suffix)
+            if variant.is_file():
+                return variant, encoding
+    return fullpath, None
+
+
+def is_immutable(path, immutable_prefixes):
+    return bool(HASHED_NAME_RE.search(path)) or path.startswith(tuple(immutable_prefixes))
+
+
+def parse_range(header, size):
+    """解析单个 bytes 范围，返回 (start, end)（包含 end）；无法满足时返回 None"""
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first == '':
+        # bytes=-N：最后N个字节
+        length = int(last)
+        if length == 0:
+            return None
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        return None
+    return start, end
+
+
+class RangeFile:
+    """只读出文件 [start, start + length) 部分的文件对象
+
+    没有 tell/seek/fileno，FileResponse 不会按整个文件计算 Content-Length，
+    WSGI 服务器也不会对整个文件使用 sendfile。
+    """
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.remaining = length
+        file.seek(start)
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def range_satisfied(request, etag, last_modified):
+    """If-Range 与当前文件不符时忽略 Range，返回完整文件"""
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def serve(request, path, document_root, precompressed=True, immutable_prefixes=()):
+    """URL：re_path(r'^static/(?P<path>.*)$', serve, {'document_root': ...})"""
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(['GET', 'HEAD'])
+    path = posixpath.normpath(path).lstrip('/')
+    try:
+        fullpath = Path(safe_join(document_root, path))
+    except SuspiciousFileOperation:
+        raise Http404('文件不存在')
+    if not fullpath.is_file():
+        raise Http404('文件不存在')
+
+    content_type, _ = mimetypes.guess_type(fullpath.name)
+    content_type = content_type or 'application/octet-stream'
+    range_header = request.headers.get('Range')
+    # Range 针对未压缩的原文件
+    if precompressed and not range_header:
+        served, encoding = select_variant(request, fullpath)
+    else:
+        served, encoding = fullpath, None
+
+    stat = served.stat()
+    last_modified = int(stat.st_mtime)
+    etag = quote_etag(f'{stat.st_mtime_ns:x}-{stat.st_size:x}' + (f'-{encoding}' if encoding else ''))
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None and range_header and range_satisfied(request, etag, last_modified):
+        byte_range = parse_range(range_header, stat.st_size)
+        if byte_range is None:
+            response = HttpResponse(status=416, content_type=content_type)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+        else:
+            start, end = byte_range
+            length = end - start + 1
+            response = FileResponse(
+                RangeFile(served.open('rb'), start, length), status=206, content_type=content_type,
+                filename=fullpath.name,
+            )
+            response['Content-Length'] = str(length)
+            response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+    if response is None:
+        response = FileResponse(served.open('rb'), content_type=content_type, filename=fullpath.name)
+        if encoding:
+            response['Content-Encoding'] = encoding
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Accept-Ranges'] = 'bytes'
+    if precompressed:
+        patch_vary_headers(response, ['Accept-Encoding'])
+    if is_immutable(path, immutable_prefixes):
+        patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, public=True, max_age=STATIC_MAX_AGE)
+    return response
+
+
+def static_patterns(prefix, document_root, **kwargs):
+    """与 django.conf.urls.static.static() 相同的用法，但不限于 DEBUG"""
+    return [
+        re_path(r'^%s(?P<path>.*)$' % re.escape(prefix.lstrip('/')), serve, {'document_root': document_root, **kwargs}),
+    ]
+
+
+def file_serving_patterns():
+    """/static/ 提供 collectstatic 的输出，/media/ 提供上传文件；图片尺寸文件名带内容哈希，同样长期缓存"""
+    return [
+        *static_patterns(settings.STATIC_URL, settings.STATIC_ROOT),
+        *static_patterns(settings.MEDIA_URL, settings.MEDIA_ROOT, immutable_prefixes=(f'{VARIANT_DIR}/',)),
+    ]
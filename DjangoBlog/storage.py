@@ -0,0 +1,78 @@
+"""
+静态文件存储：文件名带内容哈希，collectstatic 时同时生成预压缩文件
+
+    STORAGES['staticfiles']['BACKEND'] = 'DjangoBlog.storage.CompressedManifestStaticFilesStorage'
+
+collectstatic 把 ``css/style.css`` 保存为 ``css/style.3f2a1b9c8d7e.css``，模板中的
+{% static %} 通过 staticfiles.json 清单输出带哈希的地址；内容变化则地址变化，
+可以设置一年的 immutable 缓存。
+
+对文本类文件（CSS、JS、SVG 等）额外写出 ``.gz``，安装了 brotli 时再写出 ``.br``，
+压缩后没有明显变小的文件不保存。DjangoBlog.static_serve 按 Accept-Encoding 选择。
+"""
+import gzip
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.mjs', '.svg', '.json', '.map', '.txt', '.xml', '.html', '.ico', '.ttf', '.eot')
+# 压缩后不小于原文件的95%时不保存
+MIN_RATIO = 0.95
+
+
+def compressors():
+    """可用的预压缩格式：[(扩展名, 压缩函数)]"""
+    available = [('.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        available.append(('.br', lambda data: brotli.compress(data, quality=11)))
+    return available
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    # 清单中没有的文件（例如未运行 collectstatic 的开发环境、测试）退回原文件名
+    manifest_strict = False
+
+    def url_converter(self, name, hashed_files, template=None):
+        converter = super().url_converter(name, hashed_files, template)
+
+        def safe_converter(matchobj):
+            # 第三方CSS/JS引用了未随项目提供的文件（例如 .map），保留原引用而不是中断 collectstatic
+            try:
+                return converter(matchobj)
+            except ValueError:
+                return matchobj.group(0)
+        return safe_converter
+
+    def post_process(self, paths, dry_run=False, **options):
+        hashed_names = []
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if hashed_name and not isinstance(processed, Exception):
+                hashed_names.append(hashed_name)
+            yield name, hashed_name, processed
+        if dry_run:
+            return
+        for hashed_name in dict.fromkeys(hashed_names):
+            if hashed_name.lower().endswith(COMPRESSIBLE_EXTENSIONS):
+                for compressed_name in self.compress(hashed_name):
+                    yield hashed_name, compressed_name, True
+
+    def compress(self, name):
+        """为一个文件写出预压缩版本，返回写出的文件名"""
+        with self.open(name) as f:
+            data = f.read()
+        written = []
+        for extension, compress in compressors():
+            compressed = compress(data)
+            if len(compressed) >= len(data) * MIN_RATIO:
+                continue
+            compressed_name = name + extension
+            if self.exists(compressed_name):
+                self.delete(compressed_name)
+            self._save(compressed_name, ContentFile(compressed))
+            written.append(compressed_name)
+        return written
@@ -0,0 +1,37 @@
+"""
+测试运行器：在测试环境中覆盖部分设置
+
+    TEST_RUNNER = 'DjangoBlog.test_runner.BlogTestRunner'
+
+和 Django 在测试时换用内存邮件后端一样，这些覆盖只在 python manage.py test 建立测试环境时
+生效，不影响开发服务器和部署：
+
+- 后台任务立即同步执行，测试中保存文章后可以直接断言索引、相关文章等结果
+- 静态文件使用普通存储：测试时没有 collectstatic 生成的清单，带哈希的存储会找不到文件
+"""
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+TEST_SETTINGS = {
+    'BLOG_TASK_MODE': 'eager',
+    'STORAGES': {
+        'default': {
+            'BACKEND': 'django.core.files.storage.FileSystemStorage',
+        },
+        'staticfiles': {
+            'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+        },
+    },
+}
+
+
+class BlogTestRunner(DiscoverRunner):
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._test_settings = override_settings(**TEST_SETTINGS)
+        self._test_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._test_settings.disable()
+        super().teardown_test_environment(**kwargs)
@@ -17,8 +17,8 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
-from django.conf.urls.static import static
 from . import views
+from .static_serve import file_serving_patterns
 
 # 自定义错误处理器
 handler404 = 'DjangoBlog.views.handler404'
@@ -35,6 +35,6 @@ urlpatterns = [
 
 # 在开发环境中提供静态文件和媒体文件服务
 # 这样可以确保即使在DEBUG=False的情况下也能正常访问
+# 预压缩文件、带哈希文件名的长期缓存和Range请求见 DjangoBlog/static_serve.py
 if settings.DEBUG or getattr(settings, 'DEVELOPMENT_MODE', False):
-    urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    urlpatterns += file_serving_patterns()
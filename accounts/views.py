@@ -77,7 +77,7 @@ def profile(request):
     user = request.user
     # 显示用户的所有文章（包括草稿和已发布）
     user_posts = user.blog_posts.all().order_by('-created_at')
-    user_comments = user.comment_set.all()
+    user_comments = user.comment_set.select_related('post')
     
     context = {
         'user': user,
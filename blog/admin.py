@@ -1,6 +1,13 @@
 from django.contrib import admin
+from django.db import IntegrityError, transaction
+from django.utils import timezone
 from django.utils.html import format_html
-from .models import Category, Post, Comment
+from . import page_cache, tasks
+from .counters import recount_comments
+from .images import variant_url
+from .models import Category, Post, Comment, Task
+from .sidebar import RECENT_COMMENTS
+from .signals import refresh_sidebar
 
 
 @admin.register(Category)
@@ -10,10 +17,6 @@ class CategoryAdmin(admin.ModelAdmin):
     search_fields = ('name', 'description')
     prepopulated_fields = {'slug': ('name',)}
     ordering = ('-created_at',)
-    
-    def post_count(self, obj):
-        return obj.posts.count()
-    post_count.short_description = '文章数量'
 
 
 
@@ -46,7 +49,7 @@ class PostAdmin(admin.ModelAdmin):
         if obj.featured_image:
             return format_html(
                 '<img src="{}" style="width: 50px; height: 50px; object-fit: cover; border-radius: 5px;" />',
-                obj.featured_image.url
+                variant_url(obj, 'thumbnail')
             )
         return "无图片"
     featured_image_preview.short_description = '特色图片'
@@ -54,6 +57,11 @@ class PostAdmin(admin.ModelAdmin):
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('author', 'category')
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # 标签在 save_model 之后才保存，这里再计算相关文章
+        tasks.update_related.delay(form.instance.pk, key=f'related:{form.instance.pk}')
+
 
 @admin.register(Comment)
 class CommentAdmin(admin.ModelAdmin):
@@ -71,15 +79,56 @@ class CommentAdmin(admin.ModelAdmin):
         return obj.content
     content_preview.short_description = '评论内容'
     
+    def _set_approved(self, queryset, approved):
+        """批量修改审核状态，返回修改的评论数"""
+        # update() 之后 queryset 会按新状态重新求值（例如按“未批准”筛选时变为空），先取出受影响的文章
+        post_ids = set(queryset.values_list('post_id', flat=True))
+        count = queryset.count()
+        queryset.update(is_approved=approved)
+        # update() 不触发信号：重新统计评论数，失效这些文章的缓存和最新评论侧边栏
+        recount_comments(post_ids)
+        page_cache.purge(*map(page_cache.post_key, post_ids))
+        refresh_sidebar(RECENT_COMMENTS)
+        return count
+
     def approve_comments(self, request, queryset):
-        queryset.update(is_approved=True)
-        self.message_user(request, f'已批准 {queryset.count()} 条评论')
+        count = self._set_approved(queryset, True)
+        self.message_user(request, f'已批准 {count} 条评论')
     approve_comments.short_description = '批准选中的评论'
     
     def disapprove_comments(self, request, queryset):
-        queryset.update(is_approved=False)
-        self.message_user(request, f'已取消批准 {queryset.count()} 条评论')
+        count = self._set_approved(queryset, False)
+        self.message_user(request, f'已取消批准 {count} 条评论')
     disapprove_comments.short_description = '取消批准选中的评论'
     
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('post', 'author')
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('name', 'args', 'key', 'status', 'attempts', 'run_after', 'created_at')
+    list_filter = ('status', 'name')
+    search_fields = ('name', 'key')
+    readonly_fields = ('locked_at', 'last_error', 'created_at')
+    ordering = ('-created_at',)
+    actions = ['retry_tasks']
+
+    def retry_tasks(self, request, queryset):
+        count = 0
+        for task in queryset.exclude(status='running'):
+            task.status = 'pending'
+            task.attempts = 0
+            task.run_after = timezone.now()
+            try:
+                with transaction.atomic():
+                    task.save()
+            except IntegrityError:
+                # 同一个key已有等待执行的任务
+                task.delete()
+                continue
+            if tasks.get_mode() == 'thread':
+                tasks.executor.submit(task.pk)
+            count += 1
+        self.message_user(request, f'已重新排队 {count} 个任务')
+    retry_tasks.short_description = '重新执行选中的任务'
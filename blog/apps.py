@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class BlogConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'blog'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from DjangoBlog.profiling import install_query_dispatch
+
+        # 注册信号处理器
+        from . import signals  # noqa: F401
+        # 每个数据库连接（包括线程池中的连接）都把查询分发给性能分析和基准测试的统计
+        connection_created.connect(install_query_dispatch, dispatch_uid='blog.query_dispatch')
@@ -0,0 +1,51 @@
+"""
+异步视图的并发查询
+
+Django 的异步ORM（aget、afirst 等）内部仍通过 sync_to_async(thread_sensitive=True)
+在同一个线程中依次执行，同一请求的查询不会重叠。列表页和详情页中互不依赖的查询
+（当前页文章、侧边栏、评论、相关文章）用 gather_queries() 分别在线程池中执行，
+每个线程使用自己的数据库连接，总耗时取决于最慢的一组而不是各组之和：
+
+    page_obj, sidebar = await gather_queries(load_page, get_sidebar_context)
+
+每个函数必须在内部把查询集求值完毕（例如转成列表），返回后不能再触发查询。
+
+以下情况改为在请求线程中依次执行：
+- BLOG_ASYNC_PARALLEL_QUERIES = False
+- 请求线程的连接处于事务中（例如 ATOMIC_REQUESTS 或测试用例），其他连接看不到未提交的数据
+
+线程池中的查询使用各自线程的连接，不经过请求线程上安装的 execute_wrapper；
+需要统计全部查询时使用 DjangoBlog.profiling.observe_queries（性能分析中间件、bench_views）。
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+
+def parallel_enabled():
+    return getattr(settings, 'BLOG_ASYNC_PARALLEL_QUERIES', True)
+
+
+def _in_transaction():
+    return connection.in_atomic_block
+
+
+def _run_and_close(func):
+    def run():
+        try:
+            return func()
+        finally:
+            # 线程池中的线程不经过 request_finished，按 CONN_MAX_AGE 关闭过期或出错的连接（包括从库）
+            close_old_connections()
+    return run
+
+
+async def gather_queries(*funcs):
+    """并发执行若干个互不依赖的同步查询函数，按顺序返回结果"""
+    if not parallel_enabled() or await sync_to_async(_in_transaction)():
+        return [await sync_to_async(func)() for func in funcs]
+    return await asyncio.gather(*(
+        sync_to_async(_run_and_close(func), thread_sensitive=False)() for func in funcs
+    ))
@@ -0,0 +1,100 @@
+"""
+评论树
+
+每条评论保存 path（从顶层评论到自身的定长ID路径，例如 ``0000000012/0000000015``）、
+thread（所属的顶层评论）和 depth。按 path 排序就是深度优先的显示顺序，因此：
+
+- thread_page：一页顶层评论连同它们的全部回复，一次查询取出（作者一并JOIN）
+- load_thread：单个评论串的全部回复，一次查询
+- build_tree：把按 path 排序的扁平列表组装成嵌套结构，模板递归渲染
+"""
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db.models import Count, Q
+
+SEGMENT_WIDTH = 10
+# 最大回复层级，更深的回复挂到上一级评论下（path 最长约 MAX_DEPTH * 11 个字符）
+MAX_DEPTH = 8
+
+
+def path_segment(pk):
+    return f'{pk:0{SEGMENT_WIDTH}d}'
+
+
+def limit_reply_depth(comment):
+    """超过最大层级的回复改为回复上一级评论"""
+    while comment.parent is not None and comment.parent.depth >= MAX_DEPTH - 1:
+        comment.parent = comment.parent.parent
+
+
+def assign_tree_fields(comment):
+    """根据父评论计算 path、thread 和 depth（评论需已有主键）"""
+    parent = comment.parent
+    if parent is None:
+        comment.path = path_segment(comment.pk)
+        comment.thread_id = comment.pk
+        comment.depth = 0
+    else:
+        comment.path = f'{parent.path}/{path_segment(comment.pk)}'
+        comment.thread_id = parent.thread_id or parent.pk
+        comment.depth = parent.depth + 1
+
+
+def build_tree(comments):
+    """按 path 排序的评论列表 -> 顶层评论列表，每条评论的 children 为其直接回复
+
+    父评论不在列表中（例如未通过审核）的回复不显示。
+    """
+    nodes = {}
+    roots = []
+    for comment in comments:
+        comment.children = []
+        if comment.parent_id is None:
+            roots.append(comment)
+        elif comment.parent_id in nodes:
+            nodes[comment.parent_id].children.append(comment)
+        else:
+            continue
+        nodes[comment.pk] = comment
+    return roots
+
+
+def _approved(post):
+    from .models import Comment
+
+    return Comment.objects.filter(post=post, is_approved=True)
+
+
+def _with_replies(threads):
+    from .models import Comment
+
+    return Comment.objects.filter(thread__in=threads, is_approved=True).select_related('author').order_by('path')
+
+
+def thread_page(post, number, per_page=None):
+    """文章评论的一页：顶层评论分页，每个评论串完整显示
+
+    共两次查询：一次聚合得到评论总数和评论串数，一次取出本页的全部评论。
+    返回的 page.object_list 为顶层评论列表，page.paginator.comment_total 为评论总数。
+    """
+    per_page = per_page or getattr(settings, 'BLOG_COMMENTS_PER_PAGE', 20)
+    stats = _approved(post).aggregate(total=Count('pk'), threads=Count('pk', filter=Q(depth=0)))
+
+    roots = _approved(post).filter(depth=0).order_by('path')
+    paginator = Paginator(roots, per_page)
+    paginator.count = stats['threads']
+    paginator.comment_total = stats['total']
+    page = paginator.get_page(number)
+
+    if paginator.count:
+        thread_ids = roots.values('pk')[page.start_index() - 1:page.end_index()]
+        page.object_list = build_tree(_with_replies(thread_ids))
+    else:
+        page.object_list = []
+    return page
+
+
+def load_thread(root_id):
+    """单个评论串（顶层评论及全部回复），一次查询"""
+    roots = build_tree(_with_replies([root_id]))
+    return roots[0] if roots else None
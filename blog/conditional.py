@@ -0,0 +1,126 @@
+"""
+条件请求（ETag / Last-Modified）
+
+匿名用户的 GET/HEAD 请求先计算校验值，客户端缓存仍然有效时直接返回 304，
+不执行视图，也不读取整页缓存。
+
+- 文章详情：文章的 updated_at、最新评论时间和评论数，加上文章和分类的代理键令牌
+  （相关文章变化时会更换文章令牌）。详情页没有侧边栏，不依赖 ``sidebar`` 令牌；
+  令牌不是时间戳，无法据此推出 Last-Modified，所以详情页只提供 ETag
+- 列表页：代理键令牌作为代数（generation），任何文章、评论、分类、标签变更都会通过
+  refresh_sidebar() 更换 ``sidebar`` 令牌；再加上路径和规范化后的查询字符串
+"""
+import asyncio
+import hashlib
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from . import page_cache
+from .models import Post
+from .slugs import normalize_slug
+
+# 列表页依赖的代数
+LIST_GENERATION_KEYS = (page_cache.POSTS_KEY, page_cache.SIDEBAR_KEY)
+
+
+def is_enabled():
+    return getattr(settings, 'BLOG_CONDITIONAL_GET', True)
+
+
+def _etag(*parts):
+    return quote_etag(hashlib.md5('|'.join(map(str, parts)).encode('utf-8')).hexdigest())
+
+
+def _tokens(*keys):
+    # 未分类文章的 category_key 为 None
+    tokens = page_cache.current_tokens(filter(None, keys))
+    return [tokens[key] for key in sorted(tokens)]
+
+
+def list_validators(request, *args, **kwargs):
+    """列表页的校验值：代数 + 路径 + 规范化的查询字符串，不查询数据库"""
+    return {
+        'etag': _etag(request.path, page_cache.normalize_query(request.GET), *_tokens(*LIST_GENERATION_KEYS)),
+    }
+
+
+def post_validators(request, slug):
+    """文章详情页的校验值，一次查询；文章不存在时返回 None，交给视图处理重定向或404"""
+    row = Post.objects.filter(slug=normalize_slug(slug), status='published').annotate(
+        latest_comment=Max('comments__updated_at'), comment_total=Count('comments'),
+    ).values('pk', 'category_id', 'updated_at', 'latest_comment', 'comment_total').first()
+    if row is None:
+        return None
+    return {
+        'etag': _etag(
+            row['pk'], row['updated_at'].isoformat(), row['latest_comment'], row['comment_total'],
+            *_tokens(page_cache.post_key(row['pk']), page_cache.category_key(row['category_id'])),
+        ),
+        'meta': {'post_id': row['pk']},
+    }
+
+
+def _check(request, validators_func, on_not_modified, args, kwargs):
+    """返回 (validators, 响应)：不适用条件请求时 validators 为 None，客户端缓存有效时响应为304"""
+    if not is_enabled() or not page_cache.is_cacheable_request(request):
+        return None, None
+    validators = validators_func(request, *args, **kwargs)
+    if validators is None:
+        return None, None
+
+    last_modified = validators.get('last_modified')
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(request, etag=validators['etag'], last_modified=timestamp)
+    if response is not None and response.status_code == 304 and on_not_modified is not None:
+        on_not_modified(request, validators.get('meta', {}))
+    return validators, response
+
+
+def _finish(response, validators):
+    last_modified = validators.get('last_modified')
+    response.headers.setdefault('ETag', validators['etag'])
+    if last_modified is not None:
+        response.headers.setdefault('Last-Modified', http_date(int(last_modified.timestamp())))
+    patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+def conditional_page(validators_func, on_not_modified=None):
+    """条件请求装饰器，应放在 cache_anonymous_page 外层，同时支持同步和异步视图
+
+    validators_func(request, *args, **kwargs) 返回 {'etag', 'last_modified', 'meta'} 或 None；
+    on_not_modified(request, meta) 在返回304时调用，例如继续累加浏览量。
+    """
+    def decorator(view_func):
+        if asyncio.iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def async_wrapper(request, *args, **kwargs):
+                validators, response = await sync_to_async(_check)(
+                    request, validators_func, on_not_modified, args, kwargs
+                )
+                if validators is None:
+                    return await view_func(request, *args, **kwargs)
+                if response is None:
+                    response = await view_func(request, *args, **kwargs)
+                    if response.status_code != 200:
+                        return response
+                return _finish(response, validators)
+            return async_wrapper
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            validators, response = _check(request, validators_func, on_not_modified, args, kwargs)
+            if validators is None:
+                return view_func(request, *args, **kwargs)
+            if response is None:
+                response = view_func(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+            return _finish(response, validators)
+        return wrapper
+    return decorator
@@ -0,0 +1,12 @@
+from django.utils.functional import SimpleLazyObject
+
+from .sidebar import get_sidebar_context
+
+
+def sidebar(request):
+    """侧边栏上下文处理器
+
+    使用惰性对象，只有模板真正访问 sidebar 时才读取缓存，
+    登录页、后台等不显示侧边栏的页面没有任何额外开销。
+    """
+    return {'sidebar': SimpleLazyObject(get_sidebar_context)}
@@ -0,0 +1,203 @@
+"""
+计数器
+
+文章浏览量的写回（write-behind）缓冲计数器：
+
+post_detail 每次访问只在内存中累加增量，由后台线程按
+BLOG_VIEW_COUNT_FLUSH_INTERVAL 定期把增量合并为批量的
+``UPDATE ... SET views = views + n`` 写回数据库，避免每次访问都
+读-改-写并争抢SQLite的写锁。进程正常退出时会通过 atexit 写回剩余增量。
+
+冗余计数列 Post.comment_count（已审核评论数）和 Category.post_count（已发布文章数）
+由 blog.signals 用原子的 ``F()`` 更新维护；每个标签的已发布文章数保存在 TagStats 中，
+同样由信号增量维护。recount_* 按实际数据修复偏差（python manage.py recount）。
+"""
+import atexit
+import logging
+import os
+import threading
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+logger = logging.getLogger(__name__)
+
+
+class ViewCounter:
+    """按文章ID缓冲浏览量增量的计数器（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = defaultdict(int)
+        self._flusher = None
+        self._stop = threading.Event()
+        self._pid = os.getpid()
+
+    @property
+    def interval(self):
+        return getattr(settings, 'BLOG_VIEW_COUNT_FLUSH_INTERVAL', 10)
+
+    def incr(self, post_id, n=1):
+        """记录 n 次浏览，间隔为0时直接写回数据库"""
+        self._check_fork()
+        with self._lock:
+            self._pending[post_id] += n
+        if self.interval <= 0:
+            self.flush()
+        else:
+            self._ensure_flusher()
+
+    async def aincr(self, post_id, n=1):
+        """异步视图使用：只在内存中累加，不等待写回；间隔为0时在线程中写回"""
+        if self.interval <= 0:
+            await sync_to_async(self.incr)(post_id, n)
+        else:
+            self.incr(post_id, n)
+
+    def pending(self, post_id):
+        """尚未写回数据库的浏览量增量"""
+        return self._pending.get(post_id, 0)
+
+    def flush(self):
+        """把缓冲的增量批量写回数据库，返回写回的浏览次数"""
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(int)
+        if not pending:
+            return 0
+
+        from .models import Post
+
+        # 增量相同的文章合并为一条UPDATE
+        by_delta = defaultdict(list)
+        for post_id, delta in pending.items():
+            by_delta[delta].append(post_id)
+
+        try:
+            with transaction.atomic():
+                for delta, post_ids in by_delta.items():
+                    Post.objects.filter(pk__in=post_ids).update(views=F('views') + delta)
+        except Exception:
+            # 写回失败时把增量放回缓冲区，下次再试
+            logger.exception('浏览量写回失败，将在下次重试')
+            with self._lock:
+                for post_id, delta in pending.items():
+                    self._pending[post_id] += delta
+            return 0
+
+        from .sidebar import invalidate_sidebar, POPULAR_POSTS
+        invalidate_sidebar(POPULAR_POSTS)
+        return sum(pending.values())
+
+    def _check_fork(self):
+        # fork出的子进程不能继承父进程的锁和后台线程
+        if self._pid != os.getpid():
+            self.__init__()
+
+    def _ensure_flusher(self):
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        with self._lock:
+            if self._flusher is not None and self._flusher.is_alive():
+                return
+            self._flusher = threading.Thread(
+                target=self._run, name='blog-view-counter', daemon=True
+            )
+            self._flusher.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.flush()
+            finally:
+                # 后台线程持有的数据库连接用完即关闭
+                connection.close()
+
+    def shutdown(self):
+        """停止后台线程并写回全部剩余增量"""
+        self._stop.set()
+        if self._flusher is not None:
+            self._flusher.join(timeout=self.interval + 5)
+        self.flush()
+
+
+view_counter = ViewCounter()
+atexit.register(view_counter.shutdown)
+
+
+def adjust_comment_count(post_id, delta):
+    from .models import Post
+
+    if post_id and delta:
+        Post.objects.filter(pk=post_id).update(comment_count=F('comment_count') + delta)
+
+
+def adjust_category_count(category_id, delta):
+    from .models import Category
+
+    if category_id and delta:
+        Category.objects.filter(pk=category_id).update(post_count=F('post_count') + delta)
+
+
+def adjust_tag_counts(tag_ids, delta):
+    from .models import TagStats
+
+    tag_ids = set(tag_ids)
+    if not tag_ids or not delta:
+        return
+    stats = TagStats.objects.filter(tag__in=tag_ids)
+    if delta < 0:
+        # 计数已有偏差时不减到负数，交给 recount 修复
+        stats = stats.filter(post_count__gte=-delta)
+    updated = stats.update(post_count=F('post_count') + delta)
+    if delta > 0 and updated < len(tag_ids):
+        # 还没有统计行的标签（例如通过 bulk_create 创建的标签）
+        missing = tag_ids - set(TagStats.objects.filter(tag__in=tag_ids).values_list('tag', flat=True))
+        TagStats.objects.bulk_create(
+            [TagStats(tag_id=tag_id, post_count=delta) for tag_id in missing], ignore_conflicts=True
+        )
+
+
+def _recount(queryset, field, actual):
+    """只改写计数与实际不一致的行，返回修复的行数"""
+    actual = Coalesce(Subquery(actual), 0)
+    drifted = queryset.annotate(actual=actual).exclude(**{field: F('actual')}).values('pk')
+    return queryset.model.objects.filter(pk__in=drifted).update(**{field: actual})
+
+
+def recount_comments(post_ids=None):
+    from .models import Post, Comment
+
+    posts = Post.objects.all() if post_ids is None else Post.objects.filter(pk__in=post_ids)
+    actual = Comment.objects.filter(post=OuterRef('pk'), is_approved=True).order_by().values('post').annotate(
+        n=Count('pk')
+    ).values('n')
+    return _recount(posts, 'comment_count', actual)
+
+
+def recount_categories():
+    from .models import Category, Post
+
+    actual = Post.objects.filter(category=OuterRef('pk'), status='published').order_by().values('category').annotate(
+        n=Count('pk')
+    ).values('n')
+    return _recount(Category.objects.all(), 'post_count', actual)
+
+
+def recount_tags():
+    from django.contrib.contenttypes.models import ContentType
+    from taggit.models import Tag, TaggedItem
+
+    from .models import Post, TagStats
+
+    missing = Tag.objects.filter(stats__isnull=True).values_list('pk', flat=True)
+    TagStats.objects.bulk_create([TagStats(tag_id=tag_id) for tag_id in missing], ignore_conflicts=True)
+    actual = TaggedItem.objects.filter(
+        tag=OuterRef('pk'),
+        content_type=ContentType.objects.get_for_model(Post),
+        object_id__in=Post.objects.filter(status='published').values('pk'),
+    ).order_by().values('tag').annotate(n=Count('pk')).values('n')
+    return _recount(TagStats.objects.all(), 'post_count', actual)
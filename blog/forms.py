@@ -1,7 +1,16 @@
+import re
+import unicodedata
+
 from django import forms
+from django.utils.text import slugify
 from .models import Post, Comment
 from taggit.forms import TagWidget
 
+# 预编译slug生成用到的正则
+CHINESE_RE = re.compile(r'[\u4e00-\u9fff]')
+SLUG_SEPARATOR_RE = re.compile(r'[:：；!?，。、（）()\s]+')
+HYPHENS_RE = re.compile(r'-+')
+
 
 class PostForm(forms.ModelForm):
     class Meta:
@@ -35,20 +44,16 @@ class PostForm(forms.ModelForm):
         slug = self.cleaned_data['slug']
         if not slug:
             # 如果标题包含中文，直接使用原标题作为slug，否则使用Django的slugify
-            import re
-            title = self.cleaned_data['title']
-            if re.search(r'[\u4e00-\u9fff]', title):
-                # 包含中文，清理特殊字符后使用原标题
-                import unicodedata
-                # 规范化Unicode字符
+            title = self.cleaned_data.get('title', '')
+            if CHINESE_RE.search(title):
+                # 包含中文，规范化Unicode字符后清理特殊字符
                 slug = unicodedata.normalize('NFKC', title.strip())
                 # 替换URL不友好的特殊字符 - 包括中文标点
-                slug = re.sub(r'[:：；!?，。、（）()\s]+', '-', slug)
-                slug = re.sub(r'-+', '-', slug)  # 合并多个连字符
+                slug = SLUG_SEPARATOR_RE.sub('-', slug)
+                slug = HYPHENS_RE.sub('-', slug)  # 合并多个连字符
                 slug = slug.strip('-')  # 去除首尾连字符
             else:
                 # 不包含中文，使用Django的slugify
-                from django.utils.text import slugify
                 slug = slugify(title)
         
         # 清理slug - 去除首尾空格，限制长度
@@ -56,9 +61,18 @@ class PostForm(forms.ModelForm):
         if len(slug) > 200:
             slug = slug[:200].strip()
         
-        # 不再检查slug重复，让模型save方法处理
+        # 不再检查slug重复，由模型save方法分配空闲slug
         return slug
 
+    def validate_unique(self):
+        # slug冲突不作为表单错误，由 Post.save 自动分配带后缀的slug
+        exclude = self._get_validation_exclusions()
+        exclude.add('slug')
+        try:
+            self.instance.validate_unique(exclude=exclude)
+        except forms.ValidationError as e:
+            self._update_errors(e)
+
     def clean_title(self):
         title = self.cleaned_data['title']
         if len(title) < 5:
@@ -77,14 +91,21 @@ class PostForm(forms.ModelForm):
 class CommentForm(forms.ModelForm):
     class Meta:
         model = Comment
-        fields = ['content']
+        fields = ['content', 'parent']
         widgets = {
             'content': forms.Textarea(attrs={
                 'class': 'form-control',
                 'rows': 4,
                 'placeholder': '请输入您的评论内容...'
             }),
+            'parent': forms.HiddenInput(),
         }
         labels = {
             'content': '评论内容',
-        }
\ No newline at end of file
+        }
+
+    def __init__(self, *args, post=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # 只能回复同一篇文章下已审核的评论
+        if post is not None:
+            self.fields['parent'].queryset = Comment.objects.filter(post=post, is_approved=True)
\ No newline at end of file
@@ -0,0 +1,122 @@
+"""
+模板片段缓存
+
+整页缓存只对匿名用户有效，登录用户的页面每次都要完整渲染。文章卡片、文章的分类标签和
+相关文章这些区块与当前用户无关，可以单独缓存，登录用户的页面只需渲染因人而异的部分：
+
+    {% load blog_cache %}
+    {% cachefragment 'post_card' post search_query %}...{% endcachefragment %}
+    {% cachefragment 'related_posts' post depends=related_posts %}...{% endcachefragment %}
+
+缓存键由片段名、BLOG_FRAGMENT_CACHE_VERSION 和各个参数组成，模型实例取
+``app_label.model:主键:updated_at``，内容修改后自然落到新的键上。
+
+每个条目同时记录依赖的代理键令牌（与 blog.page_cache 共用），文章取 ``post:ID``、
+所属分类和已预取的标签，分类取 ``category:ID``，标签取 ``tag:ID``。信号对整页缓存
+调用的 purge() 同样使相关片段失效。depends 声明键中没有体现、但片段内容用到的对象，
+只在未命中时求值，命中时不会触发查询。
+
+浏览量的写回不修改 updated_at，也不失效代理键，因此不能放在片段中，应在片段之外渲染。
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Model
+from taggit.models import Tag
+
+from . import page_cache
+
+FRAGMENT_CACHE_PREFIX = 'blog:fragment:'
+
+
+def is_enabled():
+    return getattr(settings, 'BLOG_FRAGMENT_CACHE_ENABLED', True)
+
+
+def _iter_values(value):
+    """参数可以是单个值，也可以是模型实例的列表或查询集"""
+    if isinstance(value, (list, tuple)) or hasattr(value, 'model'):
+        for item in value:
+            yield from _iter_values(item)
+    else:
+        yield value
+
+
+def version_part(value):
+    """参数在缓存键中的表示，模型实例带上 updated_at"""
+    if isinstance(value, Model):
+        # 只读取已加载的字段，避免延迟加载触发查询
+        updated_at = value.__dict__.get('updated_at')
+        version = updated_at.isoformat() if updated_at else ''
+        return f'{value._meta.label_lower}:{value.pk}:{version}'
+    return str(value)
+
+
+def surrogate_keys(value):
+    """模型实例对应的代理键，其他值没有代理键"""
+    from .models import Post, Category
+
+    if isinstance(value, Post):
+        keys = {page_cache.post_key(value.pk), page_cache.category_key(value.category_id)}
+        # 只使用已预取的标签，不为了计算代理键额外查询
+        prefetched = getattr(value, '_prefetched_objects_cache', {})
+        if 'tags' in prefetched:
+            keys.update(page_cache.tag_key(tag.pk) for tag in prefetched['tags'])
+        return keys - {None}
+    if isinstance(value, Category):
+        return {page_cache.category_key(value.pk)}
+    if isinstance(value, Tag):
+        return {page_cache.tag_key(value.pk)}
+    return set()
+
+
+def fragment_cache_key(name, vary_on):
+    parts = [str(getattr(settings, 'BLOG_FRAGMENT_CACHE_VERSION', 1))]
+    for value in vary_on:
+        parts.extend(version_part(item) for item in _iter_values(value))
+    digest = hashlib.md5('|'.join(parts).encode('utf-8')).hexdigest()
+    return f'{FRAGMENT_CACHE_PREFIX}{name}:{digest}'
+
+
+def get(key):
+    """读取片段，未命中或任何一个代理键已失效时返回 None"""
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    if page_cache.current_tokens(entry['tokens'], create_missing=False) != entry['tokens']:
+        return None
+    return entry['html']
+
+
+def is_cached(name, vary_on):
+    """片段是否已缓存且仍然有效，视图据此跳过只有该片段才用到的查询"""
+    return is_enabled() and get(fragment_cache_key(name, vary_on)) is not None
+
+
+def get_or_render(name, vary_on, render, depends=()):
+    """读取片段，未命中时调用 render() 渲染并写入
+
+    depends 为返回额外依赖的函数列表，只在未命中时调用；依赖可以是模型实例，
+    也可以是代理键字符串（例如 page_cache.SIDEBAR_KEY）。
+    """
+    if not is_enabled():
+        return render()
+
+    key = fragment_cache_key(name, vary_on)
+    html = get(key)
+    if html is not None:
+        return html
+
+    keys = set()
+    for value in vary_on:
+        for item in _iter_values(value):
+            keys |= surrogate_keys(item)
+    for resolve in depends:
+        for item in _iter_values(resolve()):
+            keys |= {item} if isinstance(item, str) else surrogate_keys(item)
+    # 渲染前记录令牌，渲染期间发生的 purge 会让这次写入的条目直接失效
+    tokens = page_cache.current_tokens(keys)
+    html = render()
+    cache.set(key, {'tokens': tokens, 'html': html}, getattr(settings, 'BLOG_FRAGMENT_CACHE_TIMEOUT', 300))
+    return html
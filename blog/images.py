@@ -0,0 +1,127 @@
+"""
+文章特色图片的响应式尺寸
+
+上传或更换 Post.featured_image 后，在请求线程之外为每个尺寸生成 WebP 和 JPEG 两种格式：
+
+- thumbnail：后台列表、侧边栏热门文章
+- card：文章列表卡片
+- hero：文章详情页头图
+
+文件名取自生成内容的哈希（``posts/variants/<sha256前20位>.webp``），内容不变则地址不变，
+可以长期缓存；相同内容只保存一份。生成结果记录在 Post.image_variants 中，模板通过
+``{% srcset post 'card' %}`` 输出 <picture>，尚未生成时退回原图。
+
+生成工作通过 blog.tasks 的后台任务队列执行；处理失败或遗漏的文章可以用
+``python manage.py generate_image_variants --missing`` 补齐。
+"""
+import hashlib
+import io
+import logging
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+VARIANT_DIR = 'posts/variants'
+# 各尺寸的宽度（像素），原图更窄时不放大
+VARIANTS = {
+    'thumbnail': 160,
+    'card': 640,
+    'hero': 1280,
+}
+# 格式 -> (PIL格式名, 扩展名, 保存参数)
+FORMATS = {
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 6}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def _encode(image, fmt):
+    pil_format, extension, options = FORMATS[fmt]
+    if fmt == 'jpeg' and image.mode != 'RGB':
+        # JPEG不支持透明通道，透明部分铺白底
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        rgba = image.convert('RGBA')
+        background.paste(rgba, mask=rgba.getchannel('A'))
+        image = background
+    buffer = io.BytesIO()
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue(), extension
+
+
+def _store(content, extension):
+    """按内容哈希保存，已存在的相同内容直接复用"""
+    name = f'{VARIANT_DIR}/{hashlib.sha256(content).hexdigest()[:20]}.{extension}'
+    if not default_storage.exists(name):
+        name = default_storage.save(name, ContentFile(content))
+    return name
+
+
+def render_variants(field_file):
+    """为一张图片生成全部尺寸和格式，返回 {尺寸名: {'width', 'height', 'webp', 'jpeg'}}"""
+    with field_file.open('rb'):
+        image = Image.open(field_file)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+
+    variants = {}
+    for name, max_width in VARIANTS.items():
+        width = min(max_width, image.width)
+        height = max(round(image.height * width / image.width), 1)
+        resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+        entry = {'width': width, 'height': height}
+        for fmt in FORMATS:
+            entry[fmt] = _store(*_encode(resized, fmt))
+        variants[name] = entry
+    return variants
+
+
+def generate_variants(post_id):
+    """生成并记录文章特色图片的各个尺寸，返回 image_variants；没有图片或处理失败时返回 None"""
+    from . import page_cache
+    from .models import Post
+    from .sidebar import invalidate_sidebar, POPULAR_POSTS
+
+    post = Post.objects.filter(pk=post_id).only('pk', 'featured_image').first()
+    if post is None or not post.featured_image:
+        return None
+    source = post.featured_image.name
+    try:
+        data = {'source': source, 'variants': render_variants(post.featured_image)}
+    except (OSError, ValueError, Image.DecompressionBombError):
+        logger.exception('文章 %s 的特色图片 %s 处理失败', post_id, source)
+        return None
+
+    # 生成期间图片又被更换时丢弃结果，新图片会另行生成
+    if not Post.objects.filter(pk=post_id, featured_image=source).update(image_variants=data):
+        return None
+    invalidate_sidebar(POPULAR_POSTS)
+    page_cache.purge(page_cache.post_key(post_id), page_cache.SIDEBAR_KEY)
+    return data
+
+
+def schedule_variants(post_id):
+    """提交后台任务生成图片尺寸，不占用请求线程"""
+    from .tasks import generate_image_variants
+
+    generate_image_variants.delay(post_id, key=f'image_variants:{post_id}')
+
+
+def current_variants(post):
+    """当前特色图片已生成的尺寸，{尺寸名: 信息}；尚未生成或已过期时为空"""
+    data = post.image_variants or {}
+    if not post.featured_image or data.get('source') != post.featured_image.name:
+        return {}
+    return data.get('variants', {})
+
+
+def variant_url(post, variant, fmt='jpeg'):
+    """指定尺寸的地址，尚未生成时返回原图地址"""
+    entry = current_variants(post).get(variant)
+    if entry:
+        return default_storage.url(entry[fmt])
+    return post.featured_image.url if post.featured_image else ''
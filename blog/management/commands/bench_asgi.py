@@ -0,0 +1,216 @@
+"""
+ASGI 与 WSGI 入口的并发延迟对比
+
+    python manage.py seed_blog --posts 5000
+    python manage.py bench_asgi --requests 200 --concurrency 16
+    python manage.py bench_asgi --interface asgi --json > asgi.json
+
+在进程内直接调用 DjangoBlog.asgi.application 和 DjangoBlog.wsgi.application：
+ASGI 用 asyncio 同时发起 --concurrency 个请求，WSGI 用同样数量的线程，
+统计每个路由的 p50/p95/p99 延迟和吞吐量。不经过网络和服务器进程，
+结果反映的是两种入口本身及异步视图并发查询的差异。
+"""
+import asyncio
+import io
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote, unquote_to_bytes, urlencode
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from django.urls import reverse
+from taggit.models import Tag
+
+from blog.models import Post, Category
+
+from .bench_views import percentile
+
+INTERFACES = ('asgi', 'wsgi')
+
+
+def asgi_scope(path, query_string):
+    return {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        # ASGI 的 path 为解码后的字符串，raw_path 为原始字节
+        'path': unquote(path),
+        'raw_path': path.encode('ascii'),
+        'query_string': query_string.encode('utf-8'),
+        'root_path': '',
+        'headers': [(b'host', b'localhost')],
+        'client': ('127.0.0.1', 0),
+        'server': ('localhost', 80),
+    }
+
+
+def wsgi_environ(path, query_string):
+    return {
+        'REQUEST_METHOD': 'GET',
+        # WSGI 的 PATH_INFO 为按 latin-1 解码的原始字节
+        'PATH_INFO': unquote_to_bytes(path).decode('iso-8859-1'),
+        'QUERY_STRING': query_string,
+        'SCRIPT_NAME': '',
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': 'localhost',
+        'REMOTE_ADDR': '127.0.0.1',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+
+
+async def asgi_request(application, url):
+    """发起一次ASGI请求，返回 (状态码, 耗时毫秒)"""
+    path, _, query_string = url.partition('?')
+    messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+    status = []
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        # 请求体已读完，等待断开（不会发生）
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+
+    start = time.perf_counter()
+    await application(asgi_scope(path, query_string), receive, send)
+    return status[0], (time.perf_counter() - start) * 1000
+
+
+def wsgi_request(application, url):
+    """发起一次WSGI请求，返回 (状态码, 耗时毫秒)"""
+    path, _, query_string = url.partition('?')
+    status = []
+
+    def start_response(status_line, headers, exc_info=None):
+        status.append(int(status_line.split()[0]))
+
+    start = time.perf_counter()
+    result = application(wsgi_environ(path, query_string), start_response)
+    try:
+        for _ in result:
+            pass
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return status[0], (time.perf_counter() - start) * 1000
+
+
+class Command(BaseCommand):
+    help = '在并发请求下比较 ASGI 与 WSGI 入口的尾延迟'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='每个路由的请求次数')
+        parser.add_argument('--concurrency', type=int, default=16, help='同时进行的请求数')
+        parser.add_argument('--warmup', type=int, default=5, help='不计入统计的预热请求次数')
+        parser.add_argument('--interface', choices=INTERFACES, nargs='*', default=list(INTERFACES))
+        parser.add_argument('--routes', nargs='*', help='只测试这些路由名，例如 blog:post_list')
+        parser.add_argument('--page-cache', action='store_true', help='开启匿名用户整页缓存（默认关闭）')
+        parser.add_argument('--json', action='store_true', help='以JSON格式输出结果')
+
+    def handle(self, *args, **options):
+        routes = self.build_routes()
+        if options['routes']:
+            routes = {name: url for name, url in routes.items() if name in options['routes']}
+        if options['concurrency'] < 1 or options['requests'] < 1:
+            raise CommandError('--requests 和 --concurrency 必须大于0')
+
+        results = []
+        # 条件请求和整页缓存会让大部分请求不执行视图，默认关闭
+        with override_settings(
+            BLOG_PAGE_CACHE_ENABLED=options['page_cache'], BLOG_CONDITIONAL_GET=False,
+            PROFILING_ENABLED=False, ALLOWED_HOSTS=['*'],
+        ):
+            for interface in options['interface']:
+                for name, url in routes.items():
+                    results.append(self.bench(interface, name, url, options))
+
+        if options['json']:
+            self.stdout.write(json.dumps({
+                'requests': options['requests'],
+                'concurrency': options['concurrency'],
+                'page_cache': options['page_cache'],
+                'parallel_queries': getattr(settings, 'BLOG_ASYNC_PARALLEL_QUERIES', True),
+                'results': results,
+            }, ensure_ascii=False, indent=2))
+            return
+        self.print_table(results)
+
+    def build_routes(self):
+        post = Post.objects.filter(status='published').first()
+        if post is None:
+            raise CommandError('没有已发布的文章，请先运行 seed_blog')
+        routes = {
+            'blog:post_list': reverse('blog:post_list'),
+            'blog:post_list?q=': f'{reverse("blog:post_list")}?{urlencode({"q": post.title[:4]})}',
+            'blog:post_detail': post.get_absolute_url(),
+        }
+        category = Category.objects.filter(posts__status='published').first()
+        if category is not None:
+            routes['blog:category_posts'] = reverse('blog:category_posts', args=[category.slug])
+        tag = Tag.objects.first()
+        if tag is not None:
+            routes['blog:tag_posts'] = reverse('blog:tag_posts', args=[tag.slug])
+        return routes
+
+    def bench(self, interface, name, url, options):
+        total = options['warmup'] + options['requests']
+        start = time.perf_counter()
+        if interface == 'asgi':
+            samples = asyncio.run(self.run_asgi(url, total, options['concurrency']))
+        else:
+            samples = self.run_wsgi(url, total, options['concurrency'])
+        elapsed = time.perf_counter() - start
+
+        statuses = sorted({status for status, _ in samples})
+        timings = [ms for _, ms in samples[options['warmup']:]]
+        return {
+            'interface': interface,
+            'name': name,
+            'status': statuses,
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+            'rps': round(total / elapsed, 1),
+        }
+
+    async def run_asgi(self, url, total, concurrency):
+        from DjangoBlog.asgi import application
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with semaphore:
+                return await asgi_request(application, url)
+
+        return await asyncio.gather(*(one() for _ in range(total)))
+
+    def run_wsgi(self, url, total, concurrency):
+        from DjangoBlog.wsgi import application
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            return list(pool.map(lambda _: wsgi_request(application, url), range(total)))
+
+    def print_table(self, results):
+        self.stdout.write(f'{"入口":<6}{"路由":<24}{"状态":>10}{"p50":>10}{"p95":>10}{"p99":>10}{"请求/秒":>10}')
+        for result in results:
+            status = ','.join(map(str, result['status']))
+            self.stdout.write(
+                f'{result["interface"]:<6}{result["name"]:<24}{status:>10}{result["p50_ms"]:>10.2f}'
+                f'{result["p95_ms"]:>10.2f}{result["p99_ms"]:>10.2f}{result["rps"]:>10.1f}'
+            )
@@ -0,0 +1,171 @@
+"""
+逐个视图的延迟基准测试
+
+    python manage.py seed_blog --posts 5000
+    python manage.py bench_views --iterations 50 --json > before.json
+    python manage.py bench_views --iterations 50 --baseline before.json
+
+通过测试客户端请求 blog 和 accounts 的每个路由，统计 p50/p95/p99 延迟、
+每次请求的SQL查询数（包括异步视图在线程池中执行的查询）和响应字节数。
+"""
+import json
+import math
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.urls import reverse
+from taggit.models import Tag
+
+from DjangoBlog.profiling import observe_queries
+from blog.models import Post, Category, Comment
+
+
+def percentile(samples, pct):
+    """最近秩法计算百分位数"""
+    ordered = sorted(samples)
+    rank = max(math.ceil(pct / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+class Route:
+    """一个待测路由：client 为 'anonymous' 或 'author'，setup 在每次请求前（不计时）生成URL"""
+
+    def __init__(self, name, url=None, client='anonymous', setup=None):
+        self.name = name
+        self.url = url
+        self.client = client
+        self.setup = setup
+
+    def prepare(self):
+        return self.setup() if self.setup else self.url
+
+
+class Command(BaseCommand):
+    help = '对 blog 和 accounts 的所有路由做延迟基准测试'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20, help='每个路由的请求次数')
+        parser.add_argument('--warmup', type=int, default=2, help='不计入统计的预热请求次数')
+        parser.add_argument('--routes', nargs='*', help='只测试这些路由名，例如 blog:post_list')
+        parser.add_argument('--no-page-cache', action='store_true', help='关闭匿名用户整页缓存')
+        parser.add_argument('--json', action='store_true', help='以JSON格式输出结果')
+        parser.add_argument('--baseline', help='与之前保存的JSON结果比较p95延迟')
+
+    def handle(self, *args, **options):
+        post = Post.objects.filter(status='published').select_related('author').first()
+        if post is None:
+            raise CommandError('没有已发布的文章，请先运行 seed_blog')
+        author = post.author
+
+        clients = {'anonymous': Client(), 'author': Client()}
+        clients['author'].force_login(author)
+        routes = self.build_routes(post, author, clients)
+        if options['routes']:
+            routes = [route for route in routes if route.name in options['routes']]
+
+        page_cache_enabled = getattr(settings, 'BLOG_PAGE_CACHE_ENABLED', True) and not options['no_page_cache']
+        with override_settings(BLOG_PAGE_CACHE_ENABLED=page_cache_enabled):
+            results = [self.bench(route, clients, options['iterations'], options['warmup']) for route in routes]
+
+        if options['json']:
+            self.stdout.write(json.dumps({
+                'iterations': options['iterations'],
+                'page_cache': page_cache_enabled,
+                'routes': results,
+            }, ensure_ascii=False, indent=2))
+            return
+
+        baseline = {}
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as f:
+                baseline = {result['name']: result for result in json.load(f)['routes']}
+        self.print_table(results, baseline)
+
+    def build_routes(self, post, author, clients):
+        category = Category.objects.filter(posts__status='published').first()
+        tag = Tag.objects.first()
+        post_list = reverse('blog:post_list')
+
+        def comment_to_delete():
+            comment = Comment.objects.create(post=post, author=author, content='基准测试评论')
+            return reverse('blog:delete_comment', args=[comment.pk])
+
+        def logout_url():
+            clients['logout'] = Client()
+            clients['logout'].force_login(author)
+            return reverse('accounts:logout')
+
+        routes = [
+            Route('blog:post_list', post_list),
+            Route('blog:post_list?page=2', f'{post_list}?page=2'),
+            Route('blog:post_list?q=', f'{post_list}?q={post.title[:4]}'),
+            Route('blog:post_detail', post.get_absolute_url()),
+            Route('blog:create_post', reverse('blog:create_post'), client='author'),
+            Route('blog:update_post', reverse('blog:update_post', args=[post.slug]), client='author'),
+            Route('blog:delete_post', reverse('blog:delete_post', args=[post.slug]), client='author'),
+            Route('blog:delete_comment', client='author', setup=comment_to_delete),
+            Route('blog:page_cache_stats', reverse('blog:page_cache_stats'), client='author'),
+            Route('accounts:login', reverse('accounts:login')),
+            Route('accounts:logout', client='logout', setup=logout_url),
+            Route('accounts:register', reverse('accounts:register')),
+            Route('accounts:profile', reverse('accounts:profile'), client='author'),
+            Route('accounts:edit_profile', reverse('accounts:edit_profile'), client='author'),
+            Route('accounts:change_password', reverse('accounts:change_password'), client='author'),
+        ]
+        if category is not None:
+            routes.append(Route('blog:category_posts', reverse('blog:category_posts', args=[category.slug])))
+        if tag is not None:
+            routes.append(Route('blog:tag_posts', reverse('blog:tag_posts', args=[tag.slug])))
+        return routes
+
+    def bench(self, route, clients, iterations, warmup):
+        timings, queries, sizes, statuses = [], [], [], set()
+        for i in range(warmup + iterations):
+            url = route.prepare()
+            client = clients[route.client]
+            captured = []
+
+            def count_query(execute, sql, params, many, context):
+                captured.append(sql)
+                return execute(sql, params, many, context)
+
+            # 异步视图在线程池中并发执行的查询使用其他连接，CaptureQueriesContext 统计不到
+            with observe_queries(count_query):
+                start = time.perf_counter()
+                response = client.get(url)
+                elapsed = time.perf_counter() - start
+            if i < warmup:
+                continue
+            timings.append(elapsed * 1000)
+            queries.append(len(captured))
+            sizes.append(len(response.content))
+            statuses.add(response.status_code)
+        return {
+            'name': route.name,
+            'status': sorted(statuses),
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+            'queries': round(sum(queries) / len(queries), 2),
+            'bytes': round(sum(sizes) / len(sizes)),
+        }
+
+    def print_table(self, results, baseline):
+        header = f'{"路由":<28}{"状态":>10}{"p50":>10}{"p95":>10}{"p99":>10}{"查询":>8}{"字节":>10}'
+        if baseline:
+            header += f'{"p95变化":>10}'
+        self.stdout.write(header)
+        for result in results:
+            status = ','.join(map(str, result['status']))
+            line = (
+                f'{result["name"]:<28}{status:>10}{result["p50_ms"]:>10.2f}{result["p95_ms"]:>10.2f}'
+                f'{result["p99_ms"]:>10.2f}{result["queries"]:>8g}{result["bytes"]:>10}'
+            )
+            previous = baseline.get(result['name'])
+            if previous and previous['p95_ms']:
+                change = (result['p95_ms'] - previous['p95_ms']) / previous['p95_ms'] * 100
+                line += f'{change:>+9.1f}%'
+            self.stdout.write(line)
@@ -0,0 +1,157 @@
+"""
+索引检查：对博客的关键查询执行 EXPLAIN，报告仍然全表扫描或需要临时排序的查询
+
+    python manage.py explain_queries --seed 2000 --fail-on-scan
+
+--seed 会在一个事务中插入测试数据并在结束时回滚，不影响现有数据。
+"""
+import re
+
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from taggit.models import Tag, TaggedItem
+
+from blog.comments import assign_tree_fields
+from blog.counters import recount_tags
+from blog.models import Post, Category, Comment, RelatedPost, SlugRedirect, TagStats
+
+# SQLite: "SCAN blog_post"，3.36 之前为 "SCAN TABLE blog_post"（不带 USING INDEX）；
+# PostgreSQL: "Seq Scan on blog_post"
+FULL_SCAN_RE = re.compile(r'\bSCAN (?:TABLE )?(\w+)\s*$|Seq Scan on (\w+)')
+SORT_RE = re.compile(r'USE TEMP B-TREE FOR ORDER BY|^\W*Sort\b')
+
+# 这些表只有几十行，全表扫描属于正常情况
+SMALL_TABLES = {'blog_category', 'taggit_tag', 'django_content_type'}
+
+# 先按连接表筛选再排序，排序的行数只是该标签的文章数，单表索引无法消除
+EXPECTED_SORTS = {'标签文章'}
+
+
+def key_queries(post, category, tag):
+    """博客的热点查询，与 views.py、sidebar.py 中的写法保持一致"""
+    published = Post.objects.filter(status='published')
+    return [
+        ('文章列表', published.order_by('-created_at')[:10]),
+        ('文章列表（keyset）', published.filter(created_at__lt=post.created_at).order_by('-created_at', '-pk')[:11]),
+        ('分类文章', published.filter(category=category).order_by('-created_at')[:10]),
+        ('标签文章', published.filter(tags__in=[tag]).order_by('-created_at')[:10]),
+        ('热门文章', published.order_by('-views')[:5]),
+        ('热门标签', TagStats.objects.filter(post_count__gt=0).select_related('tag').order_by('-post_count', 'tag')[:15]),
+        ('按slug查找文章', Post.objects.filter(slug=post.slug)),
+        ('slug重定向', SlugRedirect.objects.filter(old_slug=post.slug)),
+        ('评论串分页', post.comments.filter(is_approved=True, depth=0).order_by('path')[:20]),
+        ('评论树', Comment.objects.filter(thread=post.comments.first(), is_approved=True).order_by('path')),
+        ('最新评论', Comment.objects.order_by('-created_at')[:5]),
+        ('相关文章', RelatedPost.objects.filter(post=post).order_by('rank')[:4]),
+    ]
+
+
+def analyze_plan(plan):
+    """返回 (全表扫描的表, 是否需要额外排序)"""
+    scanned = set()
+    needs_sort = False
+    for line in plan.splitlines():
+        match = FULL_SCAN_RE.search(line)
+        if match:
+            scanned.add(match.group(1) or match.group(2))
+        if SORT_RE.search(line):
+            needs_sort = True
+    return scanned - SMALL_TABLES, needs_sort
+
+
+class Command(BaseCommand):
+    help = '对关键查询执行 EXPLAIN，报告未命中索引的查询'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0, help='临时插入的文章数（结束后回滚）')
+        parser.add_argument('--fail-on-scan', action='store_true', help='存在全表扫描或额外排序时以错误退出')
+        parser.add_argument('--verbose-plan', action='store_true', help='输出完整的执行计划')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options['seed']:
+                self.seed(options['seed'])
+            try:
+                problems = self.report(options['verbose_plan'])
+            finally:
+                transaction.set_rollback(True)
+
+        if problems:
+            message = '以下查询存在全表扫描或额外排序：' + '、'.join(problems)
+            if options['fail_on_scan']:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS('所有关键查询均命中索引'))
+
+    def seed(self, count):
+        """插入测试数据，并更新统计信息让查询规划器按真实数据量选择索引"""
+        author = User.objects.create_user(f'explain-seed-{timezone.now():%Y%m%d%H%M%S}')
+        categories = Category.objects.bulk_create([
+            Category(name=f'explain-seed-{i}', slug=f'explain-seed-{i}') for i in range(10)
+        ])
+        posts = Post.objects.bulk_create([
+            Post(
+                title=f'测试文章 {i}', slug=f'explain-seed-{i}', author=author, content='测试内容',
+                category=categories[i % len(categories)], views=i % 97,
+                status='published' if i % 5 else 'draft',
+            )
+            for i in range(count)
+        ])
+        # 每篇文章一条顶层评论和两条回复；全是顶层评论时每棵树只有一行，
+        # 规划器会认为按 path 排序无需走索引
+        threads = Comment.objects.bulk_create([
+            Comment(post=post, author=author, content='测试评论', is_approved=bool(i % 7))
+            for i, post in enumerate(posts)
+        ])
+        for comment in threads:
+            assign_tree_fields(comment)
+        Comment.objects.bulk_update(threads, ['path', 'thread', 'depth'])
+        replies = Comment.objects.bulk_create([
+            Comment(post=parent.post, author=author, content='测试回复', parent=parent, is_approved=bool(i % 7))
+            for i, parent in enumerate(threads * 2)
+        ])
+        for comment in replies:
+            assign_tree_fields(comment)
+        Comment.objects.bulk_update(replies, ['path', 'thread', 'depth'])
+        tags = Tag.objects.bulk_create([
+            Tag(name=f'explain-seed-{author.pk}-{i}', slug=f'explain-seed-{author.pk}-{i}') for i in range(20)
+        ])
+        content_type = ContentType.objects.get_for_model(Post)
+        TaggedItem.objects.bulk_create([
+            TaggedItem(object_id=post.pk, content_type=content_type, tag=tags[(i + offset) % len(tags)])
+            for i, post in enumerate(posts) for offset in range(3)
+        ])
+        recount_tags()
+        if connection.vendor in ('sqlite', 'postgresql'):
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+    def report(self, verbose_plan):
+        post = Post.objects.filter(status='published').first()
+        category = Category.objects.last()
+        tag = Tag.objects.last()
+        if post is None or category is None or tag is None:
+            raise CommandError('没有可用于分析的数据，请使用 --seed 插入测试数据')
+
+        problems = []
+        for name, queryset in key_queries(post, category, tag):
+            plan = queryset.explain()
+            scanned, needs_sort = analyze_plan(plan)
+            if scanned:
+                problems.append(name)
+                self.stdout.write(self.style.ERROR(f'[全表扫描] {name}: {", ".join(sorted(scanned))}'))
+            elif needs_sort and name in EXPECTED_SORTS:
+                self.stdout.write(self.style.WARNING(f'[额外排序] {name}（预期）'))
+            elif needs_sort:
+                # 排序没有走索引，需要读出全部匹配的行再排序，LIMIT 无法提前结束
+                problems.append(name)
+                self.stdout.write(self.style.ERROR(f'[额外排序] {name}'))
+            else:
+                self.stdout.write(f'[索引] {name}')
+            if verbose_plan:
+                self.stdout.write(plan)
+        return problems
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from blog.images import current_variants, generate_variants
+from blog.models import Post
+
+
+class Command(BaseCommand):
+    help = '为已有文章的特色图片生成各个尺寸（WebP/JPEG）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--missing', action='store_true', help='只处理尚未生成或已过期的文章')
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(featured_image='').exclude(featured_image__isnull=True).only(
+            'pk', 'featured_image', 'image_variants'
+        ).order_by('pk')
+        done = failed = 0
+        for post in posts.iterator():
+            if options['missing'] and current_variants(post):
+                continue
+            if generate_variants(post.pk) is None:
+                failed += 1
+            else:
+                done += 1
+        self.stdout.write(self.style.SUCCESS(f'已为 {done} 篇文章生成图片尺寸，{failed} 篇失败'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from blog import related
+
+
+class Command(BaseCommand):
+    help = '全量重建所有文章的相关文章推荐'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='每批写入的记录数')
+
+    def handle(self, *args, **options):
+        count = related.rebuild_all(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'已写入 {count} 条相关文章记录'))
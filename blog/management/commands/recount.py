@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from blog.counters import recount_categories, recount_comments, recount_tags
+from blog.pagination import invalidate_counts
+from blog.sidebar import invalidate_sidebar, CATEGORIES, POPULAR_TAGS
+
+
+class Command(BaseCommand):
+    help = '按实际数据重新统计文章评论数、分类文章数和标签文章数，修复冗余计数的偏差'
+
+    def handle(self, *args, **options):
+        posts = recount_comments()
+        categories = recount_categories()
+        tags = recount_tags()
+        if categories:
+            invalidate_sidebar(CATEGORIES)
+        if tags:
+            invalidate_sidebar(POPULAR_TAGS)
+        invalidate_counts()
+        self.stdout.write(self.style.SUCCESS(
+            f'已修复 {posts} 篇文章的评论数、{categories} 个分类的文章数、{tags} 个标签的文章数'
+        ))
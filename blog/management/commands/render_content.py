@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from blog import rendering
+
+
+class Command(BaseCommand):
+    help = '重新渲染文章内容（content_html、excerpt_text、字数和阅读时间）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='渲染全部文章，修改 BLOG_CONTENT_FORMAT 后使用')
+        parser.add_argument('--batch-size', type=int, default=200, help='每批写入的文章数')
+
+    def handle(self, *args, **options):
+        count = rendering.render_all(force=options['all'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'已渲染 {count} 篇文章（渲染版本 {rendering.RENDERER_VERSION}）'
+        ))
@@ -0,0 +1,44 @@
+"""
+后台任务执行者
+
+    python manage.py run_tasks --workers 4
+    python manage.py run_tasks --once      # 执行完当前到期的任务后退出（适合cron）
+
+可以同时运行多个进程，任务通过条件更新领取，不会重复执行。
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from blog import tasks
+
+
+class Command(BaseCommand):
+    help = '执行后台任务队列中的任务'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='并发执行任务的线程数')
+        parser.add_argument('--batch', type=int, default=100, help='每次领取的最多任务数')
+        parser.add_argument('--interval', type=float, default=1.0, help='队列为空时的轮询间隔（秒）')
+        parser.add_argument('--once', action='store_true', help='执行完当前到期的任务后退出')
+
+    def handle(self, *args, **options):
+        executed = 0
+        with ThreadPoolExecutor(max_workers=options['workers'], thread_name_prefix='blog-task') as pool:
+            # 单线程时直接在当前线程执行
+            run_all = pool.map if options['workers'] > 1 else map
+            try:
+                while True:
+                    tasks.requeue_stale()
+                    task_ids = tasks.due_tasks(options['batch'])
+                    if task_ids:
+                        list(run_all(tasks.run_task_in_thread, task_ids))
+                        executed += len(task_ids)
+                    elif options['once']:
+                        break
+                    else:
+                        time.sleep(options['interval'])
+            except KeyboardInterrupt:
+                pass
+        self.stdout.write(self.style.SUCCESS(f'共处理 {executed} 个任务'))
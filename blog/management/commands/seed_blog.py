@@ -0,0 +1,189 @@
+"""
+生成用于压测的博客数据
+
+    python manage.py seed_blog --users 50 --posts 5000 --comments 8 --seed 42
+
+相同的 --seed 生成相同的用户、文章、标签和评论树（时间相对于运行时刻）。
+所有数据通过 bulk_create 分批写入，不触发逐条保存的信号，
+结束后统一重建检索索引、相关文章并失效缓存。
+"""
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from taggit.models import Tag, TaggedItem
+
+from blog import page_cache, related, search
+from blog.comments import assign_tree_fields
+from blog.counters import recount_categories, recount_comments, recount_tags
+from blog.models import Post, Category, Comment
+from blog.pagination import invalidate_counts
+from blog.rendering import render_post
+from blog.sidebar import invalidate_sidebar
+from blog.slugs import allocate_slugs
+
+WORDS = (
+    'Django Python 数据库 索引 缓存 查询 优化 模板 视图 中间件 部署 性能 并发 异步 测试 '
+    '分页 检索 标签 分类 评论 前端 接口 安全 日志 监控 容器 队列 事务 迁移 设计 架构 算法'
+).split()
+SENTENCE_ENDINGS = '。！？'
+# 评论回复的最大层级
+MAX_COMMENT_DEPTH = 3
+REPLY_PROBABILITY = 0.35
+
+
+def sentence(rng, words=12):
+    return ''.join(rng.choice(WORDS) for _ in range(words)) + rng.choice(SENTENCE_ENDINGS)
+
+
+def paragraph(rng, sentences=5):
+    return ''.join(sentence(rng, rng.randint(6, 16)) for _ in range(sentences))
+
+
+class Command(BaseCommand):
+    help = '批量生成可复现的测试数据（用户、分类、标签、文章和多级评论）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20, help='用户数')
+        parser.add_argument('--categories', type=int, default=8, help='分类数')
+        parser.add_argument('--tags', type=int, default=40, help='标签数')
+        parser.add_argument('--posts', type=int, default=1000, help='文章数')
+        parser.add_argument('--comments', type=int, default=5, help='每篇文章的平均评论数')
+        parser.add_argument('--seed', type=int, default=42, help='随机种子')
+        parser.add_argument('--prefix', default='seed', help='用户名、分类和标签的前缀，用于区分多次生成')
+        parser.add_argument('--batch-size', type=int, default=500, help='每批写入的记录数')
+        parser.add_argument('--skip-index', action='store_true', help='不重建检索索引和相关文章')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.prefix = options['prefix']
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+
+        if User.objects.filter(username__startswith=f'{self.prefix}-user-').exists():
+            raise CommandError(f'前缀 {self.prefix} 的数据已存在，请使用 --prefix 指定新的前缀')
+
+        with transaction.atomic():
+            users = self.create_users(options['users'])
+            categories = self.create_categories(options['categories'])
+            tags = self.create_tags(options['tags'])
+            posts = self.create_posts(options['posts'], users, categories)
+            self.tag_posts(posts, tags)
+            comment_count = self.create_comments(posts, users, options['comments'])
+            # bulk_create 不触发信号，冗余计数一次性重新统计
+            recount_comments([post.pk for post in posts])
+            recount_categories()
+            recount_tags()
+
+        if not options['skip_index']:
+            search.rebuild_index()
+            related.rebuild_all()
+
+        # bulk_create 不触发信号，这里统一失效缓存
+        invalidate_sidebar()
+        invalidate_counts()
+        page_cache.purge(page_cache.POSTS_KEY, page_cache.SIDEBAR_KEY)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'已生成 {len(users)} 个用户、{len(categories)} 个分类、{len(tags)} 个标签、'
+            f'{len(posts)} 篇文章、{comment_count} 条评论'
+        ))
+
+    def create_users(self, count):
+        # 密码哈希很慢，所有测试用户共用同一个哈希（密码为 password）
+        password = make_password('password')
+        return User.objects.bulk_create([
+            User(username=f'{self.prefix}-user-{i}', email=f'{self.prefix}-user-{i}@example.com', password=password)
+            for i in range(count)
+        ], batch_size=self.batch_size)
+
+    def create_categories(self, count):
+        return Category.objects.bulk_create([
+            Category(name=f'{self.prefix}-分类-{i}', slug=f'{self.prefix}-category-{i}', description=sentence(self.rng))
+            for i in range(count)
+        ], batch_size=self.batch_size)
+
+    def create_tags(self, count):
+        return Tag.objects.bulk_create([
+            Tag(name=f'{self.prefix}-标签-{i}', slug=f'{self.prefix}-tag-{i}') for i in range(count)
+        ], batch_size=self.batch_size)
+
+    def random_time(self, after=None, days=365):
+        start = after or self.now - timedelta(days=days)
+        seconds = max(int((self.now - start).total_seconds()), 1)
+        return start + timedelta(seconds=self.rng.randrange(seconds))
+
+    def create_posts(self, count, users, categories):
+        posts = []
+        for i in range(count):
+            title = sentence(self.rng, self.rng.randint(4, 8)).rstrip(SENTENCE_ENDINGS)
+            content = '\n\n'.join(paragraph(self.rng) for _ in range(self.rng.randint(2, 6)))
+            status = 'published' if self.rng.random() < 0.9 else 'draft'
+            posts.append(Post(
+                title=title, slug=title, author=self.rng.choice(users),
+                category=self.rng.choice(categories) if categories and self.rng.random() < 0.9 else None,
+                content=content, excerpt=content[:300], status=status,
+                views=int(self.rng.paretovariate(1.2) * 10),
+            ))
+            # bulk_create 不调用 save()，预渲染字段在这里填充
+            render_post(posts[-1])
+        posts = Post.objects.bulk_create(allocate_slugs(posts, self.batch_size), batch_size=self.batch_size)
+
+        # auto_now_add 会覆盖 created_at，写入后再把时间分散到过去一年
+        for post in posts:
+            post.created_at = self.random_time()
+            post.published_at = post.created_at if post.status == 'published' else None
+        Post.objects.bulk_update(posts, ['created_at', 'published_at'], batch_size=self.batch_size)
+        return posts
+
+    def tag_posts(self, posts, tags):
+        if not tags:
+            return
+        content_type = ContentType.objects.get_for_model(Post)
+        # 标签热度呈长尾分布
+        weights = [1 / (rank + 1) for rank in range(len(tags))]
+        items = []
+        for post in posts:
+            chosen = set(self.rng.choices(tags, weights=weights, k=self.rng.randint(1, 4)))
+            items.extend(TaggedItem(content_type=content_type, object_id=post.pk, tag=tag) for tag in chosen)
+        TaggedItem.objects.bulk_create(items, batch_size=self.batch_size)
+
+    def create_comments(self, posts, users, average):
+        """按层级分批写入评论：先写顶层评论，取得主键后再写下一层回复"""
+        levels = [[] for _ in range(MAX_COMMENT_DEPTH)]
+        # auto_now_add 会在写入时覆盖 created_at，时间单独记录，写入后再回填
+        times = {}
+        for post in posts:
+            if post.status != 'published' or not average:
+                continue
+            thread = []
+            for _ in range(self.rng.randint(0, average * 2)):
+                parent = self.rng.choice(thread) if thread and self.rng.random() < REPLY_PROBABILITY else None
+                depth = parent[1] + 1 if parent else 0
+                if depth >= MAX_COMMENT_DEPTH:
+                    parent, depth = None, 0
+                comment = Comment(
+                    post=post, author=self.rng.choice(users), content=sentence(self.rng),
+                    parent=parent[0] if parent else None,
+                    is_approved=self.rng.random() < 0.95,
+                )
+                times[id(comment)] = self.random_time(after=post.created_at)
+                thread.append((comment, depth))
+                levels[depth].append(comment)
+
+        created = []
+        for level in levels:
+            # 上一层已写入并取得主键，bulk_create 会据此填充 parent_id
+            for comment in Comment.objects.bulk_create(level, batch_size=self.batch_size):
+                comment.created_at = times[id(comment)]
+                assign_tree_fields(comment)
+                created.append(comment)
+        Comment.objects.bulk_update(
+            created, ['created_at', 'path', 'thread', 'depth'], batch_size=self.batch_size
+        )
+        return len(created)
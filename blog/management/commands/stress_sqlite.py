@@ -0,0 +1,207 @@
+"""
+SQLite 并发读写压力测试
+
+    python manage.py seed_blog --posts 2000
+    python manage.py stress_sqlite --readers 8 --writers 4 --duration 10
+
+把当前数据库备份到临时文件，分别用两种配置运行同样的负载：
+
+- default：Django 默认的 sqlite3 配置（DELETE 日志模式、DEFERRED 事务、每次请求新建连接）
+- production：DjangoBlog.sqlite3.production_database()（WAL、PRAGMA、IMMEDIATE 事务、持久连接）
+
+读线程反复读取首页列表和文章详情，写线程模拟浏览量写回和发表评论：
+在事务中先读文章再更新浏览量、插入评论。统计每秒读写次数、p99 延迟和
+"database is locked" 错误数。原数据库不会被修改。
+"""
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+from django.db.models import F
+
+from DjangoBlog.sqlite3 import production_database
+from blog.models import Post, Comment
+
+from .bench_views import percentile
+
+PROFILES = ('default', 'production')
+
+
+class Stats:
+    """一类操作的计数和延迟（线程安全）"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.timings = []
+        self.errors = 0
+
+    def record(self, elapsed):
+        with self.lock:
+            self.timings.append(elapsed * 1000)
+
+    def error(self):
+        with self.lock:
+            self.errors += 1
+
+    def summary(self, duration):
+        return {
+            'ops': len(self.timings),
+            'ops_per_sec': round(len(self.timings) / duration, 1),
+            'p99_ms': round(percentile(self.timings, 99), 3) if self.timings else None,
+            'errors': self.errors,
+        }
+
+
+def database_settings(profile, path):
+    if profile == 'production':
+        return production_database(path)
+    return {'ENGINE': 'django.db.backends.sqlite3', 'NAME': path}
+
+
+class Command(BaseCommand):
+    help = '对比默认配置与生产配置下 SQLite 的并发读写吞吐量'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8, help='读线程数')
+        parser.add_argument('--writers', type=int, default=4, help='写线程数')
+        parser.add_argument('--duration', type=float, default=10, help='每种配置运行的秒数')
+        parser.add_argument('--profile', choices=PROFILES, nargs='*', default=list(PROFILES))
+        parser.add_argument('--seed', type=int, default=42, help='随机种子')
+        parser.add_argument('--json', action='store_true', help='以JSON格式输出结果')
+
+    def handle(self, *args, **options):
+        if connections[DEFAULT_DB_ALIAS].vendor != 'sqlite':
+            raise CommandError('只支持 SQLite 数据库')
+        post_ids = list(Post.objects.filter(status='published').values_list('pk', flat=True)[:1000])
+        author_ids = list(Post.objects.values_list('author_id', flat=True).distinct()[:100])
+        if not post_ids:
+            raise CommandError('没有已发布的文章，请先运行 seed_blog')
+
+        results = []
+        for profile in options['profile']:
+            results.append(self.run_profile(profile, post_ids, author_ids, options))
+
+        if options['json']:
+            self.stdout.write(json.dumps({
+                'readers': options['readers'],
+                'writers': options['writers'],
+                'duration': options['duration'],
+                'results': results,
+            }, ensure_ascii=False, indent=2))
+            return
+        self.print_table(results)
+
+    def copy_database(self, profile):
+        """备份当前数据库到临时文件，默认配置的副本切回 DELETE 日志模式"""
+        fd, path = tempfile.mkstemp(prefix=f'stress-{profile}-', suffix='.sqlite3')
+        os.close(fd)
+        source = connections[DEFAULT_DB_ALIAS]
+        source.ensure_connection()
+        target = sqlite3.connect(path)
+        try:
+            source.connection.backup(target)
+            target.execute('PRAGMA journal_mode = DELETE')
+        finally:
+            target.close()
+        return path
+
+    def run_profile(self, profile, post_ids, author_ids, options):
+        path = self.copy_database(profile)
+        alias = f'stress_{profile}'
+        configured = connections.configure_settings({
+            DEFAULT_DB_ALIAS: settings.DATABASES[DEFAULT_DB_ALIAS], alias: database_settings(profile, path),
+        })
+        connections.settings[alias] = configured[alias]
+
+        reads, writes = Stats(), Stats()
+        deadline = time.monotonic() + options['duration']
+        threads = [
+            threading.Thread(target=self.reader, args=(alias, post_ids, deadline, reads, options['seed'] + i))
+            for i in range(options['readers'])
+        ] + [
+            threading.Thread(
+                target=self.writer, args=(alias, post_ids, author_ids, deadline, writes, options['seed'] - i - 1)
+            )
+            for i in range(options['writers'])
+        ]
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            del connections.settings[alias]
+            for suffix in ('', '-wal', '-shm', '-journal'):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+
+        return {
+            'profile': profile,
+            'reads': reads.summary(options['duration']),
+            'writes': writes.summary(options['duration']),
+        }
+
+    def persistent(self, alias):
+        return connections.settings[alias].get('CONN_MAX_AGE', 0) != 0
+
+    def finish_request(self, alias):
+        # 模拟请求结束：默认配置每次请求后关闭连接，持久连接保留
+        if not self.persistent(alias):
+            connections[alias].close()
+
+    def reader(self, alias, post_ids, deadline, stats, seed):
+        rng = random.Random(seed)
+        posts = Post.objects.using(alias)
+        try:
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                try:
+                    list(posts.filter(status='published').order_by('-created_at').values_list('pk', 'title')[:9])
+                    posts.filter(pk=rng.choice(post_ids)).values('title', 'content_html', 'views').first()
+                except OperationalError:
+                    stats.error()
+                else:
+                    stats.record(time.perf_counter() - start)
+                self.finish_request(alias)
+        finally:
+            connections[alias].close()
+
+    def writer(self, alias, post_ids, author_ids, deadline, stats, seed):
+        rng = random.Random(seed)
+        try:
+            while time.monotonic() < deadline:
+                post_id = rng.choice(post_ids)
+                start = time.perf_counter()
+                try:
+                    with transaction.atomic(using=alias):
+                        # 先读后写：DEFERRED 事务需要把读锁升级为写锁
+                        Post.objects.using(alias).filter(pk=post_id).values_list('views', flat=True).first()
+                        Post.objects.using(alias).filter(pk=post_id).update(views=F('views') + 1)
+                        Comment.objects.using(alias).bulk_create([
+                            Comment(post_id=post_id, author_id=rng.choice(author_ids), content='压力测试评论'),
+                        ])
+                except OperationalError:
+                    stats.error()
+                else:
+                    stats.record(time.perf_counter() - start)
+                self.finish_request(alias)
+        finally:
+            connections[alias].close()
+
+    def print_table(self, results):
+        self.stdout.write(
+            f'{"配置":<12}{"读/秒":>10}{"读p99":>10}{"读错误":>8}{"写/秒":>10}{"写p99":>10}{"写错误":>8}'
+        )
+        for result in results:
+            reads, writes = result['reads'], result['writes']
+            self.stdout.write(
+                f'{result["profile"]:<12}{reads["ops_per_sec"]:>10.1f}{reads["p99_ms"] or 0:>10.2f}{reads["errors"]:>8}'
+                f'{writes["ops_per_sec"]:>10.1f}{writes["p99_ms"] or 0:>10.2f}{writes["errors"]:>8}'
+            )
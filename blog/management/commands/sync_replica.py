@@ -0,0 +1,39 @@
+"""
+把主库复制到本地SQLite从库，模拟一次主从复制
+
+    BLOG_REPLICA_DB=replica.sqlite3 python manage.py sync_replica
+
+只用于本地测试读写分离；生产环境的从库由数据库自身的复制功能（例如 PostgreSQL
+流复制、Litestream/LiteFS）维护。
+"""
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = '用SQLite在线备份把主库复制到 DATABASE_REPLICAS 中的SQLite从库'
+
+    def handle(self, *args, **options):
+        replicas = getattr(settings, 'DATABASE_REPLICAS', [])
+        if not replicas:
+            raise CommandError('没有配置从库（DATABASE_REPLICAS），本地测试可设置 BLOG_REPLICA_DB 环境变量')
+        primary = connections[DEFAULT_DB_ALIAS]
+        if primary.vendor != 'sqlite':
+            raise CommandError('主库不是SQLite，请使用数据库自带的复制功能')
+
+        primary.ensure_connection()
+        for alias in replicas:
+            replica = connections[alias]
+            if replica.vendor != 'sqlite':
+                raise CommandError(f'从库 {alias} 不是SQLite，请使用数据库自带的复制功能')
+            # 关闭从库的现有连接，备份会整体替换数据库文件的内容
+            replica.close()
+            target = sqlite3.connect(replica.settings_dict['NAME'])
+            try:
+                primary.connection.backup(target)
+            finally:
+                target.close()
+            self.stdout.write(self.style.SUCCESS(f'已同步从库 {alias}：{replica.settings_dict["NAME"]}'))
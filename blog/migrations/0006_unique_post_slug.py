@@ -0,0 +1,64 @@
+# Generated by Django 4.2.24 on 2026-10-18 19:09
+
+import unicodedata
+from urllib.parse import unquote
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def normalize_slug(value):
+    value = unicodedata.normalize('NFKC', unquote(value or ''))
+    return value.strip().strip('/').strip()[:200]
+
+
+def normalize_existing_slugs(apps, schema_editor):
+    """规范化已有slug并消除重复，原来的slug保留为重定向"""
+    Post = apps.get_model('blog', 'Post')
+    SlugRedirect = apps.get_model('blog', 'SlugRedirect')
+
+    used = set()
+    redirects = []
+    for post in Post.objects.order_by('pk').only('pk', 'slug', 'title'):
+        base = normalize_slug(post.slug) or normalize_slug(post.title) or str(post.pk)
+        slug = base
+        suffix = 2
+        while slug in used:
+            slug = f'{base[:200 - len(str(suffix)) - 1]}-{suffix}'
+            suffix += 1
+        used.add(slug)
+        if slug != post.slug:
+            if post.slug:
+                redirects.append(SlugRedirect(old_slug=post.slug, post_id=post.pk))
+            Post.objects.filter(pk=post.pk).update(slug=slug)
+
+    seen = set(used)
+    SlugRedirect.objects.bulk_create([
+        redirect for redirect in redirects
+        if not (redirect.old_slug in seen or seen.add(redirect.old_slug))
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0005_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlugRedirect',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('old_slug', models.CharField(max_length=200, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slug_redirects', to='blog.post')),
+            ],
+        ),
+        migrations.RunPython(normalize_existing_slugs, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='post',
+            name='slug',
+            field=models.CharField(max_length=200, unique=True),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 4.2.24 on 2026-10-18 19:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_comment_paths(apps, schema_editor):
+    """为已有评论计算 path、thread 和 depth"""
+    Comment = apps.get_model('blog', 'Comment')
+    parents = dict(Comment.objects.values_list('pk', 'parent_id'))
+    tree = {}
+
+    def resolve(pk):
+        if pk not in tree:
+            parent_id = parents[pk]
+            segment = f'{pk:010d}'
+            if parent_id is None or parent_id not in parents:
+                tree[pk] = (segment, pk, 0)
+            else:
+                path, thread_id, depth = resolve(parent_id)
+                tree[pk] = (f'{path}/{segment}', thread_id, depth + 1)
+        return tree[pk]
+
+    comments = []
+    for pk in sorted(parents):
+        path, thread_id, depth = resolve(pk)
+        comments.append(Comment(pk=pk, path=path, thread_id=thread_id, depth=depth))
+    Comment.objects.bulk_update(comments, ['path', 'thread', 'depth'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0008_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='comment',
+            name='comment_post_approved_idx',
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='thread',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='blog.comment'),
+        ),
+        migrations.RunPython(build_comment_paths, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(condition=models.Q(('is_approved', True)), fields=['post', 'depth', 'path'], name='comment_post_threads_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['thread', 'path'], name='comment_thread_path_idx'),
+        ),
+    ]
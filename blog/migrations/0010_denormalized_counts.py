@@ -0,0 +1,44 @@
+# Generated by Django 4.2.24 on 2026-10-18 19:27
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Q
+
+
+def fill_counts(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    Category = apps.get_model('blog', 'Category')
+
+    posts = Post.objects.annotate(n=Count('comments', filter=Q(comments__is_approved=True))).filter(n__gt=0)
+    for pk, n in posts.values_list('pk', 'n'):
+        Post.objects.filter(pk=pk).update(comment_count=n)
+
+    categories = Category.objects.annotate(n=Count('posts', filter=Q(posts__status='published'))).filter(n__gt=0)
+    for pk, n in categories.values_list('pk', 'n'):
+        Category.objects.filter(pk=pk).update(post_count=n)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0009_comment_tree'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='post_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='文章数量'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='category',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='posts', to='blog.category'),
+        ),
+        migrations.RunPython(fill_counts, migrations.RunPython.noop),
+    ]
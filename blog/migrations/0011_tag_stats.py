@@ -0,0 +1,44 @@
+# Generated by Django 4.2.24 on 2026-10-18 19:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count
+
+
+def fill_tag_stats(apps, schema_editor):
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    Post = apps.get_model('blog', 'Post')
+    TaggedItem = apps.get_model('taggit', 'TaggedItem')
+    TagStats = apps.get_model('blog', 'TagStats')
+
+    content_type = ContentType.objects.filter(app_label='blog', model='post').first()
+    if content_type is None:
+        return
+    counts = TaggedItem.objects.filter(
+        content_type=content_type,
+        object_id__in=Post.objects.filter(status='published').values('pk'),
+    ).values('tag').annotate(n=Count('pk')).values_list('tag', 'n')
+    TagStats.objects.bulk_create([TagStats(tag_id=tag_id, post_count=n) for tag_id, n in counts])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('taggit', '0006_rename_taggeditem_content_type_object_id_taggit_tagg_content_8fc721_idx'),
+        ('blog', '0010_denormalized_counts'),
+        ('contenttypes', '0002_remove_content_type_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TagStats',
+            fields=[
+                ('tag', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='taggit.tag')),
+                ('post_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-post_count', 'tag'], name='tagstats_popular_idx')],
+            },
+        ),
+        migrations.RunPython(fill_tag_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.24 on 2026-10-18 19:37
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0012_post_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Task',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='任务')),
+                ('args', models.JSONField(blank=True, default=list, verbose_name='参数')),
+                ('key', models.CharField(blank=True, max_length=200, null=True, verbose_name='去重键')),
+                ('status', models.CharField(choices=[('pending', '等待执行'), ('running', '执行中'), ('failed', '失败')], default='pending', max_length=10, verbose_name='状态')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='已执行次数')),
+                ('max_attempts', models.PositiveSmallIntegerField(default=3, verbose_name='最多执行次数')),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now, verbose_name='最早执行时间')),
+                ('locked_at', models.DateTimeField(blank=True, null=True, verbose_name='开始执行时间')),
+                ('last_error', models.TextField(blank=True, verbose_name='最近一次错误')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+            ],
+            options={
+                'verbose_name': '后台任务',
+                'verbose_name_plural': '后台任务',
+                'ordering': ['run_after', 'id'],
+                'indexes': [models.Index(fields=['status', 'run_after'], name='task_status_run_after_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='task',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'pending')), fields=('key',), name='task_pending_key_unique'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 4.2.24 on 2026-10-18 19:42
+
+from django.db import migrations, models
+
+
+def render_existing(apps, schema_editor):
+    from blog.rendering import RENDERED_FIELDS, render_fields
+
+    Post = apps.get_model('blog', 'Post')
+    posts = list(Post.objects.only('pk', 'content', 'excerpt'))
+    for post in posts:
+        for field, value in render_fields(post.content, post.excerpt).items():
+            setattr(post, field, value)
+    Post.objects.bulk_update(posts, RENDERED_FIELDS, batch_size=200)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0013_task_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, max_length=40),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='content_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='excerpt_text',
+            field=models.CharField(blank=True, editable=False, max_length=300),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='reading_time',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='阅读时间（分钟）'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='render_version',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='word_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(render_existing, migrations.RunPython.noop),
+    ]
@@ -1,15 +1,26 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.contrib.auth.models import User
 from django.urls import reverse
 from django.utils import timezone
 from taggit.managers import TaggableManager
 
+from .comments import assign_tree_fields, limit_reply_depth
+from .counters import view_counter
+from .images import schedule_variants
+from .rendering import RENDERED_FIELDS, render_post
+from .slugs import allocate_slug, normalize_slug
+
+# 并发创建同名文章时，slug分配的最大重试次数
+SLUG_ALLOCATION_ATTEMPTS = 3
+
 
 class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
     slug = models.SlugField(max_length=100, unique=True)
     description = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # 已发布文章数，由信号维护
+    post_count = models.PositiveIntegerField('文章数量', default=0, editable=False)
 
     class Meta:
         verbose_name_plural = "Categories"
@@ -26,26 +37,56 @@ class Post(models.Model):
     )
 
     title = models.CharField(max_length=200)
-    slug = models.CharField(max_length=200)
+    slug = models.CharField(max_length=200, unique=True)
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='blog_posts')
-    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True)
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, related_name='posts')
     content = models.TextField()
     excerpt = models.CharField(max_length=300, blank=True)
     featured_image = models.ImageField(upload_to='posts/%Y/%m/%d/', blank=True, null=True)
+    # 特色图片的各个尺寸，由 blog.images 在后台生成
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='draft')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     published_at = models.DateTimeField(null=True, blank=True)
     views = models.PositiveIntegerField(default=0)
     allow_comments = models.BooleanField(default=True)
+    # 已审核评论数，由信号维护
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    # 保存时由 blog.rendering 预渲染：清洗后的HTML、纯文本摘要、字数和阅读时间
+    content_html = models.TextField(blank=True, editable=False)
+    excerpt_text = models.CharField(max_length=300, blank=True, editable=False)
+    word_count = models.PositiveIntegerField(default=0, editable=False)
+    reading_time = models.PositiveSmallIntegerField('阅读时间（分钟）', default=0, editable=False)
+    content_hash = models.CharField(max_length=40, blank=True, editable=False)
+    render_version = models.PositiveSmallIntegerField(default=0, editable=False)
     tags = TaggableManager(blank=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # 首页和keyset分页：已发布文章按发布时间倒序
+            models.Index(
+                fields=['-created_at', '-id'], name='post_published_created_idx',
+                condition=models.Q(status='published'),
+            ),
+            # 侧边栏热门文章
+            models.Index(fields=['-views'], name='post_published_views_idx', condition=models.Q(status='published')),
+            # 分类文章列表
+            models.Index(fields=['category', 'status', '-created_at'], name='post_category_status_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # 记录加载时的slug，修改slug时据此保留旧地址的重定向
+        instance._loaded_slug = instance.__dict__.get('slug')
+        instance._loaded_image = instance.__dict__.get('featured_image')
+        return instance
+
     def get_absolute_url(self):
         # 直接返回反向解析的URL，让Django自动处理编码
         return reverse('blog:post_detail', args=[self.slug])
@@ -53,43 +94,85 @@ class Post(models.Model):
     def save(self, *args, **kwargs):
         if self.status == 'published' and not self.published_at:
             self.published_at = timezone.now()
+
+        # 正文或摘要变化时重新渲染；只更新浏览量等字段时跳过
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or {'content', 'excerpt'}.intersection(update_fields):
+            if render_post(self) and update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, *RENDERED_FIELDS}
+
+        # 更换或删除特色图片后，旧图片的尺寸作废
+        image_changed = (self.featured_image.name or '') != (getattr(self, '_loaded_image', None) or '')
+        if image_changed:
+            self.image_variants = {}
         
-        # 如果slug为空，根据标题生成
-        if not self.slug:
-            self.slug = self.title
-        
-        # 检查slug是否已存在（排除当前实例）
-        original_slug = self.slug
-        counter = 1
-        
-        while Post.objects.filter(slug=self.slug).exclude(pk=self.pk).exists():
-            # 如果slug已存在，添加随机后缀
-            import random
-            import string
-            random_suffix = ''.join(random.choices(string.digits, k=4))
-            self.slug = f"{original_slug}-{random_suffix}"
-            counter += 1
-            
-            # 防止无限循环
-            if counter > 10:
-                break
+        # 写入时统一规范化，查询时只需一次精确匹配
+        self.slug = normalize_slug(self.slug) or normalize_slug(self.title)
         
-        super().save(*args, **kwargs)
+        # slug未变化时无需检查冲突；否则一次前缀查询分配空闲slug，
+        # 并发写入撞上唯一约束时重新分配
+        if self.slug == getattr(self, '_loaded_slug', None):
+            super().save(*args, **kwargs)
+        else:
+            base = self.slug
+            for attempt in range(SLUG_ALLOCATION_ATTEMPTS):
+                self.slug = allocate_slug(base, exclude_pk=self.pk)
+                try:
+                    with transaction.atomic():
+                        super().save(*args, **kwargs)
+                    break
+                except IntegrityError:
+                    slug_taken = Post.objects.filter(slug=self.slug).exclude(pk=self.pk).exists()
+                    if not slug_taken or attempt == SLUG_ALLOCATION_ATTEMPTS - 1:
+                        raise
+        self._record_slug_change()
 
-    def get_related_posts(self):
-        """获取相关文章"""
-        if self.category:
+        if image_changed:
+            self._loaded_image = self.featured_image.name
+            if self.featured_image:
+                schedule_variants(self.pk)
+
+    def _record_slug_change(self):
+        """slug变化后，旧slug通过 SlugRedirect 重定向到新地址"""
+        old_slug = getattr(self, '_loaded_slug', None)
+        if old_slug == self.slug:
+            return
+        if old_slug:
+            SlugRedirect.objects.update_or_create(old_slug=old_slug, defaults={'post': self})
+        # 新slug不再作为任何重定向的来源
+        SlugRedirect.objects.filter(old_slug=self.slug).delete()
+        self._loaded_slug = self.slug
+
+    def get_related_posts(self, limit=4):
+        """获取相关文章：读取预先计算的结果，尚未计算时退回到同分类文章"""
+        # 推荐卡片只显示预渲染的摘要，不加载正文
+        entries = RelatedPost.objects.filter(
+            post=self, related__status='published'
+        ).select_related('related').defer('related__content', 'related__content_html').order_by('rank')[:limit]
+        related_posts = [entry.related for entry in entries]
+        if related_posts:
+            return related_posts
+
+        if self.category_id:
             return Post.objects.filter(
-                category=self.category,
+                category_id=self.category_id,
                 status='published'
-            ).exclude(id=self.id)[:4]
+            ).exclude(id=self.id).defer('content', 'content_html')[:limit]
         return Post.objects.filter(
             status='published'
-        ).exclude(id=self.id)[:4]
+        ).exclude(id=self.id).defer('content', 'content_html')[:limit]
+
+    @property
+    def view_count(self):
+        """已写回的浏览量加上缓冲中尚未写回的增量"""
+        return self.views + view_counter.pending(self.pk)
 
     def increase_views(self):
-        self.views += 1
-        self.save(update_fields=['views'])
+        # 只在内存中累加，由 blog.counters 批量写回数据库
+        view_counter.incr(self.pk)
+
+    async def aincrease_views(self):
+        await view_counter.aincr(self.pk)
 
 
 class Comment(models.Model):
@@ -100,9 +183,146 @@ class Comment(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     is_approved = models.BooleanField(default=True)
     parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='replies')
+    # 评论树：path 为祖先到自身的定长ID路径，按 path 排序即为深度优先的显示顺序；
+    # thread 指向顶层评论，一次查询即可取出整棵回复树（见 blog/comments.py）
+    thread = models.ForeignKey(
+        'self', on_delete=models.CASCADE, null=True, blank=True, related_name='+', editable=False
+    )
+    path = models.CharField(max_length=255, blank=True, editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
 
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            # 文章详情页按页读取顶层评论
+            models.Index(
+                fields=['post', 'depth', 'path'], name='comment_post_threads_idx',
+                condition=models.Q(is_approved=True),
+            ),
+            # 按顶层评论取出整棵回复树
+            models.Index(fields=['thread', 'path'], name='comment_thread_path_idx'),
+            # 侧边栏最新评论
+            models.Index(fields=['-created_at'], name='comment_created_idx'),
+        ]
 
     def __str__(self):
         return f'Comment by {self.author.username} on {self.post.title}'
+
+    def save(self, *args, **kwargs):
+        is_new = self.pk is None
+        if is_new:
+            limit_reply_depth(self)
+        super().save(*args, **kwargs)
+        if is_new:
+            # path 中包含自身的ID，插入后再补写树字段
+            assign_tree_fields(self)
+            Comment.objects.filter(pk=self.pk).update(path=self.path, thread=self.thread_id, depth=self.depth)
+
+
+class RelatedPost(models.Model):
+    """预先计算的相关文章（按标签重合度和TF-IDF余弦相似度排序）"""
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='related_entries')
+    related = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        ordering = ['post', 'rank']
+        unique_together = ('post', 'related')
+        indexes = [models.Index(fields=['post', 'rank'])]
+
+    def __str__(self):
+        return f'{self.post_id} -> {self.related_id} ({self.score:.3f})'
+
+
+class RelatedTerm(models.Model):
+    """相关文章的词项向量：每篇已发布文章归一化后的TF-IDF权重，按词项查询即为倒排表"""
+    term = models.CharField(max_length=64)
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='related_terms')
+    weight = models.FloatField()
+
+    class Meta:
+        unique_together = ('term', 'post')
+
+    def __str__(self):
+        return f'{self.term} -> {self.post_id} ({self.weight:.3f})'
+
+
+class SlugRedirect(models.Model):
+    """旧slug（修改前的slug、历史上的编码形式）到文章的映射"""
+    old_slug = models.CharField(max_length=200, unique=True)
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='slug_redirects')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.old_slug} -> {self.post_id}'
+
+
+class SearchDocument(models.Model):
+    """全文检索的文档信息，记录每篇文章分词后的长度（用于BM25）"""
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, primary_key=True, related_name='search_document')
+    length = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'SearchDocument for {self.post_id}'
+
+
+class SearchPosting(models.Model):
+    """倒排索引：词项 -> 文章及词频"""
+    term = models.CharField(max_length=64)
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='search_postings')
+    tf = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('term', 'post')
+
+    def __str__(self):
+        return f'{self.term} -> {self.post_id}'
+
+
+
+class TagStats(models.Model):
+    """每个标签的已发布文章数（热门标签的读模型，由 blog.signals 增量维护）"""
+    tag = models.OneToOneField('taggit.Tag', on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    post_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=['-post_count', 'tag'], name='tagstats_popular_idx')]
+
+    def __str__(self):
+        return f'{self.tag_id}: {self.post_count}'
+
+
+class Task(models.Model):
+    """后台任务队列中的一条任务（见 blog.tasks），执行成功后删除"""
+    STATUS_CHOICES = (
+        ('pending', '等待执行'),
+        ('running', '执行中'),
+        ('failed', '失败'),
+    )
+
+    name = models.CharField('任务', max_length=100)
+    args = models.JSONField('参数', default=list, blank=True)
+    # 去重键：同一个键同时只保留一条等待执行的任务
+    key = models.CharField('去重键', max_length=200, null=True, blank=True)
+    status = models.CharField('状态', max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField('已执行次数', default=0)
+    max_attempts = models.PositiveSmallIntegerField('最多执行次数', default=3)
+    run_after = models.DateTimeField('最早执行时间', default=timezone.now)
+    locked_at = models.DateTimeField('开始执行时间', null=True, blank=True)
+    last_error = models.TextField('最近一次错误', blank=True)
+    created_at = models.DateTimeField('创建时间', auto_now_add=True)
+
+    class Meta:
+        ordering = ['run_after', 'id']
+        verbose_name = '后台任务'
+        verbose_name_plural = '后台任务'
+        indexes = [models.Index(fields=['status', 'run_after'], name='task_status_run_after_idx')]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['key'], condition=models.Q(status='pending'), name='task_pending_key_unique'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.name}{tuple(self.args)} [{self.status}]'
@@ -0,0 +1,223 @@
+"""
+匿名用户整页缓存
+
+只缓存未登录用户的 GET/HEAD 请求。缓存键由路径和规范化后的查询字符串组成，
+每个缓存条目带有一组代理键（surrogate keys），例如 ``post:12``、
+``category:3``、``tag:7``、``posts``、``sidebar``。
+
+每个代理键在缓存中对应一个随机令牌，写入页面时记录当时的令牌；
+purge() 为代理键换一个新令牌，读取时只要有任何一个令牌不一致，条目即视为失效。
+这样一次 get_many 就能校验整个条目，失效时也只影响带有该代理键的页面。
+"""
+import asyncio
+import hashlib
+import uuid
+from functools import wraps
+from urllib.parse import parse_qsl, urlencode
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+PAGE_CACHE_PREFIX = 'blog:page:'
+SURROGATE_PREFIX = 'blog:surrogate:'
+STATS_HIT_KEY = 'blog:page:stats:hit'
+STATS_MISS_KEY = 'blog:page:stats:miss'
+
+# 不影响页面内容的跟踪参数
+IGNORED_PARAMS = ('utm_source', 'utm_medium', 'utm_campaign', 'utm_term', 'utm_content', 'fbclid', 'gclid')
+
+# 文章列表的成员或顺序发生变化
+POSTS_KEY = 'posts'
+SIDEBAR_KEY = 'sidebar'
+
+
+def post_key(post_id):
+    return f'post:{post_id}'
+
+
+def category_key(category_id):
+    return f'category:{category_id}' if category_id else None
+
+
+def tag_key(tag_id):
+    return f'tag:{tag_id}'
+
+
+def is_enabled():
+    return getattr(settings, 'BLOG_PAGE_CACHE_ENABLED', True)
+
+
+def normalize_query(query_dict):
+    """去掉空值和跟踪参数并排序，使等价的查询字符串得到同一个缓存键"""
+    params = [
+        (key, value) for key, value in parse_qsl(query_dict.urlencode())
+        if value and key not in IGNORED_PARAMS
+    ]
+    return urlencode(sorted(params))
+
+
+def page_cache_key(request):
+    raw = f'{request.path}?{normalize_query(request.GET)}'
+    return PAGE_CACHE_PREFIX + hashlib.md5(raw.encode('utf-8')).hexdigest()
+
+
+def _surrogate_cache_key(key):
+    return SURROGATE_PREFIX + key
+
+
+def current_tokens(keys, create_missing=True):
+    """代理键当前的令牌，create_missing 为真时为尚无令牌的键生成新令牌"""
+    cache_keys = {_surrogate_cache_key(key): key for key in keys}
+    found = cache.get_many(cache_keys)
+    tokens = {cache_keys[cache_key]: token for cache_key, token in found.items()}
+    if create_missing:
+        missing = {
+            cache_key: uuid.uuid4().hex
+            for cache_key, key in cache_keys.items() if cache_key not in found
+        }
+        if missing:
+            cache.set_many(missing, None)
+            tokens.update({cache_keys[cache_key]: token for cache_key, token in missing.items()})
+    return tokens
+
+
+def purge(*keys):
+    """使带有这些代理键的所有缓存页面失效"""
+    keys = {key for key in keys if key}
+    if keys:
+        cache.set_many({_surrogate_cache_key(key): uuid.uuid4().hex for key in keys}, None)
+
+
+def is_collecting(request):
+    """当前请求的响应是否会被写入缓存（即是否需要收集代理键）"""
+    return getattr(request, '_page_cache_active', False)
+
+
+def add_surrogate_keys(request, *keys):
+    """视图调用此函数声明当前页面依赖的代理键
+
+    令牌在声明时立即记录，这样渲染期间发生的 purge 会让这次写入的条目直接失效。
+    """
+    if not is_collecting(request):
+        return
+    new_keys = {key for key in keys if key} - request._surrogate_tokens.keys()
+    if new_keys:
+        request._surrogate_tokens.update(current_tokens(new_keys))
+
+
+def set_page_meta(request, **meta):
+    """视图记录缓存命中时仍需要的数据，例如文章ID（用于浏览量统计）"""
+    if not hasattr(request, '_page_cache_meta'):
+        request._page_cache_meta = {}
+    request._page_cache_meta.update(meta)
+
+
+def _record(stat_key):
+    if not cache.add(stat_key, 1, None):
+        try:
+            cache.incr(stat_key)
+        except ValueError:
+            cache.set(stat_key, 1, None)
+
+
+def get_stats():
+    stats = cache.get_many([STATS_HIT_KEY, STATS_MISS_KEY])
+    hits = stats.get(STATS_HIT_KEY, 0)
+    misses = stats.get(STATS_MISS_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / total, 4) if total else 0.0,
+    }
+
+
+def is_cacheable_request(request):
+    """只有匿名用户、没有待显示消息的 GET/HEAD 请求可以共享缓存"""
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    # 有待显示的消息时页面内容因人而异
+    if request.COOKIES.get('messages'):
+        return False
+    return not request.user.is_authenticated
+
+
+def _lookup(request):
+    entry = cache.get(page_cache_key(request))
+    if entry is None:
+        return None
+    tokens = current_tokens(entry['tokens'], create_missing=False)
+    if tokens != entry['tokens']:
+        return None
+    return entry
+
+
+def _store(request, response):
+    entry = {
+        'content': response.content,
+        'content_type': response['Content-Type'],
+        'tokens': request._surrogate_tokens,
+        'meta': getattr(request, '_page_cache_meta', {}),
+    }
+    cache.set(page_cache_key(request), entry, getattr(settings, 'BLOG_PAGE_CACHE_TIMEOUT', 300))
+
+
+def _cached_response(request, on_hit):
+    """缓存命中时返回响应，否则开始收集代理键并返回 None"""
+    entry = _lookup(request)
+    if entry is not None:
+        _record(STATS_HIT_KEY)
+        if on_hit is not None:
+            on_hit(request, entry['meta'])
+        response = HttpResponse(entry['content'], content_type=entry['content_type'])
+        response['X-Page-Cache'] = 'HIT'
+        patch_vary_headers(response, ('Cookie',))
+        return response
+
+    _record(STATS_MISS_KEY)
+    request._page_cache_active = True
+    request._surrogate_tokens = {}
+    return None
+
+
+def _finish(request, response):
+    # 设置了Cookie的响应（例如清除消息）不能给其他人复用
+    if response.status_code == 200 and not response.streaming and not response.cookies:
+        _store(request, response)
+    response['X-Page-Cache'] = 'MISS'
+    patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+def cache_anonymous_page(on_hit=None):
+    """匿名用户整页缓存装饰器，同时支持同步和异步视图
+
+    on_hit(request, meta) 在缓存命中时调用，例如继续累加浏览量。
+    """
+    def decorator(view_func):
+        if asyncio.iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def async_wrapper(request, *args, **kwargs):
+                # 判断是否登录需要读取会话和用户，不能在事件循环中直接执行
+                if not is_enabled() or not await sync_to_async(is_cacheable_request)(request):
+                    return await view_func(request, *args, **kwargs)
+                response = await sync_to_async(_cached_response)(request, on_hit)
+                if response is not None:
+                    return response
+                response = await view_func(request, *args, **kwargs)
+                return await sync_to_async(_finish)(request, response)
+            return async_wrapper
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if not is_enabled() or not is_cacheable_request(request):
+                return view_func(request, *args, **kwargs)
+            response = _cached_response(request, on_hit)
+            if response is not None:
+                return response
+            return _finish(request, view_func(request, *args, **kwargs))
+        return wrapper
+    return decorator
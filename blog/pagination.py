@@ -0,0 +1,169 @@
+"""
+文章列表分页
+
+- CachedCountPaginator：普通的页码分页，但总数缓存在Django缓存中，
+  不必每次请求都执行 COUNT(*)
+- KeysetPaginator：按 (created_at, id) 的游标分页，翻到任意深度都只需要
+  一次带 LIMIT 的索引范围查询，没有 OFFSET 扫描。通过
+  BLOG_KEYSET_PAGINATION 开启
+
+文章变更时由 blog/signals.py 调用 invalidate_counts() 使缓存的总数失效。
+"""
+import base64
+import binascii
+import json
+import math
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+COUNT_CACHE_PREFIX = 'blog:count:'
+COUNT_GENERATION_KEY = 'blog:count:generation'
+
+
+def keyset_enabled():
+    return getattr(settings, 'BLOG_KEYSET_PAGINATION', False)
+
+
+def invalidate_counts():
+    """文章发生变化后，使所有缓存的列表总数失效"""
+    try:
+        cache.incr(COUNT_GENERATION_KEY)
+    except ValueError:
+        cache.set(COUNT_GENERATION_KEY, 2, None)
+
+
+def cached_count(queryset, count_key):
+    """返回 queryset 的总数，结果按 count_key 缓存"""
+    if count_key is None:
+        return queryset.count()
+    generation = cache.get(COUNT_GENERATION_KEY, 1)
+    key = f'{COUNT_CACHE_PREFIX}{generation}:{count_key}'
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, getattr(settings, 'BLOG_LIST_COUNT_CACHE_TIMEOUT', 600))
+    return count
+
+
+class CachedCountPaginator(Paginator):
+    """总数走缓存的页码分页器"""
+
+    def __init__(self, object_list, per_page, count_key=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_key = count_key
+
+    @cached_property
+    def count(self):
+        return cached_count(self.object_list, self.count_key)
+
+
+def encode_cursor(post, direction):
+    payload = json.dumps([post.created_at.isoformat(), post.pk, direction])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """解析游标，格式不正确时返回 None（回到第一页）"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, pk, direction = json.loads(base64.urlsafe_b64decode(padded))
+        created_at = parse_datetime(created_at)
+    except (TypeError, ValueError, binascii.Error):
+        return None
+    if created_at is None or not isinstance(pk, int) or direction not in ('next', 'prev'):
+        return None
+    return created_at, pk, direction
+
+
+class KeysetPage:
+    """游标分页的一页，接口尽量与 django.core.paginator.Page 保持一致"""
+
+    is_keyset = True
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if self._has_next and self.object_list:
+            return encode_cursor(self.object_list[-1], 'next')
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self._has_previous and self.object_list:
+            return encode_cursor(self.object_list[0], 'prev')
+        return None
+
+
+class KeysetPaginator:
+    """按 (created_at DESC, id DESC) 排序的游标分页器"""
+
+    def __init__(self, queryset, per_page, count_key=None):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.count_key = count_key
+
+    @cached_property
+    def count(self):
+        return cached_count(self.queryset, self.count_key)
+
+    @property
+    def num_pages(self):
+        return max(1, math.ceil(self.count / self.per_page))
+
+    def get_page(self, cursor):
+        position = decode_cursor(cursor) if cursor else None
+        if position is None:
+            rows = list(self.queryset.order_by('-created_at', '-pk')[:self.per_page + 1])
+            return KeysetPage(rows[:self.per_page], self, len(rows) > self.per_page, False)
+
+        created_at, pk, direction = position
+        if direction == 'next':
+            rows = list(
+                self.queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+                .order_by('-created_at', '-pk')[:self.per_page + 1]
+            )
+            return KeysetPage(rows[:self.per_page], self, len(rows) > self.per_page, True)
+
+        rows = list(
+            self.queryset.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk))
+            .order_by('created_at', 'pk')[:self.per_page + 1]
+        )
+        page_rows = rows[:self.per_page]
+        page_rows.reverse()
+        return KeysetPage(page_rows, self, True, len(rows) > self.per_page)
+
+
+def paginate(request, queryset, per_page, count_key=None):
+    """按配置选择游标分页或页码分页，返回 page_obj"""
+    if keyset_enabled():
+        return KeysetPaginator(queryset, per_page, count_key).get_page(request.GET.get('cursor'))
+    paginator = CachedCountPaginator(queryset, per_page, count_key=count_key)
+    return paginator.get_page(request.GET.get('page', 1))
@@ -0,0 +1,239 @@
+"""
+文章内容的预渲染
+
+保存文章时把 content 渲染一次，写入：
+
+- content_html：清洗后的HTML（白名单标签和属性，过滤 javascript: 等链接），模板直接输出
+- excerpt_text：纯文本摘要（作者填写的摘要，或正文开头），列表卡片直接截断显示
+- word_count / reading_time：字数和阅读分钟数，中日韩文字逐字计数
+
+BLOG_CONTENT_FORMAT = 'markdown' 时先用可选依赖 markdown 渲染，再清洗。
+content_hash 记录渲染输入的哈希，内容未变化时跳过渲染；render_version 记录渲染规则的版本，
+修改清洗规则或 Markdown 配置后递增 RENDERER_VERSION，再运行
+``python manage.py render_content`` 批量重新渲染。
+"""
+import hashlib
+import math
+import re
+from html import escape
+from html.parser import HTMLParser
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+# 渲染规则的版本，修改清洗规则或 Markdown 配置后递增
+RENDERER_VERSION = 1
+
+EXCERPT_LENGTH = 300
+# 阅读速度：中日韩文字每分钟字数、其他语言每分钟词数
+CJK_CHARS_PER_MINUTE = 400
+WORDS_PER_MINUTE = 200
+
+ALLOWED_TAGS = {
+    'p', 'br', 'hr', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'strong', 'b', 'em', 'i', 'u', 's', 'del', 'ins',
+    'mark', 'sub', 'sup', 'small', 'abbr', 'blockquote', 'pre', 'code', 'kbd', 'ul', 'ol', 'li', 'dl', 'dt',
+    'dd', 'a', 'img', 'figure', 'figcaption', 'table', 'thead', 'tbody', 'tfoot', 'tr', 'th', 'td',
+    'caption', 'span', 'div',
+}
+ALLOWED_ATTRIBUTES = {
+    'a': {'href', 'title'},
+    'img': {'src', 'alt', 'title', 'width', 'height'},
+    'abbr': {'title'},
+    'ol': {'start'},
+    'th': {'colspan', 'rowspan', 'align'},
+    'td': {'colspan', 'rowspan', 'align'},
+    # 代码高亮使用 class="language-python"
+    'pre': {'class'},
+    'code': {'class'},
+    'span': {'class'},
+    'div': {'class'},
+}
+URL_ATTRIBUTES = {'href', 'src'}
+ALLOWED_SCHEMES = {'http', 'https', 'mailto'}
+# 连同内容一起删除的标签
+DROP_CONTENT_TAGS = {'script', 'style', 'iframe', 'object', 'embed', 'template', 'textarea', 'select', 'svg', 'math'}
+VOID_TAGS = {'br', 'hr', 'img'}
+# 提取纯文本时在这些标签前后加空白，避免相邻段落的文字粘连
+BLOCK_TAGS = {
+    'p', 'br', 'hr', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'blockquote', 'pre', 'ul', 'ol', 'li', 'dl', 'dt',
+    'dd', 'figure', 'figcaption', 'table', 'tr', 'th', 'td', 'caption', 'div',
+}
+
+SCHEME_RE = re.compile(r'^([a-z][a-z0-9+.\-]*):')
+CONTROL_RE = re.compile(r'[\x00-\x20\x7f]+')
+WHITESPACE_RE = re.compile(r'\s+')
+# 中日韩文字（假名、汉字、谚文）逐字计数，其他文字按词计数
+CJK_RANGES = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff'
+CJK_RE = re.compile(rf'[{CJK_RANGES}]')
+WORD_RE = re.compile(rf"[^\W{CJK_RANGES}]+(?:['’\-][^\W{CJK_RANGES}]+)*")
+
+
+def _safe_url(value):
+    """只允许 http/https/mailto 和相对地址"""
+    normalized = CONTROL_RE.sub('', value).lower()
+    match = SCHEME_RE.match(normalized)
+    return match is None or match.group(1) in ALLOWED_SCHEMES
+
+
+class Sanitizer(HTMLParser):
+    """按白名单清洗HTML，同时收集纯文本"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.html = []
+        self.text = []
+        self.stack = []
+        self.dropping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in DROP_CONTENT_TAGS:
+            self.dropping += 1
+            return
+        if self.dropping or tag not in ALLOWED_TAGS:
+            return
+        if tag in BLOCK_TAGS:
+            self.text.append(' ')
+
+        allowed = ALLOWED_ATTRIBUTES.get(tag, set())
+        parts = [tag]
+        external = False
+        for name, value in attrs:
+            if name not in allowed or value is None:
+                continue
+            if name in URL_ATTRIBUTES:
+                if not _safe_url(value):
+                    continue
+                external = external or SCHEME_RE.match(CONTROL_RE.sub('', value).lower()) is not None
+            parts.append(f'{name}="{escape(value)}"')
+        if tag == 'a' and external:
+            parts.append('rel="nofollow noopener"')
+        self.html.append(f'<{" ".join(parts)}>')
+        if tag not in VOID_TAGS:
+            self.stack.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS and self.stack and self.stack[-1] == tag:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in DROP_CONTENT_TAGS:
+            self.dropping = max(self.dropping - 1, 0)
+            return
+        if self.dropping or tag not in self.stack:
+            return
+        # 补齐未闭合的内层标签
+        while self.stack:
+            open_tag = self.stack.pop()
+            self.html.append(f'</{open_tag}>')
+            if open_tag == tag:
+                break
+        if tag in BLOCK_TAGS:
+            self.text.append(' ')
+
+    def handle_data(self, data):
+        if self.dropping:
+            return
+        self.html.append(escape(data, quote=False))
+        self.text.append(data)
+
+    def close(self):
+        super().close()
+        while self.stack:
+            self.html.append(f'</{self.stack.pop()}>')
+
+
+def sanitize(html):
+    """返回 (清洗后的HTML, 纯文本)"""
+    parser = Sanitizer()
+    parser.feed(html)
+    parser.close()
+    return ''.join(parser.html), WHITESPACE_RE.sub(' ', ''.join(parser.text)).strip()
+
+
+def to_html(content):
+    content_format = getattr(settings, 'BLOG_CONTENT_FORMAT', 'html')
+    if content_format == 'html':
+        return content
+    if content_format == 'markdown':
+        try:
+            import markdown
+        except ImportError:
+            raise ImproperlyConfigured("BLOG_CONTENT_FORMAT = 'markdown' 需要安装 markdown：pip install markdown")
+        return markdown.markdown(content, extensions=['extra', 'sane_lists'])
+    raise ImproperlyConfigured(f'未知的 BLOG_CONTENT_FORMAT：{content_format}')
+
+
+def count_words(text):
+    """返回 (中日韩字数, 其他语言词数)"""
+    return len(CJK_RE.findall(text)), len(WORD_RE.findall(text))
+
+
+def reading_minutes(cjk_chars, words):
+    if not cjk_chars and not words:
+        return 0
+    return max(math.ceil(cjk_chars / CJK_CHARS_PER_MINUTE + words / WORDS_PER_MINUTE), 1)
+
+
+def truncate(text, length=EXCERPT_LENGTH):
+    return text if len(text) <= length else text[:length - 1].rstrip() + '…'
+
+
+def content_hash(content, excerpt):
+    source = '\0'.join((getattr(settings, 'BLOG_CONTENT_FORMAT', 'html'), content or '', excerpt or ''))
+    return hashlib.sha1(source.encode('utf-8')).hexdigest()
+
+
+def render_fields(content, excerpt):
+    """渲染结果：{'content_html', 'excerpt_text', 'word_count', 'reading_time', 'content_hash', 'render_version'}"""
+    content_html, text = sanitize(to_html(content or ''))
+    cjk_chars, words = count_words(text)
+    # 作者填写的摘要也可能含有HTML标签
+    excerpt_text = sanitize(excerpt)[1] if excerpt else text
+    return {
+        'content_html': content_html,
+        'excerpt_text': truncate(excerpt_text),
+        'word_count': cjk_chars + words,
+        'reading_time': reading_minutes(cjk_chars, words),
+        'content_hash': content_hash(content, excerpt),
+        'render_version': RENDERER_VERSION,
+    }
+
+
+RENDERED_FIELDS = ('content_html', 'excerpt_text', 'word_count', 'reading_time', 'content_hash', 'render_version')
+
+
+def render_post(post, force=False):
+    """内容或渲染规则有变化时重新渲染，返回是否渲染"""
+    if (
+        not force and post.render_version == RENDERER_VERSION
+        and post.content_hash == content_hash(post.content, post.excerpt)
+    ):
+        return False
+    for field, value in render_fields(post.content, post.excerpt).items():
+        setattr(post, field, value)
+    return True
+
+
+def render_all(force=False, batch_size=200):
+    """批量重新渲染渲染版本过期的文章（force 时为全部文章），返回渲染的文章数"""
+    from . import page_cache
+    from .models import Post
+    from .sidebar import invalidate_sidebar
+
+    posts = Post.objects.all() if force else Post.objects.exclude(render_version=RENDERER_VERSION)
+    post_ids = list(posts.order_by('pk').values_list('pk', flat=True))
+    count = 0
+    for start in range(0, len(post_ids), batch_size):
+        batch = list(Post.objects.filter(pk__in=post_ids[start:start + batch_size]).only(
+            'pk', 'content', 'excerpt', *RENDERED_FIELDS
+        ))
+        for post in batch:
+            render_post(post, force=True)
+        Post.objects.bulk_update(batch, RENDERED_FIELDS)
+        page_cache.purge(*(page_cache.post_key(post.pk) for post in batch))
+        count += len(batch)
+    if count:
+        invalidate_sidebar()
+        page_cache.purge(page_cache.POSTS_KEY, page_cache.SIDEBAR_KEY)
+    return count
@@ -0,0 +1,185 @@
+"""
+全文检索
+
+基于数据库表的倒排索引（SearchPosting / SearchDocument），不依赖特定数据库的
+全文检索扩展：
+
+- 分词：中日韩文字按二元组（bigram）切分，英文/数字按单词切分并转小写；
+  索引时另外写入单字，单字查询（例如“库”）也能命中
+- 排序：BM25，标题中的词项按 TITLE_WEIGHT 加权
+- 更新：文章保存时由 blog/signals.py 增量重建该文章的索引，删除时级联删除
+- 全量重建：python manage.py rebuild_search_index，修改分词方式后需要运行
+"""
+import math
+import re
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Avg, Count
+from django.utils.html import escape, strip_tags
+from django.utils.safestring import mark_safe
+
+from .models import Post, SearchDocument, SearchPosting
+from .rendering import CJK_RANGES as _CJK
+
+# BM25 参数
+K1 = 1.2
+B = 0.75
+# 标题中的词项相当于在正文中出现 TITLE_WEIGHT 次
+TITLE_WEIGHT = 3
+MAX_TERM_LENGTH = 64
+SNIPPET_RADIUS = 60
+
+# 影响索引内容的字段，只更新其他字段时无需重建索引
+INDEXED_FIELDS = frozenset({'title', 'excerpt', 'content'})
+
+TOKEN_RE = re.compile(rf'[{_CJK}]+|[^\W{_CJK}]+')
+CJK_RUN_RE = re.compile(rf'[{_CJK}]+')
+
+
+def tokenize(text):
+    """把文本切分为词项列表"""
+    tokens = []
+    for run in TOKEN_RE.findall(text.lower()):
+        if CJK_RUN_RE.fullmatch(run):
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run[:MAX_TERM_LENGTH])
+    return tokens
+
+
+def index_tokenize(text):
+    """索引用的分词：在 tokenize 的基础上加入连续中文中的每个单字"""
+    tokens = tokenize(text)
+    for run in CJK_RUN_RE.findall(text):
+        # 单独一个字的片段已经作为词项
+        if len(run) > 1:
+            tokens.extend(run)
+    return tokens
+
+
+def document_terms(post, tokenizer=tokenize):
+    """文章的词频统计，标题加权"""
+    terms = Counter(tokenizer(strip_tags(post.content)))
+    terms.update(tokenizer(post.excerpt or ''))
+    for term in tokenizer(post.title):
+        terms[term] += TITLE_WEIGHT
+    return terms
+
+
+def _build_rows(post):
+    terms = document_terms(post, index_tokenize)
+    document = SearchDocument(post_id=post.pk, length=sum(terms.values()))
+    postings = [SearchPosting(term=term, post_id=post.pk, tf=tf) for term, tf in terms.items()]
+    return document, postings
+
+
+def index_post(post):
+    """重建单篇文章的索引"""
+    document, postings = _build_rows(post)
+    with transaction.atomic():
+        SearchPosting.objects.filter(post_id=post.pk).delete()
+        SearchPosting.objects.bulk_create(postings)
+        SearchDocument.objects.update_or_create(post_id=post.pk, defaults={'length': document.length})
+
+
+def rebuild_index(batch_size=200):
+    """全量重建索引，返回已索引的文章数"""
+    count = 0
+    with transaction.atomic():
+        SearchPosting.objects.all().delete()
+        SearchDocument.objects.all().delete()
+        queryset = Post.objects.only('id', 'title', 'excerpt', 'content').order_by('pk')
+        documents, postings = [], []
+        for post in queryset.iterator(chunk_size=batch_size):
+            document, rows = _build_rows(post)
+            documents.append(document)
+            postings.extend(rows)
+            count += 1
+            if len(documents) >= batch_size:
+                SearchDocument.objects.bulk_create(documents)
+                SearchPosting.objects.bulk_create(postings, batch_size=1000)
+                documents, postings = [], []
+        SearchDocument.objects.bulk_create(documents)
+        SearchPosting.objects.bulk_create(postings, batch_size=1000)
+    return count
+
+
+def search(query, queryset=None):
+    """按BM25相关度返回 [(post_id, score), ...]，只在 queryset 范围内检索"""
+    terms = set(tokenize(query))
+    if not terms:
+        return []
+    if queryset is None:
+        queryset = Post.objects.filter(status='published')
+
+    stats = SearchDocument.objects.aggregate(total=Count('pk'), avg_length=Avg('length'))
+    total = stats['total'] or 0
+    avg_length = stats['avg_length'] or 1
+    if not total:
+        return []
+
+    rows = SearchPosting.objects.filter(
+        term__in=terms, post__in=queryset.values('pk')
+    ).values_list('term', 'post_id', 'tf', 'post__search_document__length')
+
+    postings = defaultdict(list)
+    for term, post_id, tf, length in rows:
+        postings[term].append((post_id, tf, length or 0))
+
+    doc_freq = dict(
+        SearchPosting.objects.filter(term__in=postings).values('term')
+        .annotate(df=Count('post')).values_list('term', 'df')
+    )
+
+    scores = defaultdict(float)
+    for term, hits in postings.items():
+        df = doc_freq.get(term, len(hits))
+        idf = math.log(1 + (total - df + 0.5) / (df + 0.5))
+        for post_id, tf, length in hits:
+            norm = K1 * (1 - B + B * length / avg_length)
+            scores[post_id] += idf * tf * (K1 + 1) / (tf + norm)
+
+    return sorted(scores.items(), key=lambda item: (-item[1], -item[0]))
+
+
+def _highlight_re(query):
+    """匹配查询中的单词和中文片段，较长的优先"""
+    words = TOKEN_RE.findall(query.lower())
+    fragments = set(words)
+    for word in words:
+        if CJK_RUN_RE.fullmatch(word) and len(word) > 2:
+            fragments.update(tokenize(word))
+    if not fragments:
+        return None
+    pattern = '|'.join(re.escape(f) for f in sorted(fragments, key=len, reverse=True))
+    return re.compile(pattern, re.IGNORECASE)
+
+
+def highlight(text, query, radius=SNIPPET_RADIUS):
+    """截取包含查询词的片段，并用 <mark> 高亮"""
+    text = strip_tags(text)
+    pattern = _highlight_re(query)
+    match = pattern.search(text) if pattern else None
+    if not match:
+        snippet = text[:radius * 2]
+        return mark_safe(escape(snippet) + ('...' if len(text) > len(snippet) else ''))
+
+    start = max(0, match.start() - radius)
+    end = min(len(text), match.end() + radius)
+    snippet = text[start:end]
+
+    parts = []
+    last = 0
+    for m in pattern.finditer(snippet):
+        parts.append(escape(snippet[last:m.start()]))
+        parts.append(f'<mark>{escape(m.group())}</mark>')
+        last = m.end()
+    parts.append(escape(snippet[last:]))
+
+    prefix = '...' if start > 0 else ''
+    suffix = '...' if end < len(text) else ''
+    return mark_safe(prefix + ''.join(parts) + suffix)
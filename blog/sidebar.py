@@ -0,0 +1,82 @@
+"""
+侧边栏数据提供者
+
+post_list / category_posts / tag_posts 共用同一份侧边栏数据（分类、热门标签、
+热门文章、最新评论）。每个区块单独缓存在Django缓存框架中，一次 get_many
+即可取回全部区块；blog/signals.py 中的信号只失效受影响的区块。
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Post, Category, Comment, TagStats
+
+SIDEBAR_CACHE_PREFIX = 'blog:sidebar:'
+
+# 各区块名称，同时也是模板中的变量名
+CATEGORIES = 'categories'
+POPULAR_TAGS = 'popular_tags'
+POPULAR_POSTS = 'popular_posts'
+RECENT_COMMENTS = 'recent_comments'
+SIDEBAR_SECTIONS = (CATEGORIES, POPULAR_TAGS, POPULAR_POSTS, RECENT_COMMENTS)
+
+
+def _cache_key(section):
+    return f'{SIDEBAR_CACHE_PREFIX}{section}'
+
+
+def _load_categories():
+    return list(Category.objects.all())
+
+
+def _load_popular_tags():
+    """热门标签 - 按 TagStats 中的已发布文章数排序，走 tagstats_popular_idx 索引"""
+    stats = TagStats.objects.filter(post_count__gt=0).select_related('tag').order_by('-post_count', 'tag')[:15]
+    tags = []
+    for stat in stats:
+        stat.tag.post_count = stat.post_count
+        tags.append(stat.tag)
+    return tags
+
+
+def _load_popular_posts():
+    """热门文章（按浏览量排序）"""
+    # 缓存的区块不带正文
+    return list(Post.objects.filter(status='published').defer('content', 'content_html').order_by('-views')[:5])
+
+
+def _load_recent_comments():
+    return list(
+        Comment.objects.select_related('author', 'post').defer('post__content', 'post__content_html')
+        .order_by('-created_at')[:5]
+    )
+
+
+_LOADERS = {
+    CATEGORIES: _load_categories,
+    POPULAR_TAGS: _load_popular_tags,
+    POPULAR_POSTS: _load_popular_posts,
+    RECENT_COMMENTS: _load_recent_comments,
+}
+
+
+def get_sidebar_context():
+    """返回侧边栏所需的全部数据，缓存命中时只有一次缓存读取"""
+    keys = {_cache_key(section): section for section in SIDEBAR_SECTIONS}
+    cached = cache.get_many(keys)
+
+    data = {}
+    missing = {}
+    for key, section in keys.items():
+        if key in cached:
+            data[section] = cached[key]
+        else:
+            data[section] = missing[key] = _LOADERS[section]()
+
+    if missing:
+        cache.set_many(missing, getattr(settings, 'BLOG_SIDEBAR_CACHE_TIMEOUT', 300))
+    return data
+
+
+def invalidate_sidebar(*sections):
+    """失效指定区块的缓存，不传参数时失效全部区块"""
+    cache.delete_many([_cache_key(section) for section in sections or SIDEBAR_SECTIONS])
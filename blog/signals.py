@@ -0,0 +1,167 @@
+"""
+blog 应用的信号处理
+
+模型变更后在这里精确地失效相关缓存。
+"""
+from django.contrib.contenttypes.models import ContentType
+from django.db.models.signals import post_init, post_save, post_delete, pre_delete
+from django.dispatch import receiver
+from taggit.models import Tag, TaggedItem
+
+from . import page_cache, search, syndication, tasks
+from .counters import adjust_category_count, adjust_comment_count, adjust_tag_counts
+from .pagination import invalidate_counts
+from .models import Post, Category, Comment
+from .slugs import slug_cache
+from .sidebar import (
+    invalidate_sidebar, CATEGORIES, POPULAR_TAGS, POPULAR_POSTS, RECENT_COMMENTS,
+)
+
+
+def refresh_sidebar(*sections):
+    """失效侧边栏区块，以及所有包含侧边栏的缓存页面"""
+    invalidate_sidebar(*sections)
+    page_cache.purge(page_cache.SIDEBAR_KEY)
+
+
+@receiver(post_init, sender=Post)
+def remember_post_state(sender, instance, **kwargs):
+    # 记录加载时的状态和分类，保存时据此判断列表成员是否变化；
+    # 延迟加载（only/defer）的字段不能在这里访问，否则会递归查询
+    instance._loaded_state = (instance.__dict__.get('status'), instance.__dict__.get('category_id'))
+
+
+@receiver([post_save, post_delete], sender=Post)
+def post_changed(sender, instance, created=False, **kwargs):
+    loaded_status, loaded_category_id = getattr(instance, '_loaded_state', (None, None))
+    deleted = kwargs.get('signal') is post_delete
+    # 文章的状态、标题、slug都会出现在热门标签/热门文章/最新评论中，
+    # 但侧边栏只展示已发布文章：草稿的保存不影响侧边栏和包含它的缓存页面
+    if is_or_was_published(instance, created, loaded_status):
+        refresh_sidebar(POPULAR_TAGS, POPULAR_POSTS, RECENT_COMMENTS)
+    invalidate_counts()
+    slug_cache.discard_post(instance.pk)
+
+    keys = {
+        page_cache.post_key(instance.pk), page_cache.category_key(instance.category_id),
+        syndication.sitemap_key('posts', instance.pk),
+    }
+    if update_category_counts(instance, created, deleted, loaded_status, loaded_category_id):
+        refresh_sidebar(CATEGORIES)
+    if created or deleted or loaded_status != instance.status or loaded_category_id != instance.category_id:
+        # 文章出现在列表中或从列表中消失
+        keys.add(page_cache.POSTS_KEY)
+        keys.add(page_cache.category_key(loaded_category_id))
+        if not created:
+            tag_ids = list(TaggedItem.objects.filter(
+                content_type=ContentType.objects.get_for_model(Post), object_id=instance.pk
+            ).values_list('tag_id', flat=True))
+            keys.update(page_cache.tag_key(tag_id) for tag_id in tag_ids)
+            # 文章发布或撤回发布时，它的每个标签的已发布文章数随之增减
+            was_published, is_published = loaded_status == 'published', instance.status == 'published'
+            if not deleted and loaded_status is not None and was_published != is_published:
+                adjust_tag_counts(tag_ids, 1 if is_published else -1)
+    page_cache.purge(*keys)
+    instance._loaded_state = (instance.status, instance.category_id)
+
+
+def is_or_was_published(instance, created, loaded_status):
+    """文章现在或保存前是否已发布；状态字段被延迟加载时无法判断，按已发布处理"""
+    if instance.status == 'published':
+        return True
+    if created:
+        return False
+    return loaded_status is None or loaded_status == 'published'
+
+
+def update_category_counts(instance, created, deleted, loaded_status, loaded_category_id):
+    """维护 Category.post_count，返回是否有计数变化"""
+    if loaded_status is None and not created:
+        # 状态字段被延迟加载，无法判断，交给 recount 修复
+        return False
+    was_counted = not created and loaded_status == 'published' and loaded_category_id
+    is_counted = not deleted and instance.status == 'published' and instance.category_id
+    if was_counted and is_counted and loaded_category_id == instance.category_id:
+        return False
+    if was_counted:
+        adjust_category_count(loaded_category_id, -1)
+    if is_counted:
+        adjust_category_count(instance.category_id, 1)
+    return bool(was_counted or is_counted)
+
+
+@receiver(pre_delete, sender=Post)
+def release_post_tags(sender, instance, **kwargs):
+    # 删除文章时 Collector 先删除文章行再删除 TaggedItem，这里在删除前减去标签计数
+    if instance.status == 'published':
+        adjust_tag_counts(
+            TaggedItem.objects.filter(
+                content_type=ContentType.objects.get_for_model(Post), object_id=instance.pk
+            ).values_list('tag_id', flat=True),
+            -1,
+        )
+
+
+def _is_post_deletion(origin):
+    return isinstance(origin, Post) or getattr(origin, 'model', None) is Post
+
+
+@receiver(post_save, sender=Post)
+def update_search_index(sender, instance, raw=False, update_fields=None, **kwargs):
+    # 只更新了浏览量等非检索字段时不需要重建索引
+    if raw or (update_fields and not search.INDEXED_FIELDS.intersection(update_fields)):
+        return
+    tasks.index_post.delay(instance.pk, key=f'index_post:{instance.pk}')
+
+
+@receiver(post_init, sender=Comment)
+def remember_comment_state(sender, instance, **kwargs):
+    instance._loaded_approved = instance.__dict__.get('is_approved')
+
+
+@receiver([post_save, post_delete], sender=Comment)
+def comment_changed(sender, instance, created=False, **kwargs):
+    refresh_sidebar(RECENT_COMMENTS)
+    page_cache.purge(page_cache.post_key(instance.post_id))
+
+    # 维护 Post.comment_count（只统计已审核评论）
+    loaded = getattr(instance, '_loaded_approved', None)
+    if kwargs.get('signal') is post_delete:
+        delta = -1 if (instance.is_approved if loaded is None else loaded) else 0
+    elif created:
+        delta = 1 if instance.is_approved else 0
+    elif loaded is not None and loaded != instance.is_approved:
+        delta = 1 if instance.is_approved else -1
+    else:
+        delta = 0
+    adjust_comment_count(instance.post_id, delta)
+    instance._loaded_approved = instance.is_approved
+
+
+@receiver([post_save, post_delete], sender=Category)
+def category_changed(sender, instance, **kwargs):
+    refresh_sidebar(CATEGORIES)
+    page_cache.purge(page_cache.category_key(instance.pk), syndication.sitemap_key('categories', instance.pk))
+
+
+@receiver([post_save, post_delete], sender=Tag)
+def tag_changed(sender, instance, **kwargs):
+    refresh_sidebar(POPULAR_TAGS)
+    invalidate_counts()
+    page_cache.purge(page_cache.tag_key(instance.pk), syndication.sitemap_key('tags', instance.pk))
+
+
+@receiver([post_save, post_delete], sender=TaggedItem)
+def post_tags_changed(sender, instance, created=False, raw=False, **kwargs):
+    # PostForm.save_m2m 通过 TaggableManager.set() 逐条增删 TaggedItem
+    refresh_sidebar(POPULAR_TAGS)
+    invalidate_counts()
+    keys = [page_cache.tag_key(instance.tag_id)]
+    if instance.content_type_id == ContentType.objects.get_for_model(Post).pk:
+        keys.append(page_cache.post_key(instance.object_id))
+        # 维护 TagStats；删除文章连带删除的 TaggedItem 由 release_post_tags 处理
+        deleted = kwargs.get('signal') is post_delete
+        if (created and not raw) or (deleted and not _is_post_deletion(kwargs.get('origin'))):
+            if Post.objects.filter(pk=instance.object_id, status='published').exists():
+                adjust_tag_counts([instance.tag_id], -1 if deleted else 1)
+    page_cache.purge(*keys)
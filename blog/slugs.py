@@ -0,0 +1,123 @@
+"""
+文章slug工具
+
+- normalize_slug：写入和查询时统一的规范化规则（URL解码、NFKC、去除首尾空白和斜杠）
+- allocate_slug / allocate_slugs：一次前缀查询找出已占用的最大数字后缀，
+  确定性地分配 ``base``、``base-2``、``base-3``……，支持批量导入
+- SlugCache：进程内的 slug -> 文章ID LRU缓存，post_detail 命中时按主键查询
+"""
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from urllib.parse import unquote
+
+from django.conf import settings
+from django.db.models import Q
+
+SLUG_MAX_LENGTH = 200
+# 数字后缀最多占用的长度（"-" 加数字），过长的slug先截断再追加后缀
+SUFFIX_RESERVE = 8
+
+
+def normalize_slug(value):
+    """规范化slug，保证同一篇文章的各种编码形式得到同一个值"""
+    value = unquote(value or '')
+    value = unicodedata.normalize('NFKC', value)
+    return value.strip().strip('/').strip()[:SLUG_MAX_LENGTH]
+
+
+def _slug_head(base):
+    """追加后缀时使用的前缀，保证加上后缀后不超过字段长度"""
+    return base[:SLUG_MAX_LENGTH - SUFFIX_RESERVE].rstrip('-') or base[:SLUG_MAX_LENGTH - SUFFIX_RESERVE]
+
+
+def _next_free(base, existing):
+    """根据已占用的slug集合，返回 base 或 head-N 中第一个空闲的值"""
+    if base not in existing:
+        return base
+    head = _slug_head(base)
+    suffix_re = re.compile(rf'{re.escape(head)}-(\d+)')
+    suffixes = [int(m.group(1)) for m in map(suffix_re.fullmatch, existing) if m]
+    return f'{head}-{max(suffixes, default=1) + 1}'
+
+
+def _taken_slugs(bases, exclude_pk=None):
+    """一次查询取出与这些 base 冲突或带数字后缀的所有已有slug"""
+    from .models import Post
+
+    lookup = Q(slug__in=bases)
+    for head in {_slug_head(base) for base in bases}:
+        # 用区间代替 startswith（SQLite 的 LIKE 不区分大小写，用不上slug索引）；'.' 紧跟在 '-' 之后
+        lookup |= Q(slug__gte=f'{head}-', slug__lt=f'{head}.')
+    queryset = Post.objects.filter(lookup).order_by()
+    if exclude_pk is not None:
+        queryset = queryset.exclude(pk=exclude_pk)
+    return set(queryset.values_list('slug', flat=True))
+
+
+def allocate_slug(base, exclude_pk=None):
+    """为单篇文章分配空闲slug，只执行一次查询"""
+    base = normalize_slug(base)
+    return _next_free(base, _taken_slugs([base], exclude_pk))
+
+
+def allocate_slugs(posts, batch_size=200):
+    """为一批尚未保存的文章分配互不冲突的slug，供 bulk_create 导入使用
+
+    每 batch_size 篇文章只执行一次查询，批次内部的冲突在内存中解决。
+    """
+    posts = list(posts)
+    for start in range(0, len(posts), batch_size):
+        batch = posts[start:start + batch_size]
+        bases = [normalize_slug(post.slug) or normalize_slug(post.title) for post in batch]
+        taken = _taken_slugs(set(bases))
+        for post, base in zip(batch, bases):
+            post.slug = _next_free(base, taken)
+            taken.add(post.slug)
+    return posts
+
+
+class SlugCache:
+    """线程安全的 slug -> 文章ID LRU缓存"""
+
+    def __init__(self, max_size=None):
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    @property
+    def max_size(self):
+        if self._max_size is not None:
+            return self._max_size
+        return getattr(settings, 'BLOG_SLUG_CACHE_SIZE', 1024)
+
+    def get(self, slug):
+        with self._lock:
+            post_id = self._entries.get(slug)
+            if post_id is not None:
+                self._entries.move_to_end(slug)
+            return post_id
+
+    def set(self, slug, post_id):
+        with self._lock:
+            self._entries[slug] = post_id
+            self._entries.move_to_end(slug)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, slug):
+        with self._lock:
+            self._entries.pop(slug, None)
+
+    def discard_post(self, post_id):
+        with self._lock:
+            for slug in [slug for slug, pk in self._entries.items() if pk == post_id]:
+                del self._entries[slug]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+slug_cache = SlugCache()
@@ -0,0 +1,357 @@
+"""
+RSS/Atom 订阅和 XML 站点地图
+
+爬虫原本只能逐页抓取文章列表、分类页和标签页来发现文章，这里提供更便宜的入口：
+
+- 订阅：全站、每个分类、每个标签各有 RSS（``feed/``）和 Atom（``feed/atom/``），
+  包含最新的 BLOG_FEED_ITEMS 篇已发布文章
+- 站点地图：``sitemap.xml`` 为索引，文章、分类、标签按主键区间切成每块
+  BLOG_SITEMAP_CHUNK_SIZE 条（``sitemap-posts-0.xml`` 为主键 1~N，依此类推）
+
+缓存按块进行，失效沿用 blog.page_cache 的代理键令牌：
+
+- 订阅中每篇文章的条目单独缓存，依赖 ``post:ID`` 和所属分类；订阅的文章ID列表依赖
+  ``posts``、``category:ID`` 或 ``tag:ID``。修改一篇文章只重新生成它自己的条目；
+  响应逐条流式输出，未命中的条目在输出时才生成
+- 站点地图每块依赖 ``sitemap:<区间>:<块号>``，文章、分类、标签变更时只清除所在的块；
+  未命中的块用 ``.iterator()`` 边查询边输出，输出完毕后写入缓存
+"""
+import hashlib
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.feedgenerator import rfc2822_date, rfc3339_date
+from django.utils.xmlutils import SimplerXMLGenerator
+from taggit.models import Tag
+
+from . import page_cache
+from .models import Post, Category
+
+SYNDICATION_CACHE_PREFIX = 'blog:syndication:'
+SITE_TITLE = '墨境BLOG'
+CONTENT_TYPES = {
+    'rss': 'application/rss+xml; charset=utf-8',
+    'atom': 'application/atom+xml; charset=utf-8',
+}
+SITEMAP_CONTENT_TYPE = 'application/xml; charset=utf-8'
+SITEMAP_NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+XML_DECLARATION = '<?xml version="1.0" encoding="utf-8"?>\n'
+
+
+def feed_items():
+    return getattr(settings, 'BLOG_FEED_ITEMS', 20)
+
+
+def chunk_size():
+    return getattr(settings, 'BLOG_SITEMAP_CHUNK_SIZE', 1000)
+
+
+def cache_timeout():
+    return getattr(settings, 'BLOG_SYNDICATION_CACHE_TIMEOUT', 24 * 3600)
+
+
+def _cache_key(*parts):
+    digest = hashlib.md5('|'.join(map(str, parts)).encode('utf-8')).hexdigest()
+    return f'{SYNDICATION_CACHE_PREFIX}{parts[0]}:{digest}'
+
+
+def _store(key, keys, value):
+    """写入缓存条目；令牌应在查询之前取得，查询期间发生的 purge 会让条目直接失效"""
+    cache.set(key, {'tokens': keys, 'value': value}, cache_timeout())
+
+
+def _load_many(keys):
+    """批量读取缓存条目，一次 get_many 校验所有条目的代理键令牌，返回 {键: 值}"""
+    entries = cache.get_many(keys)
+    surrogate = set()
+    for entry in entries.values():
+        surrogate.update(entry['tokens'])
+    current = page_cache.current_tokens(surrogate, create_missing=False)
+    return {
+        key: entry['value'] for key, entry in entries.items()
+        if all(current.get(name) == token for name, token in entry['tokens'].items())
+    }
+
+
+def _xml(write):
+    """用 SimplerXMLGenerator 生成一段XML（不含声明），负责转义"""
+    stream = StringIO()
+    handler = SimplerXMLGenerator(stream, 'utf-8', short_empty_elements=True)
+    write(handler)
+    return stream.getvalue()
+
+
+# 站点地图
+
+SECTIONS = ('posts', 'categories', 'tags')
+
+
+def chunk_surrogate_key(section, chunk):
+    return f'sitemap:{section}:{chunk}'
+
+
+def sitemap_key(section, pk):
+    """对象所在站点地图块的代理键，信号据此只清除受影响的块"""
+    return chunk_surrogate_key(section, (pk - 1) // chunk_size())
+
+
+def section_queryset(section):
+    if section == 'posts':
+        return Post.objects.filter(status='published')
+    if section == 'categories':
+        return Category.objects.all()
+    return Tag.objects.all()
+
+
+def section_location(section, slug):
+    if section == 'posts':
+        return reverse('blog:post_detail', args=[slug])
+    if section == 'categories':
+        return reverse('blog:category_posts', args=[slug])
+    return reverse('blog:tag_posts', args=[slug])
+
+
+def _chunk_bounds(chunk):
+    size = chunk_size()
+    return chunk * size + 1, (chunk + 1) * size
+
+
+def _chunk_rows(section, chunk):
+    """块内的 (slug, 修改时间) ，按主键顺序逐批读取"""
+    start, end = _chunk_bounds(chunk)
+    queryset = section_queryset(section).filter(pk__gte=start, pk__lte=end).order_by('pk')
+    fields = ('slug', 'updated_at') if section == 'posts' else ('slug',)
+    for row in queryset.values_list(*fields).iterator(chunk_size=500):
+        yield row[0], (row[1] if len(row) > 1 else None)
+
+
+def _chunk_summary(section, chunk):
+    """块内对象数和最后修改时间，站点地图索引使用"""
+    start, end = _chunk_bounds(chunk)
+    queryset = section_queryset(section).filter(pk__gte=start, pk__lte=end)
+    if section == 'posts':
+        return queryset.aggregate(count=Count('pk'), lastmod=Max('updated_at'))
+    return {'count': queryset.count(), 'lastmod': None}
+
+
+def _url_element(handler, location, lastmod):
+    handler.startElement('url', {})
+    handler.addQuickElement('loc', location)
+    if lastmod:
+        handler.addQuickElement('lastmod', lastmod.isoformat())
+    handler.endElement('url')
+
+
+def sitemap_index(request):
+    """站点地图索引：每个非空的块一条，块的统计信息按块缓存"""
+    chunks = []
+    for section in SECTIONS:
+        max_pk = section_queryset(section).aggregate(max_pk=Max('pk'))['max_pk']
+        if max_pk:
+            chunks.extend((section, chunk) for chunk in range((max_pk - 1) // chunk_size() + 1))
+
+    keys = {_cache_key('sitemap-summary', section, chunk, chunk_size()): (section, chunk) for section, chunk in chunks}
+    summaries = _load_many(keys)
+    for key, (section, chunk) in keys.items():
+        if key not in summaries:
+            tokens = page_cache.current_tokens([chunk_surrogate_key(section, chunk)])
+            summaries[key] = _chunk_summary(section, chunk)
+            _store(key, tokens, summaries[key])
+
+    def write(handler):
+        handler.startElement('sitemapindex', {'xmlns': SITEMAP_NS})
+        for key, (section, chunk) in keys.items():
+            summary = summaries[key]
+            if not summary['count']:
+                continue
+            handler.startElement('sitemap', {})
+            handler.addQuickElement('loc', request.build_absolute_uri(
+                reverse('blog:sitemap_chunk', args=[section, chunk])
+            ))
+            if summary['lastmod']:
+                handler.addQuickElement('lastmod', summary['lastmod'].isoformat())
+            handler.endElement('sitemap')
+        handler.endElement('sitemapindex')
+
+    return HttpResponse(XML_DECLARATION + _xml(write), content_type=SITEMAP_CONTENT_TYPE)
+
+
+def sitemap_chunk(request, section, chunk):
+    """一块站点地图；未命中时边查询边输出，完整输出后写入缓存"""
+    if section not in SECTIONS:
+        raise Http404('站点地图不存在')
+    key = _cache_key('sitemap', section, chunk, chunk_size(), request.scheme, request.get_host())
+    body = _load_many([key]).get(key)
+    if body is not None:
+        return HttpResponse(body, content_type=SITEMAP_CONTENT_TYPE)
+
+    tokens = page_cache.current_tokens([chunk_surrogate_key(section, chunk)])
+    base = request.build_absolute_uri('/')[:-1]
+
+    def stream():
+        parts = [XML_DECLARATION, f'<urlset xmlns="{SITEMAP_NS}">']
+        yield ''.join(parts)
+        for slug, lastmod in _chunk_rows(section, chunk):
+            part = _xml(lambda handler: _url_element(handler, base + section_location(section, slug), lastmod))
+            parts.append(part)
+            yield part
+        parts.append('</urlset>\n')
+        yield parts[-1]
+        _store(key, tokens, ''.join(parts))
+
+    return StreamingHttpResponse(stream(), content_type=SITEMAP_CONTENT_TYPE)
+
+
+# 订阅
+
+def _feed_scope(scope, slug):
+    """订阅的标题、页面地址和文章ID列表依赖的代理键，未知的分类或标签返回404"""
+    if scope == 'all':
+        return SITE_TITLE, reverse('blog:post_list'), page_cache.POSTS_KEY, Post.objects.all()
+    if scope == 'category':
+        category = Category.objects.filter(slug=slug).values('pk', 'name').first()
+        if category is None:
+            raise Http404('分类不存在')
+        return (
+            f'{SITE_TITLE} - {category["name"]}', reverse('blog:category_posts', args=[slug]),
+            page_cache.category_key(category['pk']), Post.objects.filter(category_id=category['pk']),
+        )
+    tag = Tag.objects.filter(slug=slug).values('pk', 'name').first()
+    if tag is None:
+        raise Http404('标签不存在')
+    return (
+        f'{SITE_TITLE} - {tag["name"]}', reverse('blog:tag_posts', args=[slug]),
+        page_cache.tag_key(tag['pk']), Post.objects.filter(tags__id=tag['pk']),
+    )
+
+
+def feed_listing(scope, slug=None):
+    """订阅的标题、页面地址和最新文章ID，按订阅缓存"""
+    key = _cache_key('feed-list', scope, slug, feed_items())
+    listing = _load_many([key]).get(key)
+    if listing is not None:
+        return listing
+    title, link, surrogate, queryset = _feed_scope(scope, slug)
+    tokens = page_cache.current_tokens([surrogate])
+    ids = list(queryset.filter(status='published').order_by('-created_at', '-id').values_list('pk', flat=True)[
+        :feed_items()
+    ])
+    listing = {'title': title, 'link': link, 'ids': ids}
+    _store(key, tokens, listing)
+    return listing
+
+
+def _entry_xml(fmt, post, base):
+    link = base + post.get_absolute_url()
+    published = post.published_at or post.created_at
+
+    def write(handler):
+        if fmt == 'atom':
+            handler.startElement('entry', {})
+            handler.addQuickElement('title', post.title)
+            handler.addQuickElement('link', '', {'href': link, 'rel': 'alternate'})
+            handler.addQuickElement('id', link)
+            handler.addQuickElement('published', rfc3339_date(published))
+            handler.addQuickElement('updated', rfc3339_date(post.updated_at))
+            handler.startElement('author', {})
+            handler.addQuickElement('name', post.author.username)
+            handler.endElement('author')
+            handler.addQuickElement('summary', post.excerpt_text, {'type': 'text'})
+            if post.category:
+                handler.addQuickElement('category', '', {'term': post.category.name})
+            handler.endElement('entry')
+        else:
+            handler.startElement('item', {})
+            handler.addQuickElement('title', post.title)
+            handler.addQuickElement('link', link)
+            handler.addQuickElement('description', post.excerpt_text)
+            handler.addQuickElement('pubDate', rfc2822_date(published))
+            handler.addQuickElement('guid', link, {'isPermaLink': 'true'})
+            if post.category:
+                handler.addQuickElement('category', post.category.name)
+            handler.endElement('item')
+
+    return _xml(write)
+
+
+def feed_entries(fmt, ids, base):
+    """返回 (最新的更新时间, 按顺序逐条生成条目XML的迭代器)
+
+    查询只为未命中或已失效的文章执行，并在返回前完成（迭代器在视图返回后才被消费）；
+    这些条目在迭代时才生成XML并写入缓存。
+    """
+    keys = {pk: _cache_key('feed-entry', fmt, pk, base) for pk in ids}
+    entries = _load_many(keys.values())
+    missing = [pk for pk in ids if keys[pk] not in entries]
+    posts, tokens = {}, {}
+    if missing:
+        tokens = page_cache.current_tokens({page_cache.post_key(pk) for pk in missing})
+        queryset = Post.objects.filter(pk__in=missing, status='published').select_related('author', 'category').only(
+            'title', 'slug', 'excerpt_text', 'created_at', 'updated_at', 'published_at', 'status',
+            'author__username', 'category__name',
+        )
+        posts = {post.pk: post for post in queryset.iterator(chunk_size=100)}
+        tokens.update(page_cache.current_tokens(
+            {page_cache.category_key(post.category_id) for post in posts.values()} - {None}
+        ))
+    updated = max(
+        [*(updated for updated, _ in entries.values()), *(post.updated_at for post in posts.values())],
+        default=None,
+    )
+
+    def generate():
+        for pk in ids:
+            entry = entries.get(keys[pk])
+            if entry is None:
+                post = posts.get(pk)
+                if post is None:
+                    # 列表缓存之后被删除或撤回的文章没有条目
+                    continue
+                entry = (post.updated_at, _entry_xml(fmt, post, base))
+                surrogate = {page_cache.post_key(pk), page_cache.category_key(post.category_id)} - {None}
+                _store(keys[pk], {key: tokens[key] for key in surrogate}, entry)
+            yield entry[1]
+
+    return updated, generate()
+
+
+def feed_response(request, fmt, scope, slug=None):
+    """订阅响应：头部之后逐条输出条目，像 sitemap_chunk 一样流式返回"""
+    listing = feed_listing(scope, slug)
+    base = request.build_absolute_uri('/')[:-1]
+    updated, entries = feed_entries(fmt, listing['ids'], base)
+    link = base + listing['link']
+    self_link = request.build_absolute_uri(request.path)
+
+    def write_header(handler):
+        if fmt == 'atom':
+            handler.addQuickElement('title', listing['title'])
+            handler.addQuickElement('link', '', {'href': link, 'rel': 'alternate'})
+            handler.addQuickElement('link', '', {'href': self_link, 'rel': 'self'})
+            handler.addQuickElement('id', link)
+            if updated:
+                handler.addQuickElement('updated', rfc3339_date(updated))
+        else:
+            handler.addQuickElement('title', listing['title'])
+            handler.addQuickElement('link', link)
+            handler.addQuickElement('description', listing['title'])
+            handler.addQuickElement('atom:link', '', {'href': self_link, 'rel': 'self'})
+            if updated:
+                handler.addQuickElement('lastBuildDate', rfc2822_date(updated))
+
+    if fmt == 'atom':
+        opening, closing = '<feed xmlns="http://www.w3.org/2005/Atom">', '</feed>\n'
+    else:
+        opening = '<rss version="2.0" xmlns:atom="http://www.w3.org/2005/Atom"><channel>'
+        closing = '</channel></rss>\n'
+
+    def stream():
+        yield XML_DECLARATION + opening + _xml(write_header)
+        yield from entries
+        yield closing
+
+    return StreamingHttpResponse(stream(), content_type=CONTENT_TYPES[fmt])
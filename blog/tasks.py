@@ -0,0 +1,273 @@
+"""
+后台任务队列
+
+文章保存后的耗时工作（检索索引、相关文章、图片尺寸）不在请求中执行，而是写入
+Task 表，请求在事务提交后立即返回：
+
+    index_post.delay(post.pk, key=f'index_post:{post.pk}')
+
+- 去重：同一个 key 同时只保留一条等待执行的任务（部分唯一约束），
+  短时间内多次保存同一篇文章只执行一次；重复提交会合并到已有的任务并重新提交执行
+- 重试：任务抛出异常后按 BLOG_TASK_RETRY_DELAY * 2^(n-1) 秒退避重试，
+  超过 max_attempts 次后标记为 failed，保留错误信息
+- 执行方式由 BLOG_TASK_MODE 决定：
+  'thread' 事务提交后交给进程内线程池执行，每个进程第一次提交时先回收遗留任务；
+  'worker' 只写入任务表，由 ``python manage.py run_tasks`` 执行；
+  'eager'  调用时立即同步执行（测试用）
+
+任务参数必须可以JSON序列化（通常只传主键），执行时重新读取最新数据。
+"""
+import logging
+import os
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# 任务名 -> (函数, 最多执行次数)
+TASKS = {}
+
+
+def get_mode():
+    return getattr(settings, 'BLOG_TASK_MODE', 'thread')
+
+
+def task(name, max_attempts=3):
+    """注册任务，被装饰的函数获得 delay(*args, key=None, countdown=0) 方法"""
+    def decorator(func):
+        TASKS[name] = (func, max_attempts)
+
+        def delay(*args, key=None, countdown=0):
+            return enqueue(name, *args, key=key, countdown=countdown)
+
+        func.delay = delay
+        func.task_name = name
+        return func
+    return decorator
+
+
+def enqueue(name, *args, key=None, countdown=0):
+    """提交任务，返回新建或合并到的 Task；立即执行时返回 None"""
+    func, max_attempts = TASKS[name]
+    mode = get_mode()
+    if mode == 'eager':
+        func(*args)
+        return None
+
+    run_after = timezone.now() + timedelta(seconds=countdown)
+    queued = _create_or_reschedule(name, args, key, max_attempts, run_after)
+    if queued is not None and mode == 'thread':
+        delay = max((queued.run_after - timezone.now()).total_seconds(), 0)
+        transaction.on_commit(lambda: executor.submit(queued.pk, delay))
+    return queued
+
+
+def _create_or_reschedule(name, args, key, max_attempts, run_after):
+    """新建任务；同一个key已有等待执行的任务时合并到该任务，执行时间取较早的一个
+
+    已有的任务可能是进程重启、崩溃或事务回滚后遗留的，没有任何执行者会再提交它，
+    因此合并后由调用方重新提交，而不是直接丢弃这次请求。
+    """
+    from .models import Task
+
+    # 查找已有任务与其被领取之间存在竞争，领取后唯一约束不再冲突，再新建一次即可
+    for _ in range(2):
+        try:
+            with transaction.atomic():
+                return Task.objects.create(
+                    name=name, args=list(args), key=key, max_attempts=max_attempts, run_after=run_after,
+                )
+        except IntegrityError:
+            pass
+        existing = Task.objects.filter(key=key, status='pending').first()
+        if existing is None:
+            continue
+        existing.args = list(args)
+        existing.run_after = min(existing.run_after, run_after)
+        if Task.objects.filter(pk=existing.pk, status='pending').update(
+            args=existing.args, run_after=existing.run_after,
+        ):
+            return existing
+    return None
+
+
+def run_task(task_id):
+    """领取并执行一条任务；返回 None 表示已完成或不再重试，否则返回下次重试前等待的秒数"""
+    from .models import Task
+
+    now = timezone.now()
+    # 条件更新领取任务，多个执行者同时领取时只有一个成功
+    claimed = Task.objects.filter(pk=task_id, status='pending', run_after__lte=now).update(
+        status='running', locked_at=now, attempts=F('attempts') + 1,
+    )
+    if not claimed:
+        return None
+    current = Task.objects.get(pk=task_id)
+
+    if current.name not in TASKS:
+        Task.objects.filter(pk=task_id).update(status='failed', last_error=f'未注册的任务：{current.name}')
+        return None
+    func = TASKS[current.name][0]
+    try:
+        func(*current.args)
+    except Exception:
+        logger.exception('任务 %s 执行失败（第 %d 次）', current, current.attempts)
+        return _retry_or_fail(current, traceback.format_exc())
+    Task.objects.filter(pk=task_id).delete()
+    return None
+
+
+def _retry_or_fail(current, error):
+    from .models import Task
+
+    if current.attempts >= current.max_attempts:
+        Task.objects.filter(pk=current.pk).update(status='failed', last_error=error)
+        return None
+    delay = getattr(settings, 'BLOG_TASK_RETRY_DELAY', 5) * 2 ** (current.attempts - 1)
+    try:
+        with transaction.atomic():
+            Task.objects.filter(pk=current.pk).update(
+                status='pending', run_after=timezone.now() + timedelta(seconds=delay), last_error=error,
+            )
+    except IntegrityError:
+        # 执行期间已有同一个key的新任务，由新任务代替重试
+        Task.objects.filter(pk=current.pk).delete()
+        return None
+    return delay
+
+
+def requeue_stale():
+    """执行超时（执行者异常退出）的任务重新放回队列，返回放回的数量"""
+    from .models import Task
+
+    deadline = timezone.now() - timedelta(seconds=getattr(settings, 'BLOG_TASK_TIMEOUT', 300))
+    count = 0
+    for task_id in Task.objects.filter(status='running', locked_at__lt=deadline).values_list('pk', flat=True):
+        try:
+            with transaction.atomic():
+                count += Task.objects.filter(pk=task_id, status='running').update(status='pending')
+        except IntegrityError:
+            Task.objects.filter(pk=task_id).delete()
+    return count
+
+
+def pending_tasks(limit=1000):
+    """所有等待执行的任务 (ID, 执行时间)，包括退避中尚未到期的"""
+    from .models import Task
+
+    return list(Task.objects.filter(status='pending').order_by('run_after', 'id').values_list('pk', 'run_after')[:limit])
+
+
+def due_tasks(limit=100):
+    """已到执行时间的等待任务ID"""
+    from .models import Task
+
+    return list(
+        Task.objects.filter(status='pending', run_after__lte=timezone.now())
+        .order_by('run_after', 'id').values_list('pk', flat=True)[:limit]
+    )
+
+
+def run_task_in_thread(task_id):
+    """在线程池中执行任务，结束后关闭该线程的数据库连接"""
+    try:
+        return run_task(task_id)
+    except Exception:
+        # 领取或记录结果时出错（例如SQLite写锁超时），任务保持原状态，稍后再试
+        logger.exception('任务 %s 领取或记录结果失败', task_id)
+        return None
+    finally:
+        connection.close()
+
+
+class ThreadExecutor:
+    """进程内线程池（BLOG_TASK_MODE = 'thread'），重试通过定时器重新提交
+
+    定时器和线程池都只在内存中，进程退出后未执行的任务留在表里。每个进程第一次提交
+    任务时先回收一次：超时的 running 任务放回队列，所有 pending 任务按执行时间重新提交。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pid = os.getpid()
+        self._recovered_pid = None
+
+    def _get_pool(self):
+        with self._lock:
+            # fork出的子进程不能继承父进程的线程池
+            if self._pool is None or self._pid != os.getpid():
+                self._pool = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'BLOG_TASK_THREADS', 2), thread_name_prefix='blog-task',
+                )
+                self._pid = os.getpid()
+            return self._pool
+
+    def submit(self, task_id, delay=0):
+        self._recover()
+        if delay > 0:
+            timer = threading.Timer(delay, self.submit, args=(task_id,))
+            timer.daemon = True
+            timer.start()
+            return
+        self._get_pool().submit(self._run, task_id)
+
+    def _recover(self):
+        with self._lock:
+            if self._recovered_pid == os.getpid():
+                return
+            self._recovered_pid = os.getpid()
+        self._get_pool().submit(self._sweep)
+
+    def _sweep(self):
+        try:
+            requeue_stale()
+            now = timezone.now()
+            for task_id, run_after in pending_tasks():
+                self.submit(task_id, max((run_after - now).total_seconds(), 0))
+        except Exception:
+            logger.exception('回收遗留任务失败')
+        finally:
+            connection.close()
+
+    def _run(self, task_id):
+        delay = run_task_in_thread(task_id)
+        if delay is not None:
+            self.submit(task_id, delay)
+
+
+executor = ThreadExecutor()
+
+
+@task('blog.index_post')
+def index_post(post_id):
+    from . import search
+    from .models import Post
+
+    post = Post.objects.filter(pk=post_id).first()
+    if post is not None:
+        search.index_post(post)
+
+
+@task('blog.update_related')
+def update_related(post_id):
+    from . import related
+    from .models import Post
+
+    post = Post.objects.filter(pk=post_id).first()
+    if post is not None:
+        related.update_post(post)
+
+
+@task('blog.generate_image_variants')
+def generate_image_variants(post_id):
+    from . import images
+
+    images.generate_variants(post_id)
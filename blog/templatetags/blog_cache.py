@@ -0,0 +1,54 @@
+"""
+模板片段缓存标签
+
+    {% load blog_cache %}
+    {% cachefragment 'post_card' post search_query %}
+        ...
+    {% endcachefragment %}
+
+第一个参数是片段名，其余参数决定缓存键（模型实例带上 updated_at）；
+depends=表达式 声明额外的依赖对象，只在未命中时求值。详见 blog.fragment_cache。
+"""
+from django import template
+from django.template.base import token_kwargs
+
+from blog import fragment_cache
+
+register = template.Library()
+
+
+class FragmentCacheNode(template.Node):
+    def __init__(self, nodelist, name, vary_on, depends):
+        self.nodelist = nodelist
+        self.name = name
+        self.vary_on = vary_on
+        self.depends = depends
+
+    def render(self, context):
+        name = self.name.resolve(context)
+        vary_on = [expression.resolve(context) for expression in self.vary_on]
+        depends = [lambda: self.depends.resolve(context)] if self.depends is not None else []
+        return fragment_cache.get_or_render(name, vary_on, lambda: self.nodelist.render(context), depends)
+
+
+@register.tag('cachefragment')
+def do_cachefragment(parser, token):
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' 至少需要片段名一个参数")
+    nodelist = parser.parse(('endcachefragment',))
+    parser.delete_first_token()
+
+    name = parser.compile_filter(bits[1])
+    remaining = bits[2:]
+    vary_on = []
+    depends = None
+    while remaining:
+        kwargs = token_kwargs(remaining, parser)
+        if kwargs:
+            if set(kwargs) - {'depends'}:
+                raise template.TemplateSyntaxError(f"'{bits[0]}' 只支持 depends 关键字参数")
+            depends = kwargs['depends']
+            continue
+        vary_on.append(parser.compile_filter(remaining.pop(0)))
+    return FragmentCacheNode(nodelist, name, vary_on, depends)
@@ -0,0 +1,57 @@
+"""
+响应式图片模板标签
+
+    {% load blog_images %}
+    {% srcset post 'card' class='card-img-top' %}
+
+输出 <picture>：WebP 的 <source> 和 JPEG 的 <img> 都带有全部尺寸的 srcset，
+浏览器按 sizes 选择合适的宽度；尺寸尚未生成时输出原图。
+"""
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html, format_html_join
+
+from blog.images import current_variants
+
+register = template.Library()
+
+# 各尺寸在页面中的显示宽度，与 Bootstrap 栅格对应
+SIZES = {
+    'thumbnail': '80px',
+    'card': '(min-width: 992px) 33vw, (min-width: 768px) 50vw, 100vw',
+    'hero': '(min-width: 1200px) 1140px, 100vw',
+}
+
+
+def _srcset(variants, fmt):
+    # 原图较窄时多个尺寸宽度相同，只保留一个
+    widths = {entry['width']: entry[fmt] for entry in variants.values()}
+    return ', '.join(f'{default_storage.url(name)} {width}w' for width, name in sorted(widths.items()))
+
+
+@register.simple_tag
+def srcset(post, variant='card', sizes=None, **attrs):
+    """文章特色图片的 <picture>，额外的关键字参数作为 <img> 的属性"""
+    if not post.featured_image:
+        return ''
+    attrs.setdefault('alt', post.title)
+    if variant != 'hero':
+        attrs.setdefault('loading', 'lazy')
+
+    variants = current_variants(post)
+    entry = variants.get(variant)
+    if not entry:
+        return format_html('<img src="{}"{}>', post.featured_image.url, _attrs(attrs))
+
+    sizes = sizes or SIZES.get(variant, '100vw')
+    attrs.update(width=entry['width'], height=entry['height'])
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}"{}></picture>',
+        _srcset(variants, 'webp'), sizes,
+        default_storage.url(entry['jpeg']), _srcset(variants, 'jpeg'), sizes, _attrs(attrs),
+    )
+
+
+def _attrs(attrs):
+    return format_html_join('', ' {}="{}"', sorted(attrs.items()))
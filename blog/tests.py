@@ -1,3 +1,1486 @@
-from django.test import TestCase
+import importlib.util
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import xml.etree.ElementTree as ET
+from datetime import timedelta
+from io import BytesIO, StringIO
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.contrib.admin.sites import site as admin_site
+from django.contrib.auth.models import AnonymousUser, User
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections as db_connections, transaction
+from django.db.models import F
+from django.template import Context, Template
+from django.http import Http404, HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from unittest import mock, skipUnless
+from django.urls import resolve, reverse
+
+from DjangoBlog.middleware import BlockViteRequestsMiddleware, ProfilingMiddleware
+from DjangoBlog.profiling import make_profile_token, observe_queries
+from DjangoBlog.routers import PRIMARY_COOKIE, PrimaryReplicaRouter, ReadYourWritesMiddleware, replica_reads
+from DjangoBlog.sqlite3 import PRODUCTION_PRAGMAS, production_database
+from DjangoBlog.static_serve import serve as serve_file
+
+from PIL import Image
+
+from .admin import CommentAdmin
+from .models import Post, Category, Comment, RelatedTerm, SearchDocument, Task, TagStats
+from .async_queries import gather_queries
+from .forms import PostForm
+from . import related
+from .management.commands.explain_queries import analyze_plan
+from . import comments, rendering, search, syndication, tasks
+from .counters import ViewCounter, view_counter
+from .sidebar import POPULAR_POSTS, POPULAR_TAGS, RECENT_COMMENTS, get_sidebar_context, invalidate_sidebar
+from .slugs import allocate_slug, allocate_slugs, slug_cache
+
+
+@override_settings(BLOG_PAGE_CACHE_ENABLED=False)
+class ListQueryBudgetTests(TestCase):
+    """列表页的查询数量不应随文章、标签、评论数量增长"""
+
+    # 每个视图允许的查询数（侧边栏缓存已预热）
+    BUDGETS = {
+        'post_list': 2,
+        'category_posts': 3,
+        'tag_posts': 3,
+        'search': 5,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', password='password')
+        cls.category = Category.objects.create(name='技术', slug='tech')
+
+    def setUp(self):
+        cache.clear()
+
+    def create_posts(self, count, tags_per_post, comments_per_post):
+        for i in range(count):
+            post = Post.objects.create(
+                title=f'测试文章 {count}-{i}',
+                slug=f'post-{count}-{i}',
+                author=self.author,
+                category=self.category,
+                content='文章内容' * 20,
+                status='published',
+            )
+            post.tags.add('common', *[f'tag-{j}' for j in range(tags_per_post)])
+            for _ in range(comments_per_post):
+                Comment.objects.create(post=post, author=self.author, content='评论')
+
+    def assert_budget(self, name, url):
+        # 第一次请求预热侧边栏缓存
+        self.client.get(url)
+        with self.assertNumQueries(self.BUDGETS[name]):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def urls(self):
+        return {
+            'post_list': reverse('blog:post_list'),
+            'category_posts': reverse('blog:category_posts', args=[self.category.slug]),
+            'tag_posts': reverse('blog:tag_posts', args=['common']),
+            'search': reverse('blog:post_list') + '?q=测试文章',
+        }
+
+    def test_budget_with_few_posts(self):
+        self.create_posts(2, tags_per_post=1, comments_per_post=1)
+        for name, url in self.urls().items():
+            with self.subTest(view=name):
+                self.assert_budget(name, url)
+
+    def test_budget_with_full_pages(self):
+        self.create_posts(25, tags_per_post=5, comments_per_post=3)
+        for name, url in self.urls().items():
+            with self.subTest(view=name):
+                self.assert_budget(name, url)
+
+    def test_comment_count_is_stored(self):
+        self.create_posts(1, tags_per_post=1, comments_per_post=3)
+        response = self.assert_budget('post_list', reverse('blog:post_list'))
+        self.assertEqual(response.context['page_obj'][0].comment_count, 3)
+
+
+@override_settings(BLOG_KEYSET_PAGINATION=True, BLOG_PAGE_CACHE_ENABLED=False)
+class KeysetPaginationTests(ListQueryBudgetTests):
+    """开启游标分页后，查询预算同样成立，且翻页结果完整、有序"""
+
+    def walk(self, url):
+        titles, cursor, pages = [], None, 0
+        while True:
+            response = self.client.get(url, {'cursor': cursor} if cursor else {})
+            page_obj = response.context['page_obj']
+            titles.extend(post.title for post in page_obj)
+            pages += 1
+            cursor = page_obj.next_cursor
+            if not cursor:
+                return titles, page_obj, pages
+
+    def test_walk_forward_and_back(self):
+        self.create_posts(25, tags_per_post=1, comments_per_post=0)
+        expected = list(
+            Post.objects.order_by('-created_at', '-pk').values_list('title', flat=True)
+        )
+        titles, last_page, pages = self.walk(reverse('blog:post_list'))
+        self.assertEqual(titles, expected)
+        self.assertEqual(pages, 3)
+
+        response = self.client.get(reverse('blog:post_list'), {'cursor': last_page.previous_cursor})
+        previous = [post.title for post in response.context['page_obj']]
+        self.assertEqual(previous, expected[9:18])
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        self.create_posts(3, tags_per_post=1, comments_per_post=0)
+        response = self.client.get(reverse('blog:post_list'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context['page_obj'].has_previous())
+
+
+@override_settings(BLOG_PAGE_CACHE_ENABLED=False)
+class SidebarCacheTests(TestCase):
+    """侧边栏各区块单独缓存，信号只失效受影响的区块"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', password='password')
+        cls.post = Post.objects.create(
+            title='侧边栏测试', slug='sidebar', author=cls.author, content='文章内容' * 20, status='published',
+        )
+        cls.post.tags.add('django')
+        Comment.objects.create(post=cls.post, author=cls.author, content='第一条评论')
+
+    def setUp(self):
+        cache.clear()
+        get_sidebar_context()
+
+    def test_second_render_issues_no_queries(self):
+        with self.assertNumQueries(0):
+            get_sidebar_context()
+
+    def test_new_comment_reloads_only_recent_comments(self):
+        comment = Comment.objects.create(post=self.post, author=self.author, content='新评论')
+        with self.assertNumQueries(1):
+            sidebar = get_sidebar_context()
+        self.assertEqual(sidebar[RECENT_COMMENTS][0], comment)
+
+    def test_tag_change_reloads_only_popular_tags(self):
+        tag = self.post.tags.get()
+        tag.name = 'Django框架'
+        tag.save()
+        with self.assertNumQueries(1):
+            sidebar = get_sidebar_context()
+        self.assertEqual([t.name for t in sidebar[POPULAR_TAGS]], ['Django框架'])
+
+    def test_draft_save_keeps_sidebar(self):
+        draft = Post.objects.create(title='草稿', slug='draft', author=self.author, content='草稿内容')
+        draft.title = '草稿修改'
+        draft.save()
+        with self.assertNumQueries(0):
+            get_sidebar_context()
+
+    def test_unpublish_reloads_popular_sections(self):
+        self.post.status = 'draft'
+        self.post.save()
+        sidebar = get_sidebar_context()
+        self.assertEqual(list(sidebar[POPULAR_POSTS]), [])
+        self.post.title = '草稿修改'
+        self.post.save()
+        with self.assertNumQueries(0):
+            get_sidebar_context()
+
+    @override_settings(BLOG_PAGE_CACHE_ENABLED=True)
+    def test_sidebar_change_purges_cached_pages(self):
+        url = reverse('blog:post_list')
+        self.client.get(url)
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'HIT')
+        Category.objects.create(name='新分类', slug='new')
+        response = self.client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'MISS')
+        self.assertContains(response, '新分类')
+
+
+class ViewCounterTests(TestCase):
+    """浏览量在内存中缓冲，批量用 F() 增量写回"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', password='password')
+        cls.post = Post.objects.create(
+            title='浏览量测试', slug='views', author=cls.author, content='文章内容' * 20, status='published',
+        )
+
+    def setUp(self):
+        self.counter = ViewCounter()
+        self.addCleanup(self.counter.shutdown)
+
+    def views(self):
+        return Post.objects.values_list('views', flat=True).get(pk=self.post.pk)
+
+    @override_settings(BLOG_VIEW_COUNT_FLUSH_INTERVAL=3600)
+    def test_views_are_buffered_until_flush(self):
+        with self.assertNumQueries(0):
+            for _ in range(3):
+                self.counter.incr(self.post.pk)
+        self.assertEqual(self.counter.pending(self.post.pk), 3)
+        self.assertEqual(self.views(), 0)
+
+        # 缓冲期间其他进程写回的浏览量不会被覆盖
+        Post.objects.filter(pk=self.post.pk).update(views=10)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.counter.flush(), 3)
+        updates = [q['sql'] for q in queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"views" = ("blog_post"."views" + 3)', updates[0])
+        self.assertEqual(self.views(), 13)
+        self.assertEqual(self.counter.pending(self.post.pk), 0)
+
+    @override_settings(BLOG_VIEW_COUNT_FLUSH_INTERVAL=0)
+    def test_zero_interval_writes_immediately(self):
+        self.counter.incr(self.post.pk)
+        self.assertEqual(self.views(), 1)
+        self.assertEqual(self.counter.pending(self.post.pk), 0)
+
+    @override_settings(BLOG_VIEW_COUNT_FLUSH_INTERVAL=3600)
+    def test_shutdown_flushes_remaining_views(self):
+        self.counter.incr(self.post.pk, 2)
+        self.counter.shutdown()
+        self.assertFalse(self.counter._flusher.is_alive())
+        self.assertEqual(self.views(), 2)
+
+
+@override_settings(BLOG_VIEW_COUNT_FLUSH_INTERVAL=0)
+class PageCacheTests(TestCase):
+    """匿名用户整页缓存及代理键失效"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', password='password')
+        cls.category = Category.objects.create(name='技术', slug='tech')
+        cls.post = Post.objects.create(
+            title='缓存测试文章', slug='cached-post', author=cls.author,
+            category=cls.category, content='文章内容' * 20, status='published',
+        )
+        cls.other = Post.objects.create(
+            title='另一篇文章', slug='other-post', author=cls.author,
+            category=Category.objects.create(name='生活', slug='life'),
+            content='文章内容' * 20, status='published',
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_second_anonymous_request_is_a_hit(self):
+        url = reverse('blog:post_list')
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            response = self.client.get(url, {'utm_source': 'feed'})
+        self.assertEqual(response['X-Page-Cache'], 'HIT')
+
+    def test_authenticated_requests_bypass_cache(self):
+        self.client.force_login(self.author)
+        response = self.client.get(reverse('blog:post_list'))
+        self.assertNotIn('X-Page-Cache', response)
+
+    def test_comment_purges_only_its_post(self):
+        url = self.post.get_absolute_url()
+        other_url = self.other.get_absolute_url()
+        self.client.get(url)
+        self.client.get(other_url)
+        Comment.objects.create(post=self.post, author=self.author, content='新评论')
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'MISS')
+        self.assertEqual(self.client.get(other_url)['X-Page-Cache'], 'HIT')
+
+    def test_views_are_counted_on_hits(self):
+        url = self.post.get_absolute_url()
+        for _ in range(3):
+            self.client.get(url)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views, 3)
+
+    def test_admin_approval_purges_post_and_counts_filtered_rows(self):
+        Comment.objects.create(post=self.post, author=self.author, content='待审核', is_approved=False)
+        url = self.post.get_absolute_url()
+        self.client.get(url)
+        model_admin = CommentAdmin(Comment, admin_site)
+        with mock.patch.object(model_admin, 'message_user') as message_user:
+            model_admin.approve_comments(None, Comment.objects.filter(is_approved=False))
+        message_user.assert_called_once_with(None, '已批准 1 条评论')
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'MISS')
+
+
+@override_settings(BLOG_PAGE_CACHE_ENABLED=False, BLOG_VIEW_COUNT_FLUSH_INTERVAL=0)
+class SlugResolutionTests(TestCase):
+    """slug规范化、唯一性与旧slug重定向"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', password='password')
+        cls.post = Post.objects.create(
+            title='中文标题测试', slug=' 中文%20标题 ', author=cls.author,
+            content='文章内容' * 20, status='published',
+        )
+
+    def setUp(self):
+        slug_cache.clear()
+
+    def test_slug_is_normalized_on_save(self):
+        self.assertEqual(self.post.slug, '中文 标题')
+
+    def test_draft_is_only_visible_to_its_author(self):
+        draft = Post.objects.create(
+            title='草稿文章测试', slug='draft', author=self.author, content='文章内容' * 20,
+        )
+        self.assertEqual(self.client.get(draft.get_absolute_url()).status_code, 404)
+        self.client.force_login(self.author)
+        self.assertEqual(self.client.get(draft.get_absolute_url()).status_code, 200)
+
+    def test_old_slug_redirects_to_new_one(self):
+        old_url = self.post.get_absolute_url()
+        self.post.slug = 'new-slug'
+        self.post.save()
+        response = self.client.get(old_url)
+        self.assertRedirects(response, self.post.get_absolute_url(), status_code=301)
+
+
+class SlugAllocationTests(TestCase):
+    """slug冲突时确定性地分配数字后缀"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', password='password')
+
+    def create(self, slug):
+        return Post.objects.create(title='同名文章标题', slug=slug, author=self.author, content='文章内容' * 20)
+
+    def test_collisions_get_increasing_suffixes(self):
+        slugs = [self.create('same').slug for _ in range(4)]
+        self.assertEqual(slugs, ['same', 'same-2', 'same-3', 'same-4'])
+
+    def test_allocation_is_a_single_query(self):
+        self.create('same')
+        with self.assertNumQueries(1):
+            self.assertEqual(allocate_slug('same'), 'same-2')
+
+    def test_unchanged_slug_skips_allocation(self):
+        post = self.create('same')
+        post.title = '修改后的标题'
+        post.save()
+        self.assertEqual(post.slug, 'same')
+
+    def test_batch_allocation(self):
+        self.create('batch')
+        posts = [Post(title='批量导入文章', slug='batch', author=self.author, content='内容') for _ in range(3)]
+        Post.objects.bulk_create(allocate_slugs(posts))
+        self.assertEqual(
+            sorted(Post.objects.values_list('slug', flat=True)),
+            ['batch', 'batch-2', 'batch-3', 'batch-4'],
+        )
+
+    def test_form_accepts_duplicate_slug(self):
+        self.create('same')
+        form = PostForm(data={
+            'title': '另一篇同名文章', 'slug': 'same', 'content': '文章内容' * 5, 'status': 'draft',
+        })
+        self.assertTrue(form.is_valid(), form.errors)
+
+
+class SearchTests(TestCase):
+    """倒排索引全文检索：分词、排序、索引更新和摘要高亮"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', password='password')
+        cls.title_hit = cls.create('数据库索引设计', '索引的选择' * 5)
+        cls.body_hit = cls.create('性能调优笔记', '缓存和连接池，顺带提到数据库' + '其他内容' * 10)
+        cls.latin = cls.create('Django ORM', 'Using select_related with Django.')
+
+    @classmethod
+    def create(cls, title, content):
+        return Post.objects.create(title=title, slug=title, author=cls.author, content=content, status='published')
+
+    def ids(self, query):
+        return [post_id for post_id, score in search.search(query)]
+
+    def test_tokenize_cjk_bigrams_and_latin_words(self):
+        self.assertEqual(search.tokenize('Django ORM, django!'), ['django', 'orm', 'django'])
+        self.assertEqual(search.tokenize('数据库'), ['数据', '据库'])
+        self.assertEqual(search.tokenize('库'), ['库'])
+        self.assertEqual(search.index_tokenize('数据库'), ['数据', '据库', '数', '据', '库'])
+
+    def test_single_cjk_character_matches(self):
+        self.assertEqual(set(self.ids('库')), {self.title_hit.pk, self.body_hit.pk})
+
+    def test_latin_query_is_case_insensitive(self):
+        self.assertEqual(self.ids('DJANGO'), [self.latin.pk])
+
+    def test_title_match_ranks_first(self):
+        self.assertEqual(self.ids('数据库'), [self.title_hit.pk, self.body_hit.pk])
+
+    def test_index_follows_save_and_delete(self):
+        self.latin.content = '改为讨论异步视图'
+        self.latin.save()
+        self.assertEqual(self.ids('异步'), [self.latin.pk])
+        self.assertEqual(self.ids('select_related'), [])
+        self.latin.delete()
+        self.assertEqual(self.ids('异步'), [])
+
+    def test_snippet_is_escaped_once(self):
+        snippet = search.highlight('1 < 2 & 3', '无关')
+        self.assertEqual(Template('{{ snippet }}').render(Context({'snippet': snippet})), '1 &lt; 2 &amp; 3')
+        self.assertEqual(search.highlight('1 < 2 & 数据库', '库'), '1 &lt; 2 &amp; 数据<mark>库</mark>')
+
+
+class RelatedPostsTests(TestCase):
+    """预计算的相关文章推荐"""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('author', password='password')
+
+        def create(title, content, tags):
+            post = Post.objects.create(
+                title=title, slug=title, author=author, content=content, status='published',
+            )
+            post.tags.add(*tags)
+            return post
+
+        cls.django = create('Django查询优化', 'Django ORM 的 select_related 和索引优化' * 5, ['django', 'orm'])
+        cls.orm = create('Django ORM技巧', 'Django ORM 的 prefetch_related 和查询优化' * 5, ['django', 'orm'])
+        cls.cooking = create('红烧肉做法', '五花肉切块，冰糖炒色，小火慢炖' * 5, ['美食'])
+        related.rebuild_all()
+
+    def test_most_similar_post_ranks_first(self):
+        self.assertEqual(self.django.get_related_posts()[0], self.orm)
+
+    def test_detail_reads_related_posts_in_one_query(self):
+        with self.assertNumQueries(1):
+            self.django.get_related_posts()
+
+    def test_incremental_update_merges_new_post(self):
+        post = Post.objects.create(
+            title='Django索引', slug='Django索引', author=self.django.author,
+            content='Django ORM 的复合索引和查询优化' * 5, status='published',
+        )
+        post.tags.add('django')
+        related.update_post(post)
+        self.assertIn(post, self.django.get_related_posts())
+        self.assertIn(self.django, post.get_related_posts())
+
+    def test_incremental_update_does_not_load_corpus(self):
+        self.django.content += '复合索引'
+        with CaptureQueriesContext(connection) as queries:
+            related.update_post(self.django)
+        self.assertFalse([q['sql'] for q in queries if '"blog_post"."content"' in q['sql']])
+        self.assertTrue(RelatedTerm.objects.filter(post=self.django, term='复合').exists())
+        self.assertEqual(self.django.get_related_posts()[0], self.orm)
+
+    def test_unpublished_post_is_removed(self):
+        self.orm.status = 'draft'
+        self.orm.save()
+        related.update_post(self.orm)
+        self.assertNotIn(self.orm, self.django.get_related_posts())
+
+
+class QueryIndexTests(TestCase):
+    """关键查询都应命中索引"""
+
+    def test_key_queries_use_indexes(self):
+        out = StringIO()
+        call_command('explain_queries', seed=200, fail_on_scan=True, stdout=out)
+        self.assertIn('所有关键查询均命中索引', out.getvalue())
+        self.assertFalse(Post.objects.exists())
+
+    def test_full_scan_is_detected(self):
+        self.assertEqual(analyze_plan('2 0 0 SCAN blog_post'), ({'blog_post'}, False))
+        self.assertEqual(analyze_plan('2 0 0 SCAN blog_post USING INDEX post_published_created_idx'), (set(), False))
+        # SQLite 3.36 之前的写法
+        self.assertEqual(analyze_plan('2 0 0 SCAN TABLE blog_post'), ({'blog_post'}, False))
+        self.assertEqual(analyze_plan('2 0 0 SCAN TABLE blog_post USING INDEX post_published_created_idx'), (set(), False))
+        plan = '4 0 0 SEARCH blog_comment USING INDEX blog_comment_thread_id (thread_id=?)\n27 0 0 USE TEMP B-TREE FOR ORDER BY'
+        self.assertEqual(analyze_plan(plan), (set(), True))
+
+
+@override_settings(BLOG_VIEW_COUNT_FLUSH_INTERVAL=0)
+class SeedAndBenchTests(TestCase):
+    """测试数据生成和视图基准测试命令"""
+
+    def seed(self, prefix):
+        call_command('seed_blog', users=3, posts=15, tags=5, categories=2, comments=3, prefix=prefix, stdout=StringIO())
+        return list(Post.objects.filter(author__username__startswith=prefix).order_by('pk').values_list('title', flat=True))
+
+    def test_seed_is_reproducible(self):
+        self.assertEqual(self.seed('first'), self.seed('second'))
+        self.assertTrue(Comment.objects.filter(parent__isnull=False).exists())
+
+    def test_bench_covers_every_route(self):
+        self.seed('bench')
+        out = StringIO()
+        call_command('bench_views', iterations=1, warmup=0, json=True, stdout=out)
+        results = {route['name']: route for route in json.loads(out.getvalue())['routes']}
+        self.assertIn('blog:post_detail', results)
+        self.assertIn('accounts:profile', results)
+        for result in results.values():
+            self.assertTrue(all(status < 500 for status in result['status']), result)
+
+
+@override_settings(BLOG_PAGE_CACHE_ENABLED=False, PROFILING_SAMPLE_RATE=1.0)
+class ProfilingMiddlewareTests(TestCase):
+    """请求性能分析中间件"""
+
+    def test_server_timing_breakdown(self):
+        response = self.client.get(reverse('blog:post_list'))
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'^db;dur=[\d.]+;desc="[1-9]\d* queries", tpl;dur=[\d.]+, view;dur=[\d.]+, total;dur=[\d.]+$')
+
+    @override_settings(PROFILING_SAMPLE_RATE=0)
+    def test_unsampled_request_has_no_header(self):
+        response = self.client.get(reverse('blog:post_list'))
+        self.assertNotIn('Server-Timing', response)
+
+    @override_settings(PROFILING_SAMPLE_RATE=0)
+    def test_signed_header_dumps_profile(self):
+        with tempfile.TemporaryDirectory() as directory, self.settings(PROFILING_DUMP_DIR=directory):
+            response = self.client.get(reverse('blog:post_list'), HTTP_X_PROFILE=make_profile_token())
+            self.assertIn('Server-Timing', response)
+            self.assertTrue(os.path.exists(os.path.join(directory, response['X-Profile-Dump'])))
+
+            response = self.client.get(reverse('blog:post_list'), HTTP_X_PROFILE='forged')
+            self.assertNotIn('X-Profile-Dump', response)
+
+
+@override_settings(BLOG_VIEW_COUNT_FLUSH_INTERVAL=60)
+class ConditionalGetTests(TestCase):
+    """ETag / Last-Modified 条件请求"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', password='password')
+        cls.post = Post.objects.create(
+            title='条件请求', slug='conditional', author=cls.author, content='文章内容' * 20, status='published',
+        )
+
+    def setUp(self):
+        cache.clear()
+        view_counter.flush()
+        self.url = self.post.get_absolute_url()
+
+    def tearDown(self):
+        # 在测试数据库销毁前写回缓冲的浏览量
+        view_counter.flush()
+
+    def test_unchanged_post_returns_304_and_counts_view(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(view_counter.pending(self.post.pk), 2)
+
+    def test_post_has_no_last_modified(self):
+        # 代理键令牌无法表示为时间，只用 ETag 校验
+        self.assertNotIn('Last-Modified', self.client.get(self.url))
+
+    def test_sidebar_change_keeps_post_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        Category.objects.create(name='新分类', slug='new')
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_category_rename_changes_post_etag(self):
+        category = Category.objects.create(name='分类', slug='category')
+        Post.objects.filter(pk=self.post.pk).update(category=category)
+        etag = self.client.get(self.url)['ETag']
+        category.name = '新名称'
+        category.save()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_new_comment_changes_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        Comment.objects.create(post=self.post, author=self.author, content='新评论')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_list_generation(self):
+        url = reverse('blog:post_list')
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(url + '?page=2', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        self.post.title = '修改后的标题'
+        self.post.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_logged_in_users_get_full_page(self):
+        self.client.force_login(self.author)
+        response = self.client.get(self.url)
+        self.assertNotIn('ETag', response)
+
+
+@override_settings(BLOG_PAGE_CACHE_ENABLED=False, BLOG_VIEW_COUNT_FLUSH_INTERVAL=0)
+class CommentTreeTests(TestCase):
+    """评论树：物化路径、单次查询加载和分页"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', password='password')
+        cls.post = Post.objects.create(
+            title='评论树', slug='comment-tree', author=cls.author, content='文章内容' * 20, status='published',
+        )
+        cls.roots = [cls.comment(f'顶层评论{i}') for i in range(3)]
+        cls.reply = cls.comment('回复', parent=cls.roots[0])
+        cls.nested = cls.comment('回复的回复', parent=cls.reply)
+
+    @classmethod
+    def comment(cls, content, parent=None, **kwargs):
+        return Comment.objects.create(post=cls.post, author=cls.author, content=content, parent=parent, **kwargs)
+
+    def test_tree_fields(self):
+        self.nested.refresh_from_db()
+        self.assertEqual(self.nested.depth, 2)
+        self.assertEqual(self.nested.thread_id, self.roots[0].pk)
+        self.assertEqual(self.nested.path, '/'.join(comments.path_segment(c.pk) for c in (self.roots[0], self.reply, self.nested)))
+
+    def test_page_loads_threads_with_authors_in_two_queries(self):
+        with self.assertNumQueries(2):
+            page = comments.thread_page(self.post, 1, per_page=2)
+            first = page.object_list[0]
+            self.assertEqual(first.children[0].children[0].author.username, 'author')
+        self.assertEqual([c.pk for c in page.object_list], [c.pk for c in self.roots[:2]])
+        self.assertEqual(page.paginator.num_pages, 2)
+        self.assertEqual(page.paginator.comment_total, 5)
+
+    def test_unapproved_subtree_is_hidden(self):
+        hidden = self.comment('待审核', parent=self.roots[1], is_approved=False)
+        self.comment('待审核评论的回复', parent=hidden)
+        thread = comments.load_thread(self.roots[1].pk)
+        self.assertEqual(thread.children, [])
+
+    def test_reply_depth_is_limited(self):
+        parent = self.roots[2]
+        for _ in range(comments.MAX_DEPTH + 2):
+            parent = self.comment('深层回复', parent=parent)
+        self.assertEqual(parent.depth, comments.MAX_DEPTH - 1)
+
+    def test_detail_renders_nested_replies(self):
+        response = self.client.get(self.post.get_absolute_url())
+        self.assertContains(response, 'comment-replies')
+        self.assertContains(response, '回复的回复')
+
+    def test_post_reply(self):
+        self.client.force_login(self.author)
+        response = self.client.post(self.post.get_absolute_url(), {'content': '新的回复', 'parent': self.reply.pk})
+        reply = Comment.objects.get(content='新的回复')
+        self.assertEqual(reply.thread_id, self.roots[0].pk)
+        self.assertRedirects(response, f'{self.post.get_absolute_url()}?thread={self.roots[0].pk}#comment-{reply.pk}')
+
+
+class DenormalizedCountTests(TestCase):
+    """冗余计数列由信号维护，recount 修复偏差"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', password='password')
+        cls.python = Category.objects.create(name='Python', slug='python')
+        cls.django = Category.objects.create(name='Django', slug='django')
+
+    def create_post(self, **kwargs):
+        defaults = {'title': '计数', 'slug': 'count', 'author': self.author, 'content': '内容', 'status': 'published'}
+        return Post.objects.create(**{**defaults, **kwargs})
+
+    def assertCounts(self, python, django):
+        self.python.refresh_from_db()
+        self.django.refresh_from_db()
+        self.assertEqual((self.python.post_count, self.django.post_count), (python, django))
+
+    def test_category_counts_follow_status_and_category(self):
+        post = self.create_post(category=self.python)
+        self.create_post(category=self.python, status='draft')
+        self.assertCounts(1, 0)
+
+        post.category = self.django
+        post.save()
+        self.assertCounts(0, 1)
+
+        post.status = 'draft'
+        post.save()
+        self.assertCounts(0, 0)
+
+        post.status = 'published'
+        post.save()
+        post.delete()
+        self.assertCounts(0, 0)
+
+    def test_comment_count_tracks_approved_comments(self):
+        post = self.create_post()
+        comment = Comment.objects.create(post=post, author=self.author, content='评论')
+        Comment.objects.create(post=post, author=self.author, content='待审核', is_approved=False)
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+
+        comment.is_approved = False
+        comment.save()
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 0)
+
+        comment.is_approved = True
+        comment.save()
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 0)
+
+    def test_recount_repairs_drift(self):
+        post = self.create_post(category=self.python)
+        Comment.objects.create(post=post, author=self.author, content='评论')
+        Post.objects.update(comment_count=7)
+        Category.objects.update(post_count=3)
+
+        out = StringIO()
+        call_command('recount', stdout=out)
+        self.assertIn('已修复 1 篇文章的评论数、2 个分类的文章数、0 个标签的文章数', out.getvalue())
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+        self.assertCounts(1, 0)
+
+
+class TagStatsTests(TestCase):
+    """TagStats 随标签增删和文章状态增量更新，热门标签直接按计数排序"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', password='password')
+
+    def create_post(self, title, tags, status='published'):
+        post = Post.objects.create(title=title, slug=title, author=self.author, content='内容', status=status)
+        post.tags.set(tags)
+        return post
+
+    def counts(self):
+        return dict(TagStats.objects.values_list('tag__name', 'post_count'))
+
+    def test_counts_follow_tags_and_status(self):
+        post = self.create_post('one', ['python', 'django'])
+        self.create_post('two', ['python'])
+        self.create_post('draft', ['python', 'go'], status='draft')
+        self.assertEqual(self.counts(), {'python': 2, 'django': 1})
+
+        post.tags.set(['python', 'go'])
+        self.assertEqual(self.counts(), {'python': 2, 'django': 0, 'go': 1})
+
+        post.status = 'draft'
+        post.save()
+        self.assertEqual(self.counts(), {'python': 1, 'django': 0, 'go': 0})
+
+        post.status = 'published'
+        post.save()
+        post.delete()
+        self.assertEqual(self.counts(), {'python': 1, 'django': 0, 'go': 0})
+
+        self.create_post('three', ['go'])
+        Post.objects.filter(slug='three').delete()
+        self.assertEqual(self.counts(), {'python': 1, 'django': 0, 'go': 0})
+
+    def test_popular_tags_read_stats(self):
+        self.create_post('one', ['python', 'django'])
+        self.create_post('two', ['python'])
+        self.create_post('draft', ['go'], status='draft')
+        invalidate_sidebar()
+        with self.assertNumQueries(1):
+            tags = list(TagStats.objects.filter(post_count__gt=0).select_related('tag').order_by('-post_count', 'tag'))
+        popular = get_sidebar_context()['popular_tags']
+        self.assertEqual([tag.name for tag in popular], [stat.tag.name for stat in tags])
+        self.assertEqual([(tag.name, tag.post_count) for tag in popular], [('python', 2), ('django', 1)])
+
+    def test_recount_repairs_tag_drift(self):
+        self.create_post('one', ['python'])
+        TagStats.objects.all().delete()
+        out = StringIO()
+        call_command('recount', stdout=out)
+        self.assertIn('1 个标签的文章数', out.getvalue())
+        self.assertEqual(self.counts(), {'python': 1})
+
+
+class ImageVariantTests(TestCase):
+    """特色图片由后台任务生成各尺寸（测试中立即执行），模板输出 srcset"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', password='password')
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.enterContext(override_settings(MEDIA_ROOT=self.media_root))
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+
+    def upload(self, size=(2000, 1000), mode='RGBA'):
+        buffer = BytesIO()
+        Image.new(mode, size, (200, 80, 40, 255)).save(buffer, 'PNG')
+        return SimpleUploadedFile('cover.png', buffer.getvalue(), content_type='image/png')
+
+    def create_post(self, **kwargs):
+        return Post.objects.create(
+            title='图片', slug='image', author=self.author, content='内容', status='published', **kwargs
+        )
+
+    def test_variants_generated_after_upload(self):
+        post = self.create_post(featured_image=self.upload())
+        post.refresh_from_db()
+        variants = post.image_variants['variants']
+        self.assertEqual(post.image_variants['source'], post.featured_image.name)
+        self.assertEqual([variants[name]['width'] for name in ('thumbnail', 'card', 'hero')], [160, 640, 1280])
+        self.assertEqual(variants['card']['height'], 320)
+        self.assertRegex(variants['card']['webp'], r'^posts/variants/[0-9a-f]{20}\.webp$')
+        with Image.open(os.path.join(self.media_root, variants['hero']['jpeg'])) as image:
+            self.assertEqual((image.format, image.size), ('JPEG', (1280, 640)))
+
+        html = Template("{% load blog_images %}{% srcset post 'card' class='card-img-top' %}").render(
+            Context({'post': post})
+        )
+        self.assertIn('<source type="image/webp" srcset="/media/posts/variants/', html)
+        self.assertIn(' 640w, ', html)
+        self.assertIn('class="card-img-top"', html)
+        self.assertIn('loading="lazy"', html)
+
+    def test_small_image_is_not_upscaled(self):
+        post = self.create_post(featured_image=self.upload(size=(300, 100), mode='RGB'))
+        post.refresh_from_db()
+        variants = post.image_variants['variants']
+        self.assertEqual(variants['card']['width'], 300)
+        self.assertEqual(variants['card']['jpeg'], variants['hero']['jpeg'])
+
+    def test_changed_image_drops_stale_variants(self):
+        post = self.create_post(featured_image=self.upload())
+        post.refresh_from_db()
+        post.featured_image = self.upload(size=(800, 800))
+        post.save()
+        self.assertEqual(post.image_variants, {})
+        html = Template("{% load blog_images %}{% srcset post 'card' %}").render(Context({'post': post}))
+        self.assertIn(f'src="{post.featured_image.url}"', html)
+
+    def test_backfill_command(self):
+        post = self.create_post(featured_image=self.upload())
+        Post.objects.filter(pk=post.pk).update(image_variants={})
+        out = StringIO()
+        call_command('generate_image_variants', '--missing', stdout=out)
+        self.assertIn('已为 1 篇文章生成图片尺寸，0 篇失败', out.getvalue())
+        post.refresh_from_db()
+        self.assertEqual(set(post.image_variants['variants']), {'thumbnail', 'card', 'hero'})
+
+
+FLAKY_CALLS = []
+
+
+@tasks.task('tests.flaky', max_attempts=2)
+def flaky_task(value):
+    FLAKY_CALLS.append(value)
+    raise ValueError('boom')
+
+
+@override_settings(BLOG_TASK_MODE='worker', BLOG_TASK_RETRY_DELAY=5)
+class TaskQueueTests(TestCase):
+    """保存文章只写入任务表，由 run_tasks 执行；去重、重试和超时回收"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', password='password')
+
+    def test_create_post_defers_indexing_to_worker(self):
+        self.client.force_login(self.author)
+        response = self.client.post(reverse('blog:create_post'), {
+            'title': '后台任务队列', 'slug': 'task-queue', 'content': '保存文章后由后台任务建立检索索引', 'status': 'published',
+        })
+        self.assertEqual(response.status_code, 302)
+        post = Post.objects.get(slug='task-queue')
+        self.assertEqual(
+            set(Task.objects.values_list('name', 'key')),
+            {('blog.index_post', f'index_post:{post.pk}'), ('blog.update_related', f'related:{post.pk}')},
+        )
+        self.assertFalse(SearchDocument.objects.filter(post=post).exists())
+
+        out = StringIO()
+        call_command('run_tasks', '--once', '--workers', '1', stdout=out)
+        self.assertIn('共处理 2 个任务', out.getvalue())
+        self.assertFalse(Task.objects.exists())
+        self.assertTrue(SearchDocument.objects.filter(post=post).exists())
+
+    def test_pending_tasks_are_deduplicated(self):
+        post = Post.objects.create(title='去重', slug='dedupe', author=self.author, content='内容')
+        post.content = '新内容'
+        post.save()
+        self.assertEqual(Task.objects.filter(name='blog.index_post').count(), 1)
+
+        Task.objects.update(status='running')
+        post.save()
+        self.assertEqual(Task.objects.filter(name='blog.index_post', status='pending').count(), 1)
+
+    def test_thread_mode_submits_after_commit(self):
+        with override_settings(BLOG_TASK_MODE='thread'):
+            with self.captureOnCommitCallbacks() as callbacks:
+                task = flaky_task.delay(1)
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(task.status, 'pending')
+
+    def test_retry_then_fail(self):
+        FLAKY_CALLS.clear()
+        task = flaky_task.delay(7)
+        with self.assertLogs('blog.tasks', 'ERROR'):
+            self.assertEqual(tasks.run_task(task.pk), 5)
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts), ('pending', 1))
+        self.assertIn('ValueError: boom', task.last_error)
+
+        # 退避时间未到，不会再次执行
+        self.assertIsNone(tasks.run_task(task.pk))
+        self.assertEqual(FLAKY_CALLS, [7])
+
+        Task.objects.update(run_after=task.created_at)
+        with self.assertLogs('blog.tasks', 'ERROR'):
+            self.assertIsNone(tasks.run_task(task.pk))
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts), ('failed', 2))
+        self.assertEqual(FLAKY_CALLS, [7, 7])
+
+    def test_duplicate_delay_reschedules_pending_task(self):
+        task = flaky_task.delay(1, key='flaky', countdown=600)
+        again = flaky_task.delay(2, key='flaky')
+        self.assertEqual(again.pk, task.pk)
+        task.refresh_from_db()
+        self.assertEqual(task.args, [2])
+        self.assertEqual(tasks.due_tasks(), [task.pk])
+
+    def test_thread_mode_recovers_leftover_pending_task(self):
+        # 事务回滚或进程重启后遗留的任务：没有执行者会再提交它
+        post = Post.objects.create(title='遗留任务', slug='leftover', author=self.author, content='内容', status='published')
+        leftover = Task.objects.get(key=f'index_post:{post.pk}')
+
+        class InlinePool:
+            def submit(self, func, *args):
+                func(*args)
+
+        executor = tasks.ThreadExecutor()
+        with override_settings(BLOG_TASK_MODE='thread'), mock.patch.object(tasks, 'executor', executor), \
+                mock.patch.object(executor, '_get_pool', return_value=InlinePool()), \
+                mock.patch.object(tasks, 'connection'), self.captureOnCommitCallbacks(execute=True):
+            queued = tasks.index_post.delay(post.pk, key=f'index_post:{post.pk}')
+        self.assertEqual(queued.pk, leftover.pk)
+        self.assertTrue(SearchDocument.objects.filter(post=post).exists())
+        # 首次提交时的回收同时执行了其他遗留任务
+        self.assertFalse(Task.objects.exists())
+
+    def test_stale_running_task_is_requeued(self):
+        task = flaky_task.delay(1)
+        Task.objects.update(status='running', locked_at=task.created_at - timedelta(hours=1))
+        self.assertEqual(tasks.requeue_stale(), 1)
+        self.assertEqual(tasks.due_tasks(), [task.pk])
+
+
+@override_settings(BLOG_PAGE_CACHE_ENABLED=False, BLOG_VIEW_COUNT_FLUSH_INTERVAL=0)
+class ContentRenderingTests(TestCase):
+    """正文在保存时清洗并预渲染，内容未变化时跳过"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', password='password')
+
+    def create_post(self, content, excerpt=''):
+        return Post.objects.create(
+            title='渲染', slug='render', author=self.author, content=content, excerpt=excerpt, status='published'
+        )
+
+    def test_sanitize_strips_scripts_and_unsafe_urls(self):
+        html, text = rendering.sanitize(
+            '<p onclick="steal()">正文<script>alert(1)</script>'
+            '<a href=" javascript:alert(1)">坏链接</a><a href="https://example.com">好链接</a>'
+            '<img src="data:text/html,x" alt="图"><b>未闭合</p>'
+        )
+        self.assertEqual(
+            html,
+            '<p>正文<a>坏链接</a><a href="https://example.com" rel="nofollow noopener">好链接</a>'
+            '<img alt="图"><b>未闭合</b></p>',
+        )
+        self.assertEqual(text, '正文坏链接好链接未闭合')
+
+    def test_rendered_on_save_with_cjk_word_count(self):
+        post = self.create_post('<h2>简介</h2><p>Django 是一个 Python 框架。</p>' + '<p>中文</p>' * 400)
+        self.assertEqual(post.content_html[:11], '<h2>简介</h2>')
+        self.assertTrue(post.excerpt_text.startswith('简介 Django 是一个 Python 框架。 中文'))
+        self.assertEqual(len(post.excerpt_text), rendering.EXCERPT_LENGTH)
+        # 2 + 3 + 2 个汉字 + 800 个汉字，2 个英文单词
+        self.assertEqual(post.word_count, 809)
+        self.assertEqual(post.reading_time, 3)
+
+        post.excerpt = '<em>作者的摘要</em>'
+        post.save()
+        post.refresh_from_db()
+        self.assertEqual(post.excerpt_text, '作者的摘要')
+
+    def test_unchanged_content_skips_rendering(self):
+        post = self.create_post('<p>内容</p>')
+        self.assertFalse(rendering.render_post(post))
+        Post.objects.filter(pk=post.pk).update(content_html='stale')
+        post.refresh_from_db()
+        post.title = '只改标题'
+        post.save()
+        post.refresh_from_db()
+        self.assertEqual(post.content_html, 'stale')
+
+    def test_render_content_command_upgrades_old_versions(self):
+        post = self.create_post('<p>内容</p>')
+        Post.objects.filter(pk=post.pk).update(content_html='', render_version=0)
+        out = StringIO()
+        call_command('render_content', stdout=out)
+        self.assertIn('已渲染 1 篇文章', out.getvalue())
+        post.refresh_from_db()
+        self.assertEqual((post.content_html, post.render_version), ('<p>内容</p>', rendering.RENDERER_VERSION))
+
+    def test_detail_page_outputs_sanitized_html(self):
+        post = self.create_post('<p>安全</p><script>alert(1)</script>')
+        response = self.client.get(post.get_absolute_url())
+        self.assertContains(response, '<p>安全</p>')
+        self.assertNotContains(response, 'alert(1)')
+
+    @skipUnless(importlib.util.find_spec('markdown'), '未安装 markdown')
+    @override_settings(BLOG_CONTENT_FORMAT='markdown')
+    def test_markdown_format(self):
+        post = self.create_post('# 标题\n\n**加粗** <script>x</script>')
+        self.assertIn('<h1>标题</h1>', post.content_html)
+        self.assertIn('<strong>加粗</strong>', post.content_html)
+        self.assertNotIn('<script>', post.content_html)
+
+
+@override_settings(BLOG_PAGE_CACHE_ENABLED=False, BLOG_VIEW_COUNT_FLUSH_INTERVAL=0)
+class FragmentCacheTests(TestCase):
+    """登录用户的页面复用文章卡片、分类标签和相关文章片段，数据变更时按代理键失效"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', password='password')
+        cls.category = Category.objects.create(name='技术', slug='tech')
+        cls.post = Post.objects.create(
+            title='片段缓存', slug='fragment', author=cls.author, category=cls.category,
+            content='<p>正文</p>', status='published',
+        )
+        cls.post.tags.add('django')
+        cls.other = Post.objects.create(
+            title='另一篇', slug='other', author=cls.author, category=cls.category,
+            content='<p>正文</p>', status='published',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.author)
+
+    def render(self, post, renders):
+        template = Template(
+            '{% load blog_cache %}{% cachefragment "test" post %}{{ renders.pop }}{% endcachefragment %}'
+        )
+        return template.render(Context({'post': post, 'renders': renders}))
+
+    def test_fragment_is_reused_until_purged_or_saved(self):
+        renders = ['第三次', '第二次', '第一次']
+        self.assertEqual(self.render(self.post, renders), '第一次')
+        self.assertEqual(self.render(self.post, renders), '第一次')
+
+        Comment.objects.create(post=self.post, author=self.author, content='评论')
+        self.assertEqual(self.render(self.post, renders), '第二次')
+
+        # 保存后 updated_at 变化，缓存键随之变化
+        post = Post.objects.get(pk=self.post.pk)
+        post.title = '新标题'
+        post.save()
+        self.assertEqual(self.render(post, renders), '第三次')
+
+    def test_authenticated_detail_reuses_related_posts(self):
+        url = self.post.get_absolute_url()
+        with CaptureQueriesContext(connection) as first:
+            self.client.get(url)
+        with CaptureQueriesContext(connection) as second:
+            response = self.client.get(url)
+        self.assertContains(response, self.other.title)
+        self.assertLess(len(second), len(first))
+
+    def test_tag_rename_updates_cached_cards(self):
+        url = reverse('blog:post_list')
+        self.assertContains(self.client.get(url), 'django')
+        tag = self.post.tags.get()
+        tag.name = 'Django框架'
+        tag.save()
+        self.assertContains(self.client.get(url), 'Django框架')
+
+    def test_view_count_is_rendered_outside_fragments(self):
+        urls = (
+            reverse('blog:post_list'),
+            reverse('blog:category_posts', args=[self.category.slug]),
+            reverse('blog:tag_posts', args=['django']),
+            self.post.get_absolute_url(),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.client.get(url)
+                # 浏览量写回不修改 updated_at，也不失效任何代理键
+                Post.objects.filter(pk=self.post.pk).update(views=F('views') + 1000)
+                expected = Post.objects.get(pk=self.post.pk).view_count
+                self.assertRegex(self.client.get(url).content.decode(), rf'fa-eye[^>]*></i>\s*{expected}\b')
+
+
+@override_settings(BLOG_PAGE_CACHE_ENABLED=False, BLOG_CONDITIONAL_GET=False, BLOG_VIEW_COUNT_FLUSH_INTERVAL=0)
+class AsyncViewTests(TestCase):
+    """列表页和详情页为异步视图，可以通过ASGI处理"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', password='password')
+        cls.category = Category.objects.create(name='技术', slug='tech')
+        cls.post = Post.objects.create(
+            title='异步视图', slug='async-view', author=cls.author, category=cls.category,
+            content='<p>正文</p>', status='published',
+        )
+        cls.post.tags.add('django')
+
+    def setUp(self):
+        cache.clear()
+
+    async def test_async_client_renders_listing_pages(self):
+        for url in (
+            reverse('blog:post_list'),
+            reverse('blog:category_posts', args=['tech']),
+            reverse('blog:tag_posts', args=['django']),
+        ):
+            with self.subTest(url=url):
+                response = await self.async_client.get(url)
+                self.assertContains(response, '异步视图')
+
+    def test_missing_category_is_404(self):
+        # 异步视图的异常在其他线程中转换为404响应，测试事务中的数据在那里不可见，这里用同步客户端
+        response = self.client.get(reverse('blog:category_posts', args=['missing']))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_async_detail_counts_views(self):
+        response = await self.async_client.get(self.post.get_absolute_url())
+        self.assertContains(response, '<p>正文</p>')
+        post = await Post.objects.aget(pk=self.post.pk)
+        self.assertEqual(post.views, 1)
+
+    def test_gather_queries_keeps_order_inside_transaction(self):
+        results = async_to_sync(gather_queries)(
+            lambda: Post.objects.count(), lambda: list(Category.objects.values_list('slug', flat=True)),
+        )
+        self.assertEqual(results, [1, ['tech']])
+
+    def test_parallel_queries_are_observed(self):
+        threads = []
+
+        def observer(execute, sql, params, many, context):
+            threads.append(threading.get_ident())
+            return execute(sql, params, many, context)
+
+        # 测试事务外的线程只能读取未写入过的表
+        with observe_queries(observer), mock.patch('blog.async_queries._in_transaction', return_value=False):
+            async_to_sync(gather_queries)(ContentType.objects.count, ContentType.objects.count)
+        self.assertEqual(len(threads), 2)
+        self.assertNotIn(threading.get_ident(), threads)
+
+    async def test_middleware_stays_async(self):
+        async def view(request):
+            return HttpResponse()
+
+        for middleware in (BlockViteRequestsMiddleware, ProfilingMiddleware, ReadYourWritesMiddleware):
+            with self.subTest(middleware=middleware.__name__):
+                self.assertTrue(iscoroutinefunction(middleware(view)))
+        response = await self.async_client.get(reverse('blog:post_list'))
+        self.assertRegex(response['Server-Timing'], r'desc="[1-9]\d* queries"')
+
+
+
+class SQLiteProductionBackendTests(TestCase):
+    """生产环境SQLite后端：连接时执行PRAGMA，写事务以 BEGIN IMMEDIATE 开始"""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = os.path.join(directory, 'db.sqlite3')
+
+    def wrapper(self, **options):
+        """以 'tuned' 别名注册生产配置的连接"""
+        database = production_database(self.path, conn_max_age=0)
+        database['OPTIONS'].update(options)
+        configured = db_connections.configure_settings({'default': settings.DATABASES['default'], 'tuned': database})
+        db_connections.settings['tuned'] = configured['tuned']
+        wrapper = db_connections['tuned']
+        self.addCleanup(db_connections.settings.pop, 'tuned')
+        self.addCleanup(db_connections.__delitem__, 'tuned')
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def pragma(self, wrapper, name):
+        with wrapper.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_applied_on_connect(self):
+        wrapper = self.wrapper()
+        self.assertEqual(self.pragma(wrapper, 'journal_mode'), 'wal')
+        # NORMAL
+        self.assertEqual(self.pragma(wrapper, 'synchronous'), 1)
+        self.assertEqual(self.pragma(wrapper, 'busy_timeout'), PRODUCTION_PRAGMAS['busy_timeout'])
+
+    def test_transactions_take_the_write_lock_immediately(self):
+        wrapper = self.wrapper()
+        other = sqlite3.connect(self.path, timeout=0)
+        self.addCleanup(other.close)
+        with transaction.atomic(using=wrapper.alias):
+            # 事务中还没有写入，其他连接已经无法取得写锁
+            with self.assertRaisesMessage(sqlite3.OperationalError, 'database is locked'):
+                other.execute('BEGIN IMMEDIATE')
+
+    def test_invalid_transaction_mode(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.wrapper(transaction_mode='LAZY').ensure_connection()
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReadWriteRoutingTests(TestCase):
+    """只读视图读从库，写入及写入后的窗口内读主库"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', password='password')
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.router = PrimaryReplicaRouter()
+
+    def serve(self, request, user=None, anonymous_only=False, write=False):
+        """经过中间件和 @replica_reads 执行视图，返回 (文章表读取的库, 响应)"""
+        request.user = user or AnonymousUser()
+        seen = {}
+
+        @replica_reads(anonymous_only=anonymous_only)
+        def view(request):
+            seen['post'] = self.router.db_for_read(Post)
+            seen['session'] = self.router.db_for_read(Session)
+            if write:
+                self.router.db_for_write(Comment)
+                seen['after_write'] = self.router.db_for_read(Post)
+            return HttpResponse()
+
+        response = ReadYourWritesMiddleware(view)(request)
+        return seen, response
+
+    def test_read_only_views_use_replica(self):
+        seen, response = self.serve(self.factory.get('/'))
+        self.assertEqual(seen, {'post': 'replica', 'session': 'default'})
+        self.assertNotIn(PRIMARY_COOKIE, response.cookies)
+
+    def test_writes_and_authenticated_detail_use_primary(self):
+        self.assertEqual(self.serve(self.factory.post('/'))[0]['post'], 'default')
+        self.assertEqual(self.serve(self.factory.get('/'), user=self.author, anonymous_only=True)[0]['post'], 'default')
+        # 没有经过中间件（管理命令、后台线程）时只用主库
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_read_your_writes_window(self):
+        seen, response = self.serve(self.factory.get('/'), write=True)
+        self.assertEqual(seen['after_write'], 'default')
+        cookie = response.cookies[PRIMARY_COOKIE]
+        self.assertEqual(cookie['max-age'], settings.DATABASE_READ_YOUR_WRITES_SECONDS)
+
+        request = self.factory.get('/')
+        request.COOKIES[PRIMARY_COOKIE] = cookie.value
+        self.assertEqual(self.serve(request)[0]['post'], 'default')
+        request = self.factory.get('/')
+        request.COOKIES[PRIMARY_COOKIE] = '0'
+        self.assertEqual(self.serve(request)[0]['post'], 'replica')
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas_configured(self):
+        seen, response = self.serve(self.factory.get('/'), write=True)
+        self.assertEqual(seen['post'], 'default')
+        self.assertNotIn(PRIMARY_COOKIE, response.cookies)
+
+
+class StaticServingTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        source = tempfile.mkdtemp()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, source, ignore_errors=True)
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        os.makedirs(os.path.join(source, 'css'))
+        with open(os.path.join(source, 'css', 'site.css'), 'w') as f:
+            f.write('.post-card { margin: 0 auto; padding: 1rem; }\n' * 200)
+        with open(os.path.join(source, 'movie.bin'), 'wb') as f:
+            f.write(bytes(range(256)) * 4)
+        with override_settings(
+            STATICFILES_DIRS=[source], STATIC_ROOT=self.root,
+            STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'],
+            STORAGES={**settings.STORAGES, 'staticfiles': {
+                'BACKEND': 'DjangoBlog.storage.CompressedManifestStaticFilesStorage',
+            }},
+        ):
+            call_command('collectstatic', interactive=False, verbosity=0)
+            with open(os.path.join(self.root, 'staticfiles.json')) as f:
+                self.css = json.load(f)['paths']['css/site.css']
+
+    def get(self, path, **headers):
+        return serve_file(self.factory.get('/static/' + path, headers=headers), path, document_root=self.root)
+
+    def test_test_runner_uses_plain_storage(self):
+        # 部署配置使用带哈希的存储，BlogTestRunner 在测试环境中换成普通存储
+        self.assertEqual(
+            settings.STORAGES['staticfiles']['BACKEND'], 'django.contrib.staticfiles.storage.StaticFilesStorage'
+        )
+        self.assertEqual(settings.BLOG_TASK_MODE, 'eager')
+
+    def test_collectstatic_writes_hashed_and_precompressed_files(self):
+        self.assertRegex(self.css, r'^css/site\.[0-9a-f]{12}\.css$')
+        self.assertTrue(os.path.exists(os.path.join(self.root, self.css + '.gz')))
+        # 二进制文件不压缩
+        self.assertFalse(any(name.endswith('.gz') for name in os.listdir(self.root)))
+
+    def test_serves_precompressed_variant_with_immutable_cache(self):
+        response = self.get(self.css, accept_encoding='br;q=0, gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=31536000', response['Cache-Control'])
+        with open(os.path.join(self.root, self.css + '.gz'), 'rb') as f:
+            self.assertEqual(b''.join(response.streaming_content), f.read())
+
+        plain = self.get('css/site.css')
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertNotIn('immutable', plain['Cache-Control'])
+        self.assertNotEqual(plain['ETag'], response['ETag'])
+
+        not_modified = self.get(self.css, accept_encoding='gzip', if_none_match=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_range_requests(self):
+        response = self.get('movie.bin', range='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/1024')
+        self.assertEqual(response['Content-Length'], '10')
+        self.assertEqual(b''.join(response.streaming_content), bytes(range(10, 20)))
+
+        tail = self.get('movie.bin', range='bytes=-6')
+        self.assertEqual(tail['Content-Range'], 'bytes 1018-1023/1024')
+        self.assertEqual(self.get('movie.bin', range='bytes=2000-').status_code, 416)
+        # If-Range 与当前版本不符时返回完整文件
+        stale = self.get('movie.bin', range='bytes=0-1', if_range='"stale"')
+        self.assertEqual(stale.status_code, 200)
+        self.assertEqual(stale['Content-Length'], '1024')
+
+    def test_missing_files_and_traversal_404(self):
+        for path in ('missing.css', 'css', '../../etc/passwd', '/etc/passwd'):
+            with self.subTest(path=path), self.assertRaises(Http404):
+                self.get(path)
+
+    def test_static_and_media_routes(self):
+        self.assertIs(resolve('/static/css/style.css').func, serve_file)
+        match = resolve('/media/posts/variants/abc.webp')
+        self.assertIs(match.func, serve_file)
+        self.assertIn('posts/variants/', match.kwargs['immutable_prefixes'])
+
+
+@override_settings(BLOG_SITEMAP_CHUNK_SIZE=2)
+class SyndicationTests(TestCase):
+    ATOM = '{http://www.w3.org/2005/Atom}'
+    SITEMAP = '{http://www.sitemaps.org/schemas/sitemap/0.9}'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', password='password')
+        cls.category = Category.objects.create(name='技术', slug='tech')
+        cls.posts = [
+            Post.objects.create(
+                title=f'文章{i} <&>', slug=f'post-{i}', author=cls.author, category=cls.category if i else None,
+                content='<p>正文</p>', status='published',
+            )
+            for i in range(3)
+        ]
+        cls.posts[0].tags.add('django')
+        cls.draft = Post.objects.create(title='草稿', slug='draft', author=cls.author, content='草稿', status='draft')
+
+    def setUp(self):
+        cache.clear()
+
+    def feed_titles(self, url, fmt='rss'):
+        response = self.client.get(url)
+        self.assertEqual(response['Content-Type'], syndication.CONTENT_TYPES[fmt])
+        self.assertTrue(response.streaming)
+        root = ET.fromstring(b''.join(response.streaming_content))
+        if fmt == 'atom':
+            return [entry.find(f'{self.ATOM}title').text for entry in root.iter(f'{self.ATOM}entry')]
+        return [item.find('title').text for item in root.iter('item')]
+
+    def sitemap_locs(self, url):
+        response = self.client.get(url)
+        content = b''.join(response.streaming_content) if response.streaming else response.content
+        return [loc.text for loc in ET.fromstring(content).iter(f'{self.SITEMAP}loc')]
+
+    def test_feeds(self):
+        newest_first = [post.title for post in reversed(self.posts)]
+        self.assertEqual(self.feed_titles(reverse('blog:feed')), newest_first)
+        self.assertEqual(self.feed_titles(reverse('blog:feed_atom'), 'atom'), newest_first)
+        self.assertEqual(self.feed_titles(reverse('blog:category_feed', args=['tech'])), newest_first[:2])
+        self.assertEqual(self.feed_titles(reverse('blog:tag_feed_atom', args=['django']), 'atom'), [self.posts[0].title])
+        self.assertEqual(self.client.get(reverse('blog:category_feed', args=['missing'])).status_code, 404)
+
+    def test_editing_a_post_regenerates_only_its_entry(self):
+        url = reverse('blog:feed')
+        self.feed_titles(url)
+        with self.assertNumQueries(0):
+            self.feed_titles(url)
+
+        post = self.posts[1]
+        post.title = '新标题'
+        post.save()
+        with CaptureQueriesContext(connection) as queries:
+            titles = self.feed_titles(url)
+        self.assertIn('新标题', titles)
+        self.assertEqual(len(queries), 1)
+
+        # 发布草稿改变订阅的文章列表
+        self.draft.status = 'published'
+        self.draft.save()
+        self.assertEqual(self.feed_titles(url)[0], '草稿')
+
+    def test_sitemap_index_and_chunks(self):
+        index = self.sitemap_locs(reverse('blog:sitemap_index'))
+        chunks = sorted({int(syndication.sitemap_key('posts', post.pk).rsplit(':', 1)[1]) for post in self.posts})
+        self.assertEqual(
+            [loc for loc in index if '-posts-' in loc],
+            [f'http://testserver/sitemap-posts-{chunk}.xml' for chunk in chunks],
+        )
+        self.assertIn('http://testserver/sitemap-categories-0.xml', index)
+
+        sitemaps = {sitemap: self.sitemap_locs(sitemap) for sitemap in index}
+        posted = sorted(loc for sitemap, locs in sitemaps.items() if '-posts-' in sitemap for loc in locs)
+        self.assertEqual(posted, sorted(f'http://testserver{post.get_absolute_url()}' for post in self.posts))
+
+        first, last = (f'/sitemap-posts-{chunk}.xml' for chunk in (chunks[0], chunks[-1]))
+        with self.assertNumQueries(0):
+            self.sitemap_locs(first)
+            self.sitemap_locs(last)
+        # 修改最后一篇文章只清除它所在的块
+        self.posts[-1].save()
+        with self.assertNumQueries(0):
+            self.sitemap_locs(first)
+        with self.assertNumQueries(1):
+            self.sitemap_locs(last)
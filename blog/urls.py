@@ -12,4 +12,13 @@ urlpatterns = [
     path('comment/<int:comment_id>/delete/', views.delete_comment, name='delete_comment'),
     path('category/<slug:category_slug>/', views.category_posts, name='category_posts'),
     path('tag/<str:tag_slug>/', views.tag_posts, name='tag_posts'),
+    path('page-cache/stats/', views.page_cache_stats, name='page_cache_stats'),
+    path('feed/', views.feed, name='feed'),
+    path('feed/atom/', views.feed, {'fmt': 'atom'}, name='feed_atom'),
+    path('category/<slug:category_slug>/feed/', views.category_feed, name='category_feed'),
+    path('category/<slug:category_slug>/feed/atom/', views.category_feed, {'fmt': 'atom'}, name='category_feed_atom'),
+    path('tag/<str:tag_slug>/feed/', views.tag_feed, name='tag_feed'),
+    path('tag/<str:tag_slug>/feed/atom/', views.tag_feed, {'fmt': 'atom'}, name='tag_feed_atom'),
+    path('sitemap.xml', views.sitemap_index, name='sitemap_index'),
+    path('sitemap-<str:section>-<int:chunk>.xml', views.sitemap_chunk, name='sitemap_chunk'),
 ]
\ No newline at end of file
@@ -1,144 +1,220 @@
+from functools import partial
+
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.models import User
 from django.core.paginator import Paginator
 from django.contrib import messages
 from django.db.models import Q
-from django.http import JsonResponse
-from .models import Post, Category, Comment
+from django.http import Http404, JsonResponse
+from django.utils.functional import SimpleLazyObject
+from DjangoBlog.routers import replica_reads
+from .models import Post, Category, Comment, SlugRedirect
 from .forms import PostForm, CommentForm
+from .counters import view_counter
+from .pagination import paginate
+from .slugs import normalize_slug, slug_cache
+from .async_queries import gather_queries
+from .sidebar import get_sidebar_context
+from . import comments, fragment_cache, page_cache, search, syndication, tasks
+from .conditional import conditional_page, list_validators, post_validators
+
+
+# 列表卡片只显示预渲染的摘要，不加载正文
+CARD_DEFERRED_FIELDS = ('content', 'content_html')
+
+
+def with_card_data(queryset, with_content=False):
+    """预加载文章卡片用到的作者、分类和标签，避免N+1查询（评论数为冗余列）"""
+    queryset = queryset.select_related('author', 'category').prefetch_related('tags')
+    return queryset.defer('content_html') if with_content else queryset.defer(*CARD_DEFERRED_FIELDS)
+
+
+def card_surrogate_keys(posts):
+    """列表卡片依赖的代理键：文章本身及其分类"""
+    keys = set()
+    for post in posts:
+        keys.add(page_cache.post_key(post.pk))
+        if post.category_id:
+            keys.add(page_cache.category_key(post.category_id))
+    return keys
+
+
+def count_cached_view(request, meta):
+    """整页缓存命中或返回304时仍然累加浏览量"""
+    if 'post_id' in meta:
+        view_counter.incr(meta['post_id'])
+
+
+def paginate_cards(request, queryset, per_page, count_key):
+    """列表当前页的文章卡片，在查询线程中求值完毕"""
+    page_obj = paginate(request, with_card_data(queryset), per_page, count_key=count_key)
+    page_obj.object_list = list(page_obj.object_list)
+    return page_obj
 
 
-def post_list(request):
+def search_page(request, posts, search_query):
+    """搜索结果的当前页：倒排索引 + BM25 排序，分页后只加载当前页的文章"""
+    ranked_ids = [post_id for post_id, score in search.search(search_query, posts)]
+    paginator = Paginator(ranked_ids, 9)
+    page_obj = paginator.get_page(request.GET.get('page', 1))  # 默认为第1页
+    # 搜索结果的摘要片段从正文中截取
+    posts_by_id = with_card_data(posts, with_content=True).in_bulk(page_obj.object_list)
+    page_obj.object_list = [posts_by_id[pk] for pk in page_obj.object_list if pk in posts_by_id]
+    for post in page_obj.object_list:
+        post.search_snippet = search.highlight(post.content, search_query)
+    return page_obj
+
+
+@replica_reads()
+@conditional_page(list_validators)
+@page_cache.cache_anonymous_page()
+async def post_list(request):
     """文章列表视图 - 增强版"""
     # 只显示已发布文章，不显示任何草稿文章
     posts = Post.objects.filter(status='published')
     
     posts = posts.order_by('-created_at')
     
-    # 搜索功能
-    search_query = request.GET.get('q', '')  # 默认为空字符串而不是None
-    if search_query:
-        posts = posts.filter(
-            Q(title__icontains=search_query) |
-            Q(content__icontains=search_query) |
-            Q(excerpt__icontains=search_query)
-        )
-    
     # 分类筛选
     category_id = request.GET.get('category')
     if category_id:
         posts = posts.filter(category_id=category_id)
     
-    paginator = Paginator(posts, 9)
-    page_number = request.GET.get('page', 1)  # 默认为第1页
-    page_obj = paginator.get_page(page_number)
-    
-    # 获取所有分类用于筛选
-    categories = Category.objects.all()
-    
-    # 获取热门标签 - 只统计已发布文章的标签
-    from taggit.models import Tag
-    from django.db.models import Count
-    from django.contrib.contenttypes.models import ContentType
-    
-    # 获取所有已发布文章的ID
-    published_post_ids = Post.objects.filter(status='published').values_list('id', flat=True)
-    
-    # 获取Post模型的ContentType
-    post_content_type = ContentType.objects.get_for_model(Post)
-    
-    # 通过TaggedItem中间表来统计标签使用情况
-    popular_tags = Tag.objects.filter(
-        taggit_taggeditem_items__object_id__in=published_post_ids,
-        taggit_taggeditem_items__content_type=post_content_type
-    ).annotate(
-        post_count=Count('taggit_taggeditem_items')
-    ).order_by('-post_count')[:15]
-    
-    # 获取热门文章（按浏览量排序）
-    popular_posts = Post.objects.filter(
-        status='published'
-    ).order_by('-views')[:5]
+    search_query = request.GET.get('q', '').strip()  # 默认为空字符串而不是None
+    if search_query:
+        load_page = partial(search_page, request, posts, search_query)
+    else:
+        load_page = partial(paginate_cards, request, posts, 9, f'post_list:{category_id or ""}')
+    # 当前页文章和侧边栏互不依赖，并发查询
+    page_obj, sidebar = await gather_queries(load_page, get_sidebar_context)
     
-    # 获取最新评论
-    recent_comments = Comment.objects.select_related(
-        'author', 'post'
-    ).order_by('-created_at')[:5]
+    page_cache.add_surrogate_keys(
+        request, page_cache.POSTS_KEY, page_cache.SIDEBAR_KEY, *card_surrogate_keys(page_obj)
+    )
     
     context = {
         'page_obj': page_obj,
-        'categories': categories,
         'search_query': search_query,
         'selected_category': category_id,
-        'popular_tags': popular_tags,
-        'popular_posts': popular_posts,
-        'recent_comments': recent_comments,
+        'sidebar': sidebar,
     }
-    return render(request, 'blog/post_list.html', context)
+    return await sync_to_async(render)(request, 'blog/post_list.html', context)
 
 
-def post_detail(request, slug):
-    """文章详情页 - 增强版"""
-    # 处理URL编码问题
-    from urllib.parse import unquote
-    
-    # 基础查询：先查找已发布文章
-    post = Post.objects.filter(slug=slug, status='published').first()
-    
-    # 如果没找到，尝试URL解码后的slug
-    if not post:
-        try:
-            decoded_slug = unquote(slug)
-            post = Post.objects.filter(slug=decoded_slug, status='published').first()
-        except Exception:
-            pass
-    
-    # 如果没找到已发布文章，检查是否是作者访问自己的草稿
-    if not post and request.user.is_authenticated:
-        post = Post.objects.filter(slug=slug, author=request.user, status='draft').first()
-        # 如果还是没找到，尝试解码后的slug
-        if not post:
-            try:
-                decoded_slug = unquote(slug)
-                post = Post.objects.filter(slug=decoded_slug, author=request.user, status='draft').first()
-            except Exception:
-                pass
-    
-    # 如果还是没找到，返回404
-    if not post:
-        from django.http import Http404
-        raise Http404('文章不存在或无权访问')
-    
-    # 增加浏览量
-    post.increase_views()
-    
-    # 获取评论
-    comments = post.comments.filter(is_approved=True)
-    
-    # 获取相关文章
-    related_posts = post.get_related_posts()
-    
-    # 处理评论表单
+def resolve_post(request, slug):
+    """一次查询解析slug：已发布文章，或当前用户自己的草稿"""
+    visible = Q(status='published')
+    if request.user.is_authenticated:
+        visible |= Q(status='draft', author=request.user)
+    # 详情页输出预渲染的 content_html，不需要原始正文
+    posts = Post.objects.filter(visible).select_related('author', 'category').prefetch_related('tags').defer('content')
+    
+    slug = normalize_slug(slug)
+    post_id = slug_cache.get(slug)
+    if post_id is not None:
+        post = posts.filter(pk=post_id).first()
+        if post and post.slug == slug:
+            return post
+        slug_cache.discard(slug)
+    
+    post = posts.filter(slug=slug).first()
+    if post:
+        slug_cache.set(slug, post.pk)
+    return post
+
+
+def redirect_old_slug(request, slug):
+    """旧slug永久重定向到文章的新地址，否则404"""
+    redirect_to = SlugRedirect.objects.filter(
+        old_slug=normalize_slug(slug)
+    ).select_related('post').first()
+    if redirect_to and (redirect_to.post.status == 'published' or redirect_to.post.author_id == request.user.id):
+        return redirect(redirect_to.post, permanent=True)
+    raise Http404('文章不存在或无权访问')
+
+
+def handle_comment_form(request, post):
+    """处理评论表单，返回 (跳转响应, 表单)，提交成功时跳转到新评论所在的评论串"""
     if request.method == 'POST' and request.user.is_authenticated:
-        comment_form = CommentForm(request.POST)
+        comment_form = CommentForm(request.POST, post=post)
         if comment_form.is_valid():
             comment = comment_form.save(commit=False)
             comment.post = post
             comment.author = request.user
             comment.save()
             messages.success(request, '评论已提交成功！')
-            return redirect('blog:post_detail', slug=post.slug)
+            return redirect(f'{post.get_absolute_url()}?thread={comment.thread_id}#comment-{comment.pk}'), None
+        return None, comment_form
+    return None, CommentForm(post=post, initial={'parent': request.GET.get('reply')})
+
+
+def detail_surrogate_keys(request, post, related_posts):
+    page_cache.add_surrogate_keys(
+        request,
+        page_cache.post_key(post.pk),
+        page_cache.category_key(post.category_id),
+        *[page_cache.tag_key(tag.pk) for tag in post.tags.all()],
+        *[page_cache.post_key(related_post.pk) for related_post in related_posts],
+    )
+
+
+# 登录用户可能看到自己的草稿、发表评论，读写都使用主库
+@replica_reads(anonymous_only=True)
+@conditional_page(post_validators, on_not_modified=count_cached_view)
+@page_cache.cache_anonymous_page(on_hit=count_cached_view)
+async def post_detail(request, slug):
+    """文章详情页 - 增强版"""
+    post = await sync_to_async(resolve_post)(request, slug)
+    
+    # 如果没找到，检查是否是旧slug，是则永久重定向到新地址
+    if not post:
+        return await sync_to_async(redirect_old_slug)(request, slug)
+    
+    # 增加浏览量：只在内存中累加，不等待写回
+    await post.aincrease_views()
+    page_cache.set_page_meta(request, post_id=post.pk)
+    
+    # 处理评论表单
+    response, comment_form = await sync_to_async(handle_comment_form)(request, post)
+    if response is not None:
+        return response
+    
+    # 评论、指定的评论串和相关文章互不依赖，并发查询；相关文章片段已缓存时不查询
+    thread_id = request.GET.get('thread', '')
+    fetch_related = not fragment_cache.is_cached('related_posts', [post])
+    comment_page, thread, related = await gather_queries(
+        partial(comments.thread_page, post, request.GET.get('cpage', 1)),
+        partial(comments.load_thread, int(thread_id)) if thread_id.isdigit() else lambda: None,
+        partial(load_related_posts, post) if fetch_related else lambda: None,
+    )
+    # 指定评论串时只显示该评论串，否则按顶层评论分页
+    comment_threads = comment_page.object_list
+    if thread is not None and thread.post_id == post.pk:
+        comment_threads = [thread]
     else:
-        comment_form = CommentForm()
+        thread = None
+    # 片段在检查之后恰好过期时，渲染时再读取相关文章
+    related_posts = related if fetch_related else SimpleLazyObject(partial(load_related_posts, post))
+    
+    if page_cache.is_collecting(request):
+        await sync_to_async(detail_surrogate_keys)(request, post, related_posts)
     
     context = {
         'post': post,
-        'comments': comments,
+        'comment_page': comment_page,
+        'comment_threads': comment_threads,
+        'single_thread': thread,
         'comment_form': comment_form,
         'related_posts': related_posts,
     }
-    return render(request, 'blog/post_detail.html', context)
+    return await sync_to_async(render)(request, 'blog/post_detail.html', context)
+
+
+def load_related_posts(post):
+    return list(post.get_related_posts())
 
 
 @login_required
@@ -149,17 +225,10 @@ def create_post(request):
         if form.is_valid():
             post = form.save(commit=False)
             post.author = request.user
-            
-            # 如果没有摘要，自动生成
-            if not post.excerpt:
-                # 从内容中提取纯文本作为摘要
-                import re
-                from django.utils.html import strip_tags
-                content_text = strip_tags(post.content)
-                post.excerpt = content_text[:300] if len(content_text) > 300 else content_text
-            
+            # 没有填写摘要时，保存时由 blog.rendering 从正文生成 excerpt_text
             post.save()
             form.save_m2m()  # 保存多对多关系，包括标签
+            tasks.update_related.delay(post.pk, key=f'related:{post.pk}')  # 标签保存后再计算相关文章
             
             messages.success(request, f'文章《{post.title}》发布成功！')
             return redirect('blog:post_detail', slug=post.slug)
@@ -178,12 +247,13 @@ def create_post(request):
 @login_required
 def update_post(request, slug):
     """修改文章 - 增强版"""
-    post = get_object_or_404(Post, slug=slug, author=request.user)
+    post = get_object_or_404(Post, slug=normalize_slug(slug), author=request.user)
     
     if request.method == 'POST':
         form = PostForm(request.POST, request.FILES, instance=post)
         if form.is_valid():
             updated_post = form.save()  # 这会保存所有字段，包括多对多关系
+            tasks.update_related.delay(updated_post.pk, key=f'related:{updated_post.pk}')
             
             messages.success(request, f'文章《{updated_post.title}》更新成功！')
             return redirect('blog:post_detail', slug=updated_post.slug)
@@ -203,7 +273,7 @@ def update_post(request, slug):
 @login_required
 def delete_post(request, slug):
     """删除文章"""
-    post = get_object_or_404(Post, slug=slug, author=request.user)
+    post = get_object_or_404(Post, slug=normalize_slug(slug), author=request.user)
     
     if request.method == 'POST':
         post.delete()
@@ -229,109 +299,81 @@ def delete_comment(request, comment_id):
         return redirect('blog:post_detail', slug=comment.post.slug)
 
 
-def category_posts(request, category_slug):
+@replica_reads()
+@conditional_page(list_validators)
+@page_cache.cache_anonymous_page()
+async def category_posts(request, category_slug):
     """分类文章列表"""
-    category = get_object_or_404(Category, slug=category_slug)
-    posts = Post.objects.filter(category=category, status='published')
-    
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page', 1)  # 默认为第1页
-    page_obj = paginator.get_page(page_number)
-    
-    # 获取侧边栏需要的数据
-    categories = Category.objects.all()
-    
-    # 获取热门标签 - 只统计已发布文章的标签
-    from taggit.models import Tag
-    from django.db.models import Count
-    from django.contrib.contenttypes.models import ContentType
-    
-    # 获取所有已发布文章的ID
-    published_post_ids = Post.objects.filter(status='published').values_list('id', flat=True)
-    
-    # 获取Post模型的ContentType
-    post_content_type = ContentType.objects.get_for_model(Post)
-    
-    # 通过TaggedItem中间表来统计标签使用情况
-    popular_tags = Tag.objects.filter(
-        taggit_taggeditem_items__object_id__in=published_post_ids,
-        taggit_taggeditem_items__content_type=post_content_type
-    ).annotate(
-        post_count=Count('taggit_taggeditem_items')
-    ).order_by('-post_count')[:15]
+    posts = Post.objects.filter(category__slug=category_slug, status='published').order_by('-created_at')
     
-    # 获取热门文章（按浏览量排序）
-    popular_posts = Post.objects.filter(
-        status='published'
-    ).order_by('-views')[:5]
-    
-    # 获取最新评论
-    recent_comments = Comment.objects.select_related(
-        'author', 'post'
-    ).order_by('-created_at')[:5]
+    # 按slug过滤文章，分类和当前页可以并发查询
+    category, page_obj = await gather_queries(
+        partial(get_object_or_404, Category, slug=category_slug),
+        partial(paginate_cards, request, posts, 10, f'category:{category_slug}'),
+    )
+    page_cache.add_surrogate_keys(
+        request, page_cache.category_key(category.pk), *card_surrogate_keys(page_obj)
+    )
     
     context = {
         'category': category,
-        'posts': posts,  # 添加posts变量用于显示文章总数
         'page_obj': page_obj,
-        'categories': categories,
-        'popular_tags': popular_tags,
-        'popular_posts': popular_posts,
-        'recent_comments': recent_comments,
     }
-    return render(request, 'blog/category_posts.html', context)
+    return await sync_to_async(render)(request, 'blog/category_posts.html', context)
 
 
-def tag_posts(request, tag_slug):
+@replica_reads()
+@conditional_page(list_validators)
+@page_cache.cache_anonymous_page()
+async def tag_posts(request, tag_slug):
     """标签文章列表"""
     from taggit.models import Tag
-    from django.db.models import Count
-    tag = get_object_or_404(Tag, slug=tag_slug)
-    posts = Post.objects.filter(tags__in=[tag], status='published')
-    
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page', 1)  # 默认为第1页
-    page_obj = paginator.get_page(page_number)
-    
-    # 获取侧边栏需要的数据
-    categories = Category.objects.all()
-    
-    # 获取热门标签 - 只统计已发布文章的标签
-    from taggit.models import Tag
-    from django.db.models import Count
-    from django.contrib.contenttypes.models import ContentType
-    
-    # 获取所有已发布文章的ID
-    published_post_ids = Post.objects.filter(status='published').values_list('id', flat=True)
+    posts = Post.objects.filter(tags__slug=tag_slug, status='published').order_by('-created_at')
     
-    # 获取Post模型的ContentType
-    post_content_type = ContentType.objects.get_for_model(Post)
-    
-    # 通过TaggedItem中间表来统计标签使用情况
-    popular_tags = Tag.objects.filter(
-        taggit_taggeditem_items__object_id__in=published_post_ids,
-        taggit_taggeditem_items__content_type=post_content_type
-    ).annotate(
-        post_count=Count('taggit_taggeditem_items')
-    ).order_by('-post_count')[:15]
-    
-    # 获取热门文章（按浏览量排序）
-    popular_posts = Post.objects.filter(
-        status='published'
-    ).order_by('-views')[:5]
-    
-    # 获取最新评论
-    recent_comments = Comment.objects.select_related(
-        'author', 'post'
-    ).order_by('-created_at')[:5]
+    tag, page_obj, sidebar = await gather_queries(
+        partial(get_object_or_404, Tag, slug=tag_slug),
+        partial(paginate_cards, request, posts, 10, f'tag:{tag_slug}'),
+        get_sidebar_context,
+    )
+    page_cache.add_surrogate_keys(
+        request, page_cache.tag_key(tag.pk), page_cache.SIDEBAR_KEY, *card_surrogate_keys(page_obj)
+    )
     
     context = {
         'tag': tag,
-        'posts': posts,  # 添加posts变量用于显示文章总数
         'page_obj': page_obj,
-        'categories': categories,
-        'popular_tags': popular_tags,
-        'popular_posts': popular_posts,
-        'recent_comments': recent_comments,
+        'sidebar': sidebar,
     }
-    return render(request, 'blog/tag_posts.html', context)
+    return await sync_to_async(render)(request, 'blog/tag_posts.html', context)
+
+
+@staff_member_required
+def page_cache_stats(request):
+    """整页缓存命中率统计（仅管理员可见）"""
+    return JsonResponse(page_cache.get_stats())
+
+
+@replica_reads()
+def feed(request, fmt='rss'):
+    """全站 RSS/Atom 订阅"""
+    return syndication.feed_response(request, fmt, 'all')
+
+
+@replica_reads()
+def category_feed(request, category_slug, fmt='rss'):
+    return syndication.feed_response(request, fmt, 'category', category_slug)
+
+
+@replica_reads()
+def tag_feed(request, tag_slug, fmt='rss'):
+    return syndication.feed_response(request, fmt, 'tag', tag_slug)
+
+
+@replica_reads()
+def sitemap_index(request):
+    return syndication.sitemap_index(request)
+
+
+@replica_reads()
+def sitemap_chunk(request, section, chunk):
+    return syndication.sitemap_chunk(request, section, chunk)